@@ -0,0 +1,451 @@
+"""Runs the benchmark suite and stores the results for comparison across
+versions.
+
+    python -m benchmarks --label 0.30.5
+    python -m benchmarks --compare benchmarks/results/0.30.5.json
+"""
+import argparse
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from threading import Event
+from typing import Callable, Dict, List
+
+from brainframe.api import BrainFrameAPI, StatusReceiver, bf_codecs
+from brainframe.api import compression
+from brainframe.api.bulk import run_concurrently
+from brainframe.api.bf_codecs import image_utils
+from brainframe.api.stubs.zone_statuses import parse_zone_status_packet
+from brainframe.api.transport import create_transport
+
+from . import payloads
+from .mock_server import MockBrainFrameServer
+from .server import PayloadServer
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+SUITES: Dict[str, Callable[[argparse.Namespace], Dict[str, dict]]] = {}
+
+
+def suite(func):
+    # A trailing underscore avoids shadowing modules with the same name
+    SUITES[func.__name__.rstrip("_")] = func
+    return func
+
+
+def measure(func: Callable[[], object], repeat: int, number: int = 1,
+            items: int = 1) -> dict:
+    """Times a function, returning the median time per call and the
+    resulting throughput in items per second.
+    """
+    func()  # Warm up
+    times = []
+    for _ in range(repeat):
+        gc.disable()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+        gc.enable()
+
+    median = statistics.median(times)
+    return {
+        "seconds": median,
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "items_per_second": items / median if median > 0 else None,
+    }
+
+
+def allocated_bytes(func: Callable[[], object]) -> int:
+    """Returns the number of bytes still allocated by the result of func."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = func()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return after - before
+
+
+@suite
+def codecs(args) -> Dict[str, dict]:
+    packet_dict = payloads.zone_statuses_dict(
+        args.streams, args.zones, args.detections)
+    packet = json.dumps(packet_dict).encode("utf-8")
+    status_dicts = [status for statuses in packet_dict.values()
+                    for status in statuses.values()]
+    detection_dicts = [det for status in status_dicts
+                       for det in status["within"]]
+    num_statuses = len(status_dicts)
+    num_detections = len(detection_dicts)
+
+    def decode_statuses():
+        return [bf_codecs.ZoneStatus.from_dict(d) for d in status_dicts]
+
+    statuses = decode_statuses()
+    detections = [bf_codecs.Detection.from_dict(d) for d in detection_dicts]
+
+    results = {
+        "json_loads": measure(lambda: json.loads(packet), args.repeat,
+                              items=len(packet)),
+        "packet_decode": measure(lambda: parse_zone_status_packet(packet),
+                                 args.repeat, items=num_statuses),
+        "zone_status_from_dict": measure(decode_statuses, args.repeat,
+                                         items=num_statuses),
+        "zone_status_to_dict": measure(
+            lambda: [status.to_dict() for status in statuses],
+            args.repeat, items=num_statuses),
+        "detection_from_dict": measure(
+            lambda: [bf_codecs.Detection.from_dict(d)
+                     for d in detection_dicts],
+            args.repeat, items=num_detections),
+        "detection_to_dict": measure(
+            lambda: [det.to_dict() for det in detections],
+            args.repeat, items=num_detections),
+    }
+
+    if num_detections > 0:
+        results["detection_memory"] = {
+            "bytes_per_object": allocated_bytes(
+                lambda: [bf_codecs.Detection.from_dict(d)
+                         for d in detection_dicts]) / num_detections,
+        }
+    results["zone_status_memory"] = {
+        "bytes_per_object": allocated_bytes(decode_statuses) / num_statuses,
+    }
+    return results
+
+
+@suite
+def images(args) -> Dict[str, dict]:
+    frame = payloads.image(args.image_width, args.image_height)
+    pixels = frame.shape[0] * frame.shape[1]
+
+    results = {}
+    for format_ in ("jpeg", "png"):
+        encoded = image_utils.encode(format_, frame)
+        results[f"{format_}_encode"] = measure(
+            lambda: image_utils.encode(format_, frame), args.repeat,
+            items=pixels)
+        results[f"{format_}_decode"] = measure(
+            lambda: image_utils.decode(encoded), args.repeat, items=pixels)
+        results[f"{format_}_size"] = {"bytes": len(encoded)}
+    return results
+
+
+@suite
+def transport(args) -> Dict[str, dict]:
+    packet_dict = payloads.zone_statuses_dict(
+        args.streams, args.zones, args.detections)
+    routes = {
+        "/api/version": json.dumps("0.0.0").encode("utf-8"),
+        "/api/streams/status": json.dumps(packet_dict).encode("utf-8"),
+    }
+    num_statuses = args.streams * args.zones
+
+    with PayloadServer(routes) as server:
+        api = BrainFrameAPI(server.url)
+        api.set_transport(create_transport(http2=args.http2))
+
+        latencies = []
+
+        def timed_version():
+            start = time.perf_counter()
+            api.version()
+            latencies.append(time.perf_counter() - start)
+
+        results = {
+            "version": measure(timed_version, args.repeat, number=20),
+            "latest_zone_statuses": measure(api.get_latest_zone_statuses,
+                                            args.repeat,
+                                            items=num_statuses),
+        }
+        latencies.sort()
+        results["version_latency"] = {
+            "p50": latencies[len(latencies) // 2],
+            "p95": latencies[int(len(latencies) * 0.95)],
+            "p99": latencies[int(len(latencies) * 0.99)],
+        }
+        api.close()
+    return results
+
+
+@suite
+def api_calls(args) -> Dict[str, dict]:
+    with MockBrainFrameServer(credentials=("admin", "admin"),
+                              latency=args.latency) as server:
+        server.populate(streams=args.streams, zones_per_stream=args.zones,
+                        alarms_per_zone=1, alerts_per_stream=10)
+        api = BrainFrameAPI(server.url, credentials=("admin", "admin"))
+        api.set_transport(create_transport(http2=args.http2))
+        stream_ids = list(server.streams)
+
+        def concurrent_zones():
+            run_concurrently(api.get_zones,
+                             ((s_id, (s_id,)) for s_id in stream_ids))
+
+        results = {
+            "get_stream_configurations": measure(
+                api.get_stream_configurations, args.repeat,
+                items=args.streams),
+            "get_zones": measure(api.get_zones, args.repeat,
+                                 items=args.streams * (args.zones + 1)),
+            "get_alerts": measure(lambda: api.get_alerts(limit=100),
+                                  args.repeat),
+            "get_capsule_option_vals": measure(
+                lambda: api.get_capsule_option_vals("detector_mock", 1),
+                args.repeat, number=20),
+            "concurrent_get_zones": measure(concurrent_zones, args.repeat,
+                                            items=len(stream_ids)),
+        }
+        api.close()
+    return results
+
+
+@suite
+def status_ingestion(args) -> Dict[str, dict]:
+    packets = payloads.zone_status_packets(
+        args.packets, args.streams, args.zones, args.detections)
+
+    with PayloadServer({}, status_packets=packets) as server:
+        api = BrainFrameAPI(server.url)
+
+        def read_stream():
+            for _ in api.get_zone_status_stream(timeout=10):
+                pass
+
+        def receive() -> float:
+            received = []
+            done = Event()
+
+            def listener(zone_statuses):
+                received.append(zone_statuses)
+                if len(received) == len(packets):
+                    done.set()
+
+            start = time.perf_counter()
+            receiver = StatusReceiver(api)
+            receiver.add_listener(listener)
+            done.wait(60)
+            elapsed = time.perf_counter() - start
+
+            # Closing waits for the receiver to notice the end of the stream,
+            # so it's kept out of the measurement
+            receiver.close()
+            return elapsed
+
+        receive()  # Warm up
+        receiver_times = [receive() for _ in range(args.repeat)]
+        receiver_median = statistics.median(receiver_times)
+
+        results = {
+            "zone_status_stream": measure(read_stream, args.repeat,
+                                          items=len(packets)),
+            "status_receiver": {
+                "seconds": receiver_median,
+                "stdev": statistics.stdev(receiver_times)
+                if len(receiver_times) > 1 else 0.0,
+                "items_per_second": len(packets) / receiver_median,
+            },
+            "packet_size": {
+                "bytes": statistics.mean(len(p) for p in packets),
+            },
+        }
+        api.close()
+    return results
+
+
+@suite
+def compression_(args) -> Dict[str, dict]:
+    packets = payloads.zone_status_packets(
+        args.packets, args.streams, args.zones, args.detections)
+    bodies = {
+        "zone_status_packet": packets[0],
+        "encodings": json.dumps(payloads.encodings(100)).encode("utf-8"),
+    }
+
+    results = {}
+    for encoding in compression.available_encodings():
+        for body_name, body in bodies.items():
+            compressed = compression.compress(body, encoding)
+            name = f"{body_name}_{encoding}"
+            results[f"{name}_size"] = {
+                "bytes": len(compressed),
+                "ratio": len(compressed) / len(body),
+            }
+            results[f"{name}_compress"] = measure(
+                lambda: compression.compress(body, encoding), args.repeat,
+                items=len(body))
+            results[f"{name}_decompress"] = measure(
+                lambda: compression.decompress(compressed, encoding),
+                args.repeat, items=len(body))
+
+    # Each packet is compressed separately as it's sent, which compresses
+    # less than a whole body does
+    for encoding in (None, *compression.available_encodings()):
+        if encoding is None:
+            wire_bytes = sum(len(p) + 2 for p in packets)
+        else:
+            compressor = compression.Compressor(encoding)
+            wire_bytes = sum(len(compressor.compress(p + b"\r\n"))
+                             for p in packets)
+
+        with PayloadServer({}, status_packets=packets,
+                           encoding=encoding) as server:
+            api = BrainFrameAPI(server.url)
+
+            def read_stream():
+                for _ in api.get_zone_status_stream(timeout=10):
+                    pass
+
+            name = f"zone_status_stream_{encoding or 'identity'}"
+            results[name] = measure(read_stream, args.repeat,
+                                    items=len(packets))
+            results[f"{name}_size"] = {"bytes": wire_bytes}
+            api.close()
+    return results
+
+
+@suite
+def import_time(args) -> Dict[str, dict]:
+    script = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import brainframe.api\n"
+        "elapsed = time.perf_counter() - start\n"
+        "heavy = [name for name in ('numpy', 'PIL', 'sqlite3', 'asyncio')\n"
+        "         if name in sys.modules]\n"
+        "print(elapsed, ','.join(heavy))\n"
+    )
+    root = Path(__file__).parent.parent
+
+    times = []
+    for _ in range(max(args.repeat, 5)):
+        output = subprocess.run(
+            [sys.executable, "-c", script], stdout=subprocess.PIPE,
+            cwd=root, check=True).stdout.decode().split()
+        times.append(float(output[0]))
+        heavy_modules = output[1].split(",") if len(output) > 1 else []
+
+    median = statistics.median(times)
+    return {
+        "import_brainframe_api": {
+            "seconds": median,
+            "stdev": statistics.stdev(times),
+            "items_per_second": 1 / median,
+        },
+        "heavy_modules_loaded": {"modules": heavy_modules},
+    }
+
+
+def metadata(label: str) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            cwd=Path(__file__).parent, check=True,
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "label": label,
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "time": time.time(),
+    }
+
+
+def compare(results: dict, baseline: dict) -> List[str]:
+    """Describes how each timing changed relative to a baseline."""
+    lines = []
+    for suite_name, benchmarks in results["suites"].items():
+        old_benchmarks = baseline["suites"].get(suite_name, {})
+        for name, values in benchmarks.items():
+            old = old_benchmarks.get(name, {})
+            if "seconds" in values and "seconds" in old:
+                ratio = values["seconds"] / old["seconds"]
+                lines.append(f"{suite_name}.{name}: {ratio:.2f}x the time "
+                             f"of {baseline['meta']['label']}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--suite", action="append", choices=list(SUITES),
+                        help="The suites to run. Defaults to all of them.")
+    parser.add_argument("--streams", type=int, default=8)
+    parser.add_argument("--zones", type=int, default=4)
+    parser.add_argument("--detections", type=int, default=20)
+    parser.add_argument("--packets", type=int, default=100,
+                        help="The number of zone status packets to stream")
+    parser.add_argument("--image-width", type=int, default=1280)
+    parser.add_argument("--image-height", type=int, default=720)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="The latency of the mock server used by the "
+                             "api_calls suite, in seconds")
+    parser.add_argument("--http2", action="store_true",
+                        help="Use HTTP/2 in the transport and api_calls "
+                             "suites, if httpx and h2 are installed")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--label", default=None,
+                        help="The name to store results under. Defaults to "
+                             "the current commit.")
+    parser.add_argument("--compare", type=Path, default=None,
+                        help="A previous results file to compare against")
+    args = parser.parse_args()
+
+    if args.http2:
+        # Without this check, the transport would quietly fall back to
+        # HTTP/1.1 and the results would be mislabeled
+        try:
+            import h2
+            import httpx
+        except ImportError:
+            parser.error("--http2 requires the httpx and h2 packages")
+
+    meta = metadata(args.label)
+    meta["label"] = meta["label"] or meta["commit"] or "latest"
+    meta["parameters"] = {
+        "streams": args.streams,
+        "zones": args.zones,
+        "detections": args.detections,
+        "packets": args.packets,
+        "image_size": [args.image_width, args.image_height],
+        "latency": args.latency,
+        "http2": args.http2,
+        "repeat": args.repeat,
+    }
+
+    results = {"meta": meta, "suites": {}}
+    for name in args.suite or SUITES:
+        print(f"Running {name}...", file=sys.stderr)
+        results["suites"][name] = SUITES[name](args)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output_path = RESULTS_DIR / f"{meta['label']}.json"
+    output_path.write_text(json.dumps(results, indent=2))
+
+    print(json.dumps(results["suites"], indent=2))
+    print(f"Results written to {output_path}", file=sys.stderr)
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())
+        if baseline["meta"].get("parameters") != meta["parameters"]:
+            print("Warning: The baseline was run with different parameters",
+                  file=sys.stderr)
+        print("\n".join(compare(results, baseline)))
+
+
+if __name__ == "__main__":
+    main()
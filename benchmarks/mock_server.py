@@ -0,0 +1,1282 @@
+"""A fake BrainFrame server for testing and load testing clients without a
+real BrainFrame server.
+
+The server keeps all state in memory and implements the REST API used by
+BrainFrameAPI, including the zone status stream. It can be run in-process:
+
+.. code-block:: python
+
+   with MockBrainFrameServer(latency=0.01) as server:
+       server.populate(streams=100, zones_per_stream=4)
+       api = BrainFrameAPI(server.url)
+       ...
+
+Or standalone:
+
+.. code-block:: bash
+
+   python -m benchmarks.mock_server --port 8000 --streams 100
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import secrets
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Event, RLock, Thread
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from brainframe.api.compression import Compressor, compress, decompress
+from brainframe.api.instrumentation import endpoint_name
+
+_NOT_FOUND_STATUS_KINDS = {
+    "StreamConfigNotFoundError", "ZoneNotFoundError",
+    "PremisesNotFoundError", "AlertNotFoundError", "IdentityNotFoundError",
+    "FrameNotFoundForAlertError", "CapsuleNotFoundError",
+    "StorageNotFoundError", "ZoneAlarmNotFoundError", "EncodingNotFoundError",
+    "NotImplementedInAPIError",
+}
+_UNAUTHORIZED_KINDS = {"UnauthorizedError", "InvalidSessionError"}
+
+_COMPRESSION_MIN_SIZE = 1024
+"""Responses smaller than this are never compressed, like in nginx"""
+
+_STATUS_STREAM_PATH = "/api/streams/statuses"
+"""The zone status stream is streamed, so it's handled outside the routes"""
+
+_FULL_FRAME_ZONE_NAME = "Screen"
+_CLASS_NAMES = ("person", "car", "bicycle")
+
+
+class _APIError(Exception):
+    """Sent to the client as an error response in the BrainFrame format."""
+
+    def __init__(self, kind: str, description: str):
+        super().__init__(description)
+        self.kind = kind
+        self.description = description
+
+    @property
+    def status_code(self) -> int:
+        if self.kind == "ServerNotReadyError":
+            return 502
+        if self.kind in _NOT_FOUND_STATUS_KINDS:
+            return 404
+        if self.kind in _UNAUTHORIZED_KINDS:
+            return 401
+        return 400
+
+
+class MockBrainFrameServer:
+    """An in-memory imitation of a BrainFrame server, with configurable
+    latency and error injection.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, *,
+                 credentials: Optional[Tuple[str, str]] = None,
+                 latency: float = 0.0,
+                 latency_jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 session_lifetime: Optional[float] = None,
+                 max_streams: Optional[int] = None,
+                 detections_per_zone: int = 5,
+                 status_interval: float = 0.1,
+                 response_encodings: Sequence[str] = (),
+                 version: str = "0.0.0",
+                 seed: int = 0):
+        """
+        :param host: The address to listen on
+        :param port: The port to listen on, or 0 to pick a free port
+        :param credentials: The username and password clients must
+            authenticate with, or None to accept all requests
+        :param latency: The time in seconds to wait before handling each
+            request
+        :param latency_jitter: The maximum random time in seconds added to
+            the latency of each request
+        :param error_rate: The fraction of requests that fail with a 502
+            error, which the client raises as a ServerNotReadyError
+        :param session_lifetime: The time in seconds before a session
+            expires, causing an InvalidSessionError. If None, sessions never
+            expire.
+        :param max_streams: The number of streams the license allows to be
+            analyzed at once, or None for no limit
+        :param detections_per_zone: The number of synthetic detections in each
+            zone status
+        :param status_interval: The time in seconds between packets on the
+            zone status stream
+        :param response_encodings: The content encodings responses may be
+            compressed with, in order of preference. Each response uses the
+            first one that the client accepts.
+        :param version: The BrainFrame version to report
+        :param seed: The seed for generating synthetic data
+        """
+        self.credentials = credentials
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.session_lifetime = session_lifetime
+        self.max_streams = max_streams
+        self.detections_per_zone = detections_per_zone
+        self.status_interval = status_interval
+        self.response_encodings = tuple(response_encodings)
+        self.version = version
+
+        self.request_counts: Counter = Counter()
+        """The number of requests handled, keyed by HTTP method and endpoint"""
+
+        self._lock = RLock()
+        self._random = random.Random(seed)
+        self._next_ids: Counter = Counter()
+        self._injected_errors: List[str] = []
+        self._sessions: Dict[str, float] = {}
+        self._closed = Event()
+
+        self.premises: Dict[int, dict] = {}
+        self.streams: Dict[int, dict] = {}
+        self.zones: Dict[int, dict] = {}
+        self.zone_alarms: Dict[int, dict] = {}
+        self.alerts: Dict[int, dict] = {}
+        self.storage: Dict[int, Tuple[bytes, str]] = {}
+        self.identities: Dict[int, dict] = {}
+        self.encodings: Dict[int, dict] = {}
+        self.capsules: Dict[str, dict] = {
+            "detector_mock": _capsule_dict("detector_mock"),
+        }
+        self.analyzing: set = set()
+        self._global_options: Dict[str, Dict[str, Any]] = {}
+        self._stream_options: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self._global_active: Dict[str, bool] = {}
+        self._stream_active: Dict[Tuple[int, str], bool] = {}
+
+        handler = type("Handler", (_Handler,), {"mock": self})
+        self._server = _ThreadingHTTPServer((host, port), handler)
+        self._thread = Thread(
+            name="MockBrainFrameServerThread",
+            target=self._server.serve_forever,
+            daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        """The URL to give to BrainFrameAPI to connect to this server"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def populate(self, streams: int = 0, zones_per_stream: int = 0,
+                 alarms_per_zone: int = 0, alerts_per_stream: int = 0,
+                 identities: int = 0, encodings_per_identity: int = 0,
+                 vector_length: int = 128, analyzing: bool = True) -> None:
+        """Fills the server with synthetic data.
+
+        :param streams: The number of streams to create
+        :param zones_per_stream: The number of zones to create in each stream,
+            in addition to the full-frame zone
+        :param alarms_per_zone: The number of alarms to create in each zone
+        :param alerts_per_stream: The number of alerts to create for each
+            stream. Alerts are spread across the stream's alarms, so this
+            requires alarms_per_zone to be at least 1.
+        :param identities: The number of identities to create
+        :param encodings_per_identity: The number of encodings to create for
+            each identity
+        :param vector_length: The length of each encoding's vector
+        :param analyzing: If True, analysis is started on the new streams,
+            ignoring the license limit
+        """
+        with self._lock:
+            now = time.time()
+            for stream_index in range(streams):
+                stream = self._save_stream({
+                    "name": f"Stream {len(self.streams) + 1}",
+                    "id": None,
+                    "connection_type": "ip_camera",
+                    "connection_options": {
+                        "url": f"rtsp://10.0.{stream_index // 250}."
+                               f"{stream_index % 250}/stream"},
+                    "runtime_options": {},
+                    "metadata": {},
+                    "premises_id": None,
+                })
+                if analyzing:
+                    self.analyzing.add(stream["id"])
+
+                alarm_ids = []
+                for zone_index in range(zones_per_stream):
+                    zone = self._save_zone({
+                        "name": f"Zone {zone_index + 1}",
+                        "id": None,
+                        "stream_id": stream["id"],
+                        "coords": [[0, 0], [100, 0], [100, 100], [0, 100]],
+                        "alarms": [],
+                    })
+                    for alarm_index in range(alarms_per_zone):
+                        alarm = self._save_zone_alarm(_alarm_dict(
+                            f"Alarm {alarm_index + 1}", zone["id"]))
+                        alarm_ids.append(alarm["id"])
+
+                for alert_index in range(alerts_per_stream if alarm_ids
+                                         else 0):
+                    alarm = self.zone_alarms[alarm_ids[
+                        alert_index % len(alarm_ids)]]
+                    alert_id = self._new_id("alerts")
+                    start_time = now - (alerts_per_stream - alert_index) * 60
+                    self.alerts[alert_id] = {
+                        "id": alert_id,
+                        "alarm_id": alarm["id"],
+                        "zone_id": alarm["zone_id"],
+                        "stream_id": stream["id"],
+                        "start_time": start_time,
+                        "end_time": start_time + 30,
+                        "verified_as": None,
+                    }
+
+            for _ in range(identities):
+                identity_id = self._new_id("identities")
+                self.identities[identity_id] = {
+                    "id": identity_id,
+                    "unique_name": f"identity-{identity_id}",
+                    "nickname": f"Identity {identity_id}",
+                    "metadata": {},
+                }
+                for _ in range(encodings_per_identity):
+                    self._new_encoding(identity_id, "face", None,
+                                       self._random_vector(vector_length))
+
+    def inject_errors(self, count: int = 1,
+                      kind: str = "ServerNotReadyError") -> None:
+        """Makes the next requests fail with the given error.
+
+        :param count: The number of requests to fail
+        :param kind: The name of the error in bf_errors to fail with. A
+            ServerNotReadyError is sent as a 502 response, like the server
+            sends while it's starting up.
+        """
+        with self._lock:
+            self._injected_errors += [kind] * count
+
+    def expire_sessions(self) -> None:
+        """Expires all current sessions, so the next request made with each
+        session fails with an InvalidSessionError.
+        """
+        with self._lock:
+            self._sessions = {session_id: 0.0
+                              for session_id in self._sessions}
+
+    def close(self) -> None:
+        """Stops the server and closes all connections."""
+        self._closed.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockBrainFrameServer":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    # Request handling
+
+    def _handle(self, handler: "_Handler", method: str) -> None:
+        url = urlparse(handler.path)
+        query = {key: values[-1]
+                 for key, values in parse_qs(url.query).items()}
+        body = handler.read_body()
+
+        with self._lock:
+            self.request_counts[(method, endpoint_name(url.path))] += 1
+
+        delay = self.latency
+        if self.latency_jitter > 0:
+            with self._lock:
+                delay += self._random.uniform(0, self.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        try:
+            with self._lock:
+                if self._injected_errors:
+                    kind = self._injected_errors.pop(0)
+                    raise _APIError(kind, "Injected error")
+                if self._random.random() < self.error_rate:
+                    raise _APIError("ServerNotReadyError", "Injected error")
+
+            session_id = self._authenticate(handler)
+
+            if method == "GET" \
+                    and url.path.rstrip("/") == _STATUS_STREAM_PATH:
+                handler.send_status_stream(self, session_id)
+                return
+
+            route, args = self._route(method, url.path)
+            if route is None:
+                raise _APIError("NotImplementedInAPIError",
+                                f"{method} {url.path} is not implemented")
+
+            kwargs = {"query": query, "body": body}
+            if route is MockBrainFrameServer._new_storage:
+                kwargs["content_type"] = handler.headers.get("Content-Type")
+
+            with self._lock:
+                result = route(self, *args, **kwargs)
+        except _APIError as exc:
+            handler.send_error_response(exc)
+            return
+
+        status, data, headers = _normalize_result(result)
+        handler.send_result(status, data, headers, session_id)
+
+    def _authenticate(self, handler: "_Handler") -> Optional[str]:
+        """Checks the request's credentials or session.
+
+        :return: A new session ID to give to the client, if any
+        """
+        if self.credentials is None:
+            return None
+
+        cookies = handler.headers.get("Cookie", "")
+        session_id = None
+        for cookie in cookies.split(";"):
+            name, _, value = cookie.strip().partition("=")
+            if name == "session_id":
+                session_id = value
+
+        with self._lock:
+            if session_id is not None:
+                expires_at = self._sessions.get(session_id)
+                if expires_at is None or expires_at < time.time():
+                    raise _APIError("InvalidSessionError",
+                                    "The session has expired")
+                return None
+
+            auth = handler.headers.get("Authorization", "")
+            if auth.startswith("Basic "):
+                decoded = base64.b64decode(auth[6:]).decode("utf-8")
+                username, _, password = decoded.partition(":")
+                if (username, password) == tuple(self.credentials):
+                    session_id = secrets.token_hex(16)
+                    lifetime = self.session_lifetime
+                    self._sessions[session_id] = float("inf") \
+                        if lifetime is None else time.time() + lifetime
+                    return session_id
+
+        raise _APIError("UnauthorizedError", "Invalid credentials")
+
+    def _route(self, method: str, path: str):
+        for route_method, pattern, route in _ROUTES:
+            if route_method != method:
+                continue
+            match = pattern.fullmatch(path.rstrip("/"))
+            if match is not None:
+                return route, [int(arg) if arg.isdigit() else arg
+                               for arg in match.groups()]
+        return None, []
+
+    # Helpers
+
+    def _new_id(self, collection: str) -> int:
+        self._next_ids[collection] += 1
+        return self._next_ids[collection]
+
+    def _random_vector(self, length: int) -> List[float]:
+        return [round(self._random.uniform(-1, 1), 6) for _ in range(length)]
+
+    def _new_encoding(self, identity_id: int, class_name: str,
+                      from_image: Optional[int],
+                      vector: List[float]) -> dict:
+        encoding_id = self._new_id("encodings")
+        encoding = {
+            "id": encoding_id,
+            "identity_id": identity_id,
+            "class_name": class_name,
+            "from_image": from_image,
+            "vector": vector,
+        }
+        self.encodings[encoding_id] = encoding
+        return encoding
+
+    def _detection(self, class_name: Optional[str] = None) -> dict:
+        x = self._random.randrange(0, 1700)
+        y = self._random.randrange(0, 700)
+        return {
+            "class_name": class_name or self._random.choice(_CLASS_NAMES),
+            "coords": [[x, y], [x + 100, y], [x + 100, y + 300],
+                       [x, y + 300]],
+            "children": [],
+            "attributes": {},
+            "with_identity": None,
+            "extra_data": {
+                "detection_confidence": round(self._random.random(), 3)},
+            "track_id": str(uuid.UUID(int=self._random.getrandbits(128))),
+        }
+
+    def _zone_dict(self, zone: dict) -> dict:
+        zone = dict(zone)
+        zone["alarms"] = [alarm for alarm in self.zone_alarms.values()
+                          if alarm["zone_id"] == zone["id"]]
+        return zone
+
+    def _zone_statuses(self) -> Dict[str, Dict[str, dict]]:
+        now = time.time()
+        statuses = {}
+        for stream_id in sorted(self.analyzing):
+            stream_statuses = {}
+            for zone in self.zones.values():
+                if zone["stream_id"] != stream_id:
+                    continue
+                within = [self._detection()
+                          for _ in range(self.detections_per_zone)]
+                stream_statuses[zone["name"]] = {
+                    "zone": self._zone_dict(zone),
+                    "tstamp": now,
+                    "total_entered": {},
+                    "total_exited": {},
+                    "within": within,
+                    "entering": [],
+                    "exiting": [],
+                    "alerts": [],
+                }
+            statuses[str(stream_id)] = stream_statuses
+        return statuses
+
+    def _get_stream(self, stream_id: int) -> dict:
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            raise _APIError("StreamConfigNotFoundError",
+                            f"Stream {stream_id} does not exist")
+        return stream
+
+    def _get_zone(self, zone_id: int) -> dict:
+        zone = self.zones.get(zone_id)
+        if zone is None:
+            raise _APIError("ZoneNotFoundError",
+                            f"Zone {zone_id} does not exist")
+        return zone
+
+    def _get_capsule(self, name: str) -> dict:
+        capsule = self.capsules.get(name)
+        if capsule is None:
+            raise _APIError("CapsuleNotFoundError",
+                            f"Capsule {name} does not exist")
+        return capsule
+
+    def _save_stream(self, stream: dict) -> dict:
+        premises_id = stream.get("premises_id")
+        if premises_id is not None and premises_id not in self.premises:
+            raise _APIError("PremisesNotFoundError",
+                            f"Premises {premises_id} does not exist")
+
+        stream = dict(stream)
+        if stream.get("id") is None:
+            stream["id"] = self._new_id("streams")
+            self.streams[stream["id"]] = stream
+            self._save_zone({
+                "name": _FULL_FRAME_ZONE_NAME,
+                "id": None,
+                "stream_id": stream["id"],
+                "coords": [[0, 0], [1920, 0], [1920, 1080], [0, 1080]],
+                "alarms": [],
+            }, allow_full_frame=True)
+        else:
+            self._get_stream(stream["id"])
+            self.streams[stream["id"]] = stream
+        return stream
+
+    def _save_zone(self, zone: dict, allow_full_frame: bool = False) -> dict:
+        self._get_stream(zone["stream_id"])
+
+        if zone.get("id") is not None:
+            existing = self._get_zone(zone["id"])
+            if existing["name"] == _FULL_FRAME_ZONE_NAME:
+                raise _APIError("ZoneNotEditableError",
+                                "The full-frame zone cannot be edited")
+
+        for other in self.zones.values():
+            if other["stream_id"] == zone["stream_id"] \
+                    and other["name"] == zone["name"] \
+                    and other["id"] != zone.get("id"):
+                raise _APIError("DuplicateZoneNameError",
+                                f"A zone named {zone['name']} already exists")
+        if zone["name"] == _FULL_FRAME_ZONE_NAME and not allow_full_frame:
+            raise _APIError("DuplicateZoneNameError",
+                            "A full-frame zone already exists")
+
+        zone = {key: value for key, value in zone.items() if key != "alarms"}
+        if zone.get("id") is None:
+            zone["id"] = self._new_id("zones")
+        self.zones[zone["id"]] = zone
+        return self._zone_dict(zone)
+
+    def _save_zone_alarm(self, alarm: dict) -> dict:
+        zone = self._get_zone(alarm["zone_id"])
+
+        alarm = dict(alarm)
+        alarm["stream_id"] = zone["stream_id"]
+        if alarm.get("id") is None:
+            alarm["id"] = self._new_id("zone_alarms")
+        elif alarm["id"] not in self.zone_alarms:
+            raise _APIError("ZoneAlarmNotFoundError",
+                            f"Zone alarm {alarm['id']} does not exist")
+
+        for condition in (alarm.get("count_conditions", [])
+                          + alarm.get("rate_conditions", [])):
+            if condition.get("id") is None:
+                condition["id"] = self._new_id("conditions")
+
+        self.zone_alarms[alarm["id"]] = alarm
+        return alarm
+
+    def _option_values(self, capsule_name: str,
+                       stream_id: Optional[int] = None) -> Dict[str, Any]:
+        capsule = self._get_capsule(capsule_name)
+        values = {name: option["default"]
+                  for name, option in capsule["options"].items()}
+        values.update(self._global_options.get(capsule_name, {}))
+        if stream_id is not None:
+            values.update(
+                self._stream_options.get((stream_id, capsule_name), {}))
+        return values
+
+    def _check_options(self, capsule_name: str, option_vals: dict) -> None:
+        options = self._get_capsule(capsule_name)["options"]
+        for name in option_vals:
+            if name not in options:
+                raise _APIError("InvalidCapsuleOptionError",
+                                f"Capsule {capsule_name} has no option "
+                                f"{name}")
+
+    # Routes
+
+    def _get_version(self, *, query, body):
+        return self.version
+
+    def _get_license(self, *, query, body):
+        return {
+            "state": "valid",
+            "terms": {
+                "online_checkin": False,
+                "max_streams": self.max_streams
+                if self.max_streams is not None else 1000000,
+                "journal_max_allowed_age": 0,
+                "expiration_date": None,
+            },
+        }
+
+    def _get_all_premises(self, *, query, body):
+        return list(self.premises.values())
+
+    def _get_premises(self, premises_id, *, query, body):
+        premises = self.premises.get(premises_id)
+        if premises is None:
+            raise _APIError("PremisesNotFoundError",
+                            f"Premises {premises_id} does not exist")
+        return premises
+
+    def _set_premises(self, *, query, body):
+        premises = json.loads(body)
+        if premises.get("id") is None:
+            premises["id"] = self._new_id("premises")
+        self.premises[premises["id"]] = premises
+        return premises
+
+    def _delete_premises(self, premises_id, *, query, body):
+        self._get_premises(premises_id, query=query, body=body)
+        del self.premises[premises_id]
+        for stream in self.streams.values():
+            if stream.get("premises_id") == premises_id:
+                stream["premises_id"] = None
+
+    def _get_streams(self, *, query, body):
+        streams = list(self.streams.values())
+        if "premises_id" in query:
+            premises_id = int(query["premises_id"])
+            streams = [stream for stream in streams
+                       if stream.get("premises_id") == premises_id]
+        return streams
+
+    def _get_stream_route(self, stream_id, *, query, body):
+        return self._get_stream(stream_id)
+
+    def _set_stream(self, *, query, body):
+        return self._save_stream(json.loads(body))
+
+    def _delete_stream(self, stream_id, *, query, body):
+        self._get_stream(stream_id)
+        del self.streams[stream_id]
+        self.analyzing.discard(stream_id)
+        for zone_id in [zone_id for zone_id, zone in self.zones.items()
+                        if zone["stream_id"] == stream_id]:
+            del self.zones[zone_id]
+        for alarm_id in [alarm_id for alarm_id, alarm
+                         in self.zone_alarms.items()
+                         if alarm["stream_id"] == stream_id]:
+            del self.zone_alarms[alarm_id]
+
+    def _get_stream_url(self, stream_id, *, query, body):
+        self._get_stream(stream_id)
+        return f"rtsp://{urlparse(self.url).hostname}/streams/{stream_id}"
+
+    def _get_runtime_options(self, stream_id, *, query, body):
+        return self._get_stream(stream_id)["runtime_options"]
+
+    def _set_runtime_options(self, stream_id, *, query, body):
+        self._get_stream(stream_id)["runtime_options"] = json.loads(body)
+
+    def _check_analyzing(self, stream_id, *, query, body):
+        self._get_stream(stream_id)
+        return stream_id in self.analyzing
+
+    def _set_analyzing(self, stream_id, *, query, body):
+        self._get_stream(stream_id)
+        if not json.loads(body):
+            self.analyzing.discard(stream_id)
+            return None
+
+        if stream_id not in self.analyzing \
+                and self.max_streams is not None \
+                and len(self.analyzing) >= self.max_streams:
+            raise _APIError("AnalysisLimitExceededError",
+                            f"The license only allows {self.max_streams} "
+                            f"streams to be analyzed at once")
+        self.analyzing.add(stream_id)
+        return None
+
+    def _get_latest_statuses(self, *, query, body):
+        return self._zone_statuses()
+
+    def _get_zones(self, *, query, body):
+        zones = self.zones.values()
+        if "stream_id" in query:
+            stream_id = int(query["stream_id"])
+            zones = [zone for zone in zones if zone["stream_id"] == stream_id]
+        return [self._zone_dict(zone) for zone in zones]
+
+    def _get_zone_route(self, zone_id, *, query, body):
+        return self._zone_dict(self._get_zone(zone_id))
+
+    def _set_zone(self, *, query, body):
+        return self._save_zone(json.loads(body))
+
+    def _delete_zone(self, zone_id, *, query, body):
+        zone = self._get_zone(zone_id)
+        if zone["name"] == _FULL_FRAME_ZONE_NAME:
+            raise _APIError("ZoneNotDeletableError",
+                            "The full-frame zone cannot be deleted")
+        del self.zones[zone_id]
+        for alarm_id in [alarm_id for alarm_id, alarm
+                         in self.zone_alarms.items()
+                         if alarm["zone_id"] == zone_id]:
+            del self.zone_alarms[alarm_id]
+
+    def _zone_options(self, zone_id, *, query, body):
+        zone = self._get_zone(zone_id)
+        allow = "GET, OPTIONS" if zone["name"] == _FULL_FRAME_ZONE_NAME \
+            else "GET, POST, DELETE, OPTIONS"
+        return 200, None, {"Allow": allow}
+
+    def _get_zone_alarms(self, *, query, body):
+        alarms = list(self.zone_alarms.values())
+        for key in ("stream_id", "zone_id"):
+            if key in query:
+                value = int(query[key])
+                alarms = [alarm for alarm in alarms if alarm[key] == value]
+        return alarms
+
+    def _get_zone_alarm(self, alarm_id, *, query, body):
+        alarm = self.zone_alarms.get(alarm_id)
+        if alarm is None:
+            raise _APIError("ZoneAlarmNotFoundError",
+                            f"Zone alarm {alarm_id} does not exist")
+        return alarm
+
+    def _set_zone_alarm(self, *, query, body):
+        return self._save_zone_alarm(json.loads(body))
+
+    def _delete_zone_alarm(self, alarm_id, *, query, body):
+        self._get_zone_alarm(alarm_id, query=query, body=body)
+        del self.zone_alarms[alarm_id]
+
+    def _get_alerts(self, *, query, body):
+        alerts = sorted(self.alerts.values(),
+                        key=lambda alert: alert["start_time"], reverse=True)
+        for key in ("stream_id", "zone_id", "alarm_id"):
+            if key in query:
+                value = int(query[key])
+                alerts = [alert for alert in alerts if alert[key] == value]
+        if "verification" in query:
+            accepted = {{"unverified": None, "true": True,
+                         "false": False}[value]
+                        for value in query["verification"].split(",")}
+            alerts = [alert for alert in alerts
+                      if alert["verified_as"] in accepted]
+
+        total_count = len(alerts)
+        offset = int(query.get("offset", 0))
+        limit = query.get("limit")
+        alerts = alerts[offset:None if limit is None
+                        else offset + int(limit)]
+        return 200, alerts, {"Total-Count": str(total_count)}
+
+    def _get_alert(self, alert_id, *, query, body):
+        alert = self.alerts.get(alert_id)
+        if alert is None:
+            raise _APIError("AlertNotFoundError",
+                            f"Alert {alert_id} does not exist")
+        return alert
+
+    def _set_alert_verification(self, alert_id, *, query, body):
+        alert = self._get_alert(alert_id, query=query, body=body)
+        alert["verified_as"] = json.loads(body)
+
+    def _get_alert_frame(self, alert_id, *, query, body):
+        self._get_alert(alert_id, query=query, body=body)
+        raise _APIError("FrameNotFoundForAlertError",
+                        f"No frame is saved for alert {alert_id}")
+
+    def _new_storage(self, *, query, body, content_type=None):
+        storage_id = self._new_id("storage")
+        self.storage[storage_id] = (body, content_type
+                                    or "application/octet-stream")
+        return storage_id
+
+    def _get_storage(self, storage_id, *, query, body):
+        stored = self.storage.get(storage_id)
+        if stored is None:
+            raise _APIError("StorageNotFoundError",
+                            f"Storage {storage_id} does not exist")
+        data, mime_type = stored
+        return 200, data, {"Content-Type": mime_type}
+
+    def _delete_storage(self, storage_id, *, query, body):
+        self._get_storage(storage_id, query=query, body=body)
+        del self.storage[storage_id]
+
+    def _get_identities(self, *, query, body):
+        identities = list(self.identities.values())
+        if "unique_name" in query:
+            identities = [identity for identity in identities
+                          if identity["unique_name"] == query["unique_name"]]
+        if "encoded_for_class" in query:
+            encoded = {encoding["identity_id"]
+                       for encoding in self.encodings.values()
+                       if encoding["class_name"]
+                       == query["encoded_for_class"]}
+            identities = [identity for identity in identities
+                          if identity["id"] in encoded]
+        if "search" in query:
+            search = query["search"].lower()
+            identities = [identity for identity in identities
+                          if search in identity["unique_name"].lower()
+                          or search in identity["nickname"].lower()]
+        if "sort_by" in query:
+            field_name, _, ordering = query["sort_by"].partition(":")
+            identities.sort(key=lambda identity: identity[field_name],
+                            reverse=ordering == "desc")
+
+        total_count = len(identities)
+        offset = int(query.get("offset", 0))
+        limit = query.get("limit")
+        identities = identities[offset:None if limit is None
+                                else offset + int(limit)]
+        return 200, identities, {"Total-Count": str(total_count)}
+
+    def _get_identity(self, identity_id, *, query, body):
+        identity = self.identities.get(identity_id)
+        if identity is None:
+            raise _APIError("IdentityNotFoundError",
+                            f"Identity {identity_id} does not exist")
+        return identity
+
+    def _set_identity(self, *, query, body):
+        identity = json.loads(body)
+        for other in self.identities.values():
+            if other["unique_name"] == identity["unique_name"] \
+                    and other["id"] != identity.get("id"):
+                raise _APIError("DuplicateIdentityNameError",
+                                f"An identity named {identity['unique_name']}"
+                                f" already exists")
+        if identity.get("id") is None:
+            identity["id"] = self._new_id("identities")
+        self.identities[identity["id"]] = identity
+        return identity
+
+    def _delete_identity(self, identity_id, *, query, body):
+        self._get_identity(identity_id, query=query, body=body)
+        del self.identities[identity_id]
+        for encoding_id in [encoding_id for encoding_id, encoding
+                            in self.encodings.items()
+                            if encoding["identity_id"] == identity_id]:
+            del self.encodings[encoding_id]
+
+    def _new_identity_image(self, identity_id, *, query, body):
+        self._get_identity(identity_id, query=query, body=body)
+        request = json.loads(body)
+        if request["storage_id"] not in self.storage:
+            raise _APIError("StorageNotFoundError",
+                            f"Storage {request['storage_id']} does not exist")
+        for encoding in self.encodings.values():
+            if encoding["identity_id"] == identity_id \
+                    and encoding["class_name"] == request["class_name"] \
+                    and encoding["from_image"] == request["storage_id"]:
+                raise _APIError("ImageAlreadyEncodedError",
+                                "This image has already been encoded")
+        return self._new_encoding(identity_id, request["class_name"],
+                                  request["storage_id"],
+                                  self._random_vector(128))
+
+    def _new_identity_vector(self, identity_id, *, query, body):
+        self._get_identity(identity_id, query=query, body=body)
+        request = json.loads(body)
+        return self._new_encoding(identity_id, request["class_name"], None,
+                                  request["vector"])
+
+    def _filtered_encodings(self, query) -> List[dict]:
+        encodings = list(self.encodings.values())
+        if "identity_id" in query:
+            identity_id = int(query["identity_id"])
+            encodings = [encoding for encoding in encodings
+                         if encoding["identity_id"] == identity_id]
+        if "class_name" in query:
+            encodings = [encoding for encoding in encodings
+                         if encoding["class_name"] == query["class_name"]]
+        return encodings
+
+    def _get_encodings(self, *, query, body):
+        encodings = self._filtered_encodings(query)
+        if "fields" in query:
+            fields = query["fields"].split(",")
+            projected = []
+            for encoding in encodings:
+                encoding = {field: encoding[field] for field in fields}
+                # Like the real server, only distinct results are returned
+                if encoding not in projected:
+                    projected.append(encoding)
+            return projected
+        return encodings
+
+    def _get_encoding(self, encoding_id, *, query, body):
+        encoding = self.encodings.get(encoding_id)
+        if encoding is None:
+            raise _APIError("EncodingNotFoundError",
+                            f"Encoding {encoding_id} does not exist")
+        return encoding
+
+    def _delete_encoding(self, encoding_id, *, query, body):
+        self._get_encoding(encoding_id, query=query, body=body)
+        del self.encodings[encoding_id]
+
+    def _delete_encodings(self, *, query, body):
+        for encoding in self._filtered_encodings(query):
+            del self.encodings[encoding["id"]]
+
+    def _get_capsules(self, *, query, body):
+        return list(self.capsules.values())
+
+    def _get_capsule_route(self, name, *, query, body):
+        return self._get_capsule(name)
+
+    def _get_global_options(self, name, *, query, body):
+        return self._option_values(name)
+
+    def _set_global_options(self, name, *, query, body):
+        option_vals = json.loads(body)
+        self._check_options(name, option_vals)
+        self._global_options[name] = option_vals
+
+    def _patch_global_options(self, name, *, query, body):
+        option_vals = json.loads(body)
+        self._check_options(name, option_vals)
+        options = self._global_options.setdefault(name, {})
+        _patch(options, option_vals)
+
+    def _get_stream_options(self, stream_id, name, *, query, body):
+        self._get_stream(stream_id)
+        return self._option_values(name, stream_id)
+
+    def _set_stream_options(self, stream_id, name, *, query, body):
+        self._get_stream(stream_id)
+        option_vals = json.loads(body)
+        self._check_options(name, option_vals)
+        self._stream_options[(stream_id, name)] = option_vals
+
+    def _patch_stream_options(self, stream_id, name, *, query, body):
+        self._get_stream(stream_id)
+        option_vals = json.loads(body)
+        self._check_options(name, option_vals)
+        options = self._stream_options.setdefault((stream_id, name), {})
+        _patch(options, option_vals)
+
+    def _get_global_active(self, name, *, query, body):
+        self._get_capsule(name)
+        return self._global_active.get(name, True)
+
+    def _set_global_active(self, name, *, query, body):
+        self._get_capsule(name)
+        self._global_active[name] = json.loads(body)
+
+    def _get_stream_active(self, stream_id, name, *, query, body):
+        self._get_stream(stream_id)
+        self._get_capsule(name)
+        active = self._stream_active.get((stream_id, name))
+        return self._global_active.get(name, True) if active is None \
+            else active
+
+    def _set_stream_active(self, stream_id, name, *, query, body):
+        self._get_stream(stream_id)
+        self._get_capsule(name)
+        active = json.loads(body)
+        if active is None:
+            self._stream_active.pop((stream_id, name), None)
+        else:
+            self._stream_active[(stream_id, name)] = active
+
+    def _process_image(self, *, query, body):
+        return [self._detection()
+                for _ in range(self._random.randint(1, 5))]
+
+
+_ROUTES = [(method, re.compile(pattern), route) for method, pattern, route in [
+    ("GET", r"/api/version", MockBrainFrameServer._get_version),
+    ("GET", r"/api/license", MockBrainFrameServer._get_license),
+    ("GET", r"/api/premises", MockBrainFrameServer._get_all_premises),
+    ("POST", r"/api/premises", MockBrainFrameServer._set_premises),
+    ("GET", r"/api/premises/(\d+)", MockBrainFrameServer._get_premises),
+    ("DELETE", r"/api/premises/(\d+)",
+     MockBrainFrameServer._delete_premises),
+    ("GET", r"/api/streams", MockBrainFrameServer._get_streams),
+    ("POST", r"/api/streams", MockBrainFrameServer._set_stream),
+    ("GET", r"/api/streams/status",
+     MockBrainFrameServer._get_latest_statuses),
+    ("GET", r"/api/streams/(\d+)", MockBrainFrameServer._get_stream_route),
+    ("DELETE", r"/api/streams/(\d+)", MockBrainFrameServer._delete_stream),
+    ("GET", r"/api/streams/(\d+)/url", MockBrainFrameServer._get_stream_url),
+    ("GET", r"/api/streams/(\d+)/runtime_options",
+     MockBrainFrameServer._get_runtime_options),
+    ("PUT", r"/api/streams/(\d+)/runtime_options",
+     MockBrainFrameServer._set_runtime_options),
+    ("GET", r"/api/streams/(\d+)/analyze",
+     MockBrainFrameServer._check_analyzing),
+    ("PUT", r"/api/streams/(\d+)/analyze",
+     MockBrainFrameServer._set_analyzing),
+    ("GET", r"/api/streams/(\d+)/plugins/([^/]+)/options",
+     MockBrainFrameServer._get_stream_options),
+    ("PUT", r"/api/streams/(\d+)/plugins/([^/]+)/options",
+     MockBrainFrameServer._set_stream_options),
+    ("PATCH", r"/api/streams/(\d+)/plugins/([^/]+)/options",
+     MockBrainFrameServer._patch_stream_options),
+    ("GET", r"/api/streams/(\d+)/plugins/([^/]+)/active",
+     MockBrainFrameServer._get_stream_active),
+    ("PUT", r"/api/streams/(\d+)/plugins/([^/]+)/active",
+     MockBrainFrameServer._set_stream_active),
+    ("GET", r"/api/zones", MockBrainFrameServer._get_zones),
+    ("POST", r"/api/zones", MockBrainFrameServer._set_zone),
+    ("GET", r"/api/zones/(\d+)", MockBrainFrameServer._get_zone_route),
+    ("DELETE", r"/api/zones/(\d+)", MockBrainFrameServer._delete_zone),
+    ("OPTIONS", r"/api/zones/(\d+)", MockBrainFrameServer._zone_options),
+    ("GET", r"/api/zone_alarms", MockBrainFrameServer._get_zone_alarms),
+    ("POST", r"/api/zone_alarms", MockBrainFrameServer._set_zone_alarm),
+    ("GET", r"/api/zone_alarms/(\d+)", MockBrainFrameServer._get_zone_alarm),
+    ("DELETE", r"/api/zone_alarms/(\d+)",
+     MockBrainFrameServer._delete_zone_alarm),
+    ("GET", r"/api/alerts", MockBrainFrameServer._get_alerts),
+    ("GET", r"/api/alerts/(\d+)", MockBrainFrameServer._get_alert),
+    ("PUT", r"/api/alerts/(\d+)",
+     MockBrainFrameServer._set_alert_verification),
+    ("GET", r"/api/alerts/(\d+)/frame", MockBrainFrameServer._get_alert_frame),
+    ("POST", r"/api/storage", MockBrainFrameServer._new_storage),
+    ("GET", r"/api/storage/(\d+)", MockBrainFrameServer._get_storage),
+    ("DELETE", r"/api/storage/(\d+)", MockBrainFrameServer._delete_storage),
+    ("GET", r"/api/identities", MockBrainFrameServer._get_identities),
+    ("POST", r"/api/identities", MockBrainFrameServer._set_identity),
+    ("GET", r"/api/identities/(\d+)", MockBrainFrameServer._get_identity),
+    ("DELETE", r"/api/identities/(\d+)",
+     MockBrainFrameServer._delete_identity),
+    ("POST", r"/api/identities/(\d+)/images",
+     MockBrainFrameServer._new_identity_image),
+    ("POST", r"/api/identities/(\d+)/vectors",
+     MockBrainFrameServer._new_identity_vector),
+    ("GET", r"/api/encodings", MockBrainFrameServer._get_encodings),
+    ("DELETE", r"/api/encodings", MockBrainFrameServer._delete_encodings),
+    ("GET", r"/api/encodings/(\d+)", MockBrainFrameServer._get_encoding),
+    ("DELETE", r"/api/encodings/(\d+)",
+     MockBrainFrameServer._delete_encoding),
+    ("GET", r"/api/plugins", MockBrainFrameServer._get_capsules),
+    ("GET", r"/api/plugins/([^/]+)", MockBrainFrameServer._get_capsule_route),
+    ("GET", r"/api/plugins/([^/]+)/options",
+     MockBrainFrameServer._get_global_options),
+    ("PUT", r"/api/plugins/([^/]+)/options",
+     MockBrainFrameServer._set_global_options),
+    ("PATCH", r"/api/plugins/([^/]+)/options",
+     MockBrainFrameServer._patch_global_options),
+    ("GET", r"/api/plugins/([^/]+)/active",
+     MockBrainFrameServer._get_global_active),
+    ("PUT", r"/api/plugins/([^/]+)/active",
+     MockBrainFrameServer._set_global_active),
+    ("POST", r"/api/process_image", MockBrainFrameServer._process_image),
+]]
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and bodies are written separately, which stalls responses on
+    # kept-alive connections if Nagle's algorithm is enabled
+    disable_nagle_algorithm = True
+    mock: MockBrainFrameServer = None
+
+    def do_GET(self):
+        self.mock._handle(self, "GET")
+
+    def do_POST(self):
+        self.mock._handle(self, "POST")
+
+    def do_PUT(self):
+        self.mock._handle(self, "PUT")
+
+    def do_PATCH(self):
+        self.mock._handle(self, "PATCH")
+
+    def do_DELETE(self):
+        self.mock._handle(self, "DELETE")
+
+    def do_OPTIONS(self):
+        self.mock._handle(self, "OPTIONS")
+
+    def read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                chunk = self.rfile.read(size + 2)[:size]
+                if size == 0:
+                    break
+                chunks.append(chunk)
+            body = b"".join(chunks)
+        else:
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length) if length > 0 else b""
+
+        encoding = self.headers.get("Content-Encoding")
+        if encoding is not None and body:
+            body = decompress(body, encoding)
+        return body
+
+    def response_encoding(self) -> Optional[str]:
+        """
+        :return: The encoding to compress the response with, if any
+        """
+        accepted = {encoding.split(";")[0].strip() for encoding in
+                    self.headers.get("Accept-Encoding", "").split(",")}
+        for encoding in self.mock.response_encodings:
+            if encoding in accepted:
+                return encoding
+        return None
+
+    def send_result(self, status: int, data, headers: Dict[str, str],
+                    session_id: Optional[str]):
+        if isinstance(data, bytes):
+            body = data
+        elif data is None:
+            body = b""
+        else:
+            body = json.dumps(data).encode("utf-8")
+
+        self.send_response(status)
+        if "Content-Type" not in headers and body:
+            self.send_header("Content-Type", "application/json")
+        for key, value in headers.items():
+            self.send_header(key, value)
+
+        encoding = self.response_encoding()
+        if encoding is not None and len(body) >= _COMPRESSION_MIN_SIZE:
+            body = compress(body, encoding)
+            self.send_header("Content-Encoding", encoding)
+        self._send_session_cookie(session_id)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_response(self, error: _APIError):
+        if error.status_code == 502:
+            # Sent by nginx while the server is starting, so it isn't in the
+            # BrainFrame error format
+            body = b"502 Bad Gateway"
+        else:
+            body = json.dumps({"title": error.kind,
+                               "description": error.description}) \
+                .encode("utf-8")
+
+        self.send_response(error.status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_status_stream(self, mock: MockBrainFrameServer,
+                           session_id: Optional[str]):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        encoding = self.response_encoding()
+        compressor = None
+        if encoding is not None:
+            compressor = Compressor(encoding)
+            self.send_header("Content-Encoding", encoding)
+        self._send_session_cookie(session_id)
+        self.end_headers()
+
+        try:
+            while not mock._closed.is_set():
+                with mock._lock:
+                    packet = json.dumps(mock._zone_statuses())
+                chunk = packet.encode("utf-8") + b"\r\n"
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+                mock._closed.wait(mock.status_interval)
+            if compressor is not None:
+                chunk = compressor.finish()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def _send_session_cookie(self, session_id: Optional[str]):
+        if session_id is not None:
+            cookie = f"session_id={session_id}; Path=/"
+            if self.mock.session_lifetime is not None:
+                cookie += f"; Max-Age={int(self.mock.session_lifetime)}"
+            self.send_header("Set-Cookie", cookie)
+
+    def log_message(self, *_):
+        pass
+
+
+def _normalize_result(result) -> Tuple[int, Any, Dict[str, str]]:
+    if isinstance(result, tuple):
+        return result
+    return 200, result, {}
+
+
+def _patch(options: Dict[str, Any], option_vals: Dict[str, Any]) -> None:
+    for name, value in option_vals.items():
+        if value is None:
+            options.pop(name, None)
+        else:
+            options[name] = value
+
+
+def _capsule_dict(name: str) -> dict:
+    def node(size, detections):
+        return {"size": size, "detections": detections, "attributes": {},
+                "encoded": False, "tracked": False, "extra_data": []}
+
+    return {
+        "name": name,
+        "version": 1,
+        "description": "A synthetic detector",
+        "input_type": node("none", []),
+        "output_type": node("all", list(_CLASS_NAMES)),
+        "capability": node("all", list(_CLASS_NAMES)),
+        "options": {
+            "threshold": {
+                "type": "float",
+                "default": 0.5,
+                "constraints": {"min_val": 0.0, "max_val": 1.0},
+                "description": "The minimum detection confidence",
+            },
+        },
+    }
+
+
+def _alarm_dict(name: str, zone_id: int) -> dict:
+    return {
+        "name": name,
+        "id": None,
+        "count_conditions": [{
+            "test": ">",
+            "check_value": 5,
+            "with_class_name": "person",
+            "with_attribute": None,
+            "window_duration": 5.0,
+            "window_threshold": 0.5,
+            "intersection_point": "bottom",
+            "id": None,
+        }],
+        "rate_conditions": [],
+        "use_active_time": False,
+        "active_start_time": "00:00:00",
+        "active_end_time": "23:59:59",
+        "zone_id": zone_id,
+        "stream_id": None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.mock_server",
+        description="Runs a fake BrainFrame server with synthetic data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--username", default=None)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--session-lifetime", type=float, default=None)
+    parser.add_argument("--max-streams", type=int, default=None)
+    parser.add_argument("--streams", type=int, default=10)
+    parser.add_argument("--zones-per-stream", type=int, default=2)
+    parser.add_argument("--alarms-per-zone", type=int, default=1)
+    parser.add_argument("--alerts-per-stream", type=int, default=10)
+    parser.add_argument("--identities", type=int, default=0)
+    parser.add_argument("--encodings-per-identity", type=int, default=0)
+    parser.add_argument("--detections-per-zone", type=int, default=5)
+    parser.add_argument("--status-interval", type=float, default=0.1)
+    parser.add_argument("--response-encoding", action="append", default=[],
+                        help="A content encoding to compress responses "
+                             "with, like gzip. May be given more than once.")
+    args = parser.parse_args()
+
+    credentials = None
+    if args.username is not None:
+        credentials = (args.username, args.password or "")
+
+    server = MockBrainFrameServer(
+        args.host, args.port,
+        credentials=credentials,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        session_lifetime=args.session_lifetime,
+        max_streams=args.max_streams,
+        detections_per_zone=args.detections_per_zone,
+        status_interval=args.status_interval,
+        response_encodings=args.response_encoding)
+    server.populate(
+        streams=args.streams,
+        zones_per_stream=args.zones_per_stream,
+        alarms_per_zone=args.alarms_per_zone,
+        alerts_per_stream=args.alerts_per_stream,
+        identities=args.identities,
+        encodings_per_identity=args.encodings_per_identity)
+
+    print(f"Serving a mock BrainFrame server on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
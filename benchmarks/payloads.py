@@ -0,0 +1,126 @@
+"""Generators for synthetic but realistic API payloads."""
+import json
+import random
+import uuid
+from typing import Dict, List
+
+import numpy as np
+
+from brainframe.api import bf_codecs
+
+CLASS_NAMES = ("person", "car", "bicycle", "truck")
+ATTRIBUTES = {
+    "gender": ("male", "female"),
+    "behavior": ("walking", "standing", "running"),
+}
+
+
+def detection(rng: random.Random, width: int = 1920, height: int = 1080) \
+        -> bf_codecs.Detection:
+    """Creates a tracked detection with a bounding box, attributes and
+    extra data, similar to what a typical detector and tracker produce.
+    """
+    x = rng.randrange(0, width - 200)
+    y = rng.randrange(0, height - 400)
+    w = rng.randrange(40, 200)
+    h = rng.randrange(80, 400)
+
+    return bf_codecs.Detection(
+        class_name=rng.choice(CLASS_NAMES),
+        coords=[[x, y], [x + w, y], [x + w, y + h], [x, y + h]],
+        children=[],
+        attributes={name: rng.choice(values)
+                    for name, values in ATTRIBUTES.items()},
+        with_identity=None,
+        extra_data={"detection_confidence": round(rng.random(), 4)},
+        track_id=uuid.UUID(int=rng.getrandbits(128)))
+
+
+def zone_status(rng: random.Random, stream_id: int, zone_id: int,
+                num_detections: int, tstamp: float) -> bf_codecs.ZoneStatus:
+    """Creates a zone status with the given number of detections within the
+    zone, a few of which are entering or exiting.
+    """
+    zone = bf_codecs.Zone(
+        name=f"Zone {zone_id}",
+        stream_id=stream_id,
+        coords=[[0, 0], [1920, 0], [1920, 1080], [0, 1080]],
+        id=zone_id)
+
+    within = [detection(rng) for _ in range(num_detections)]
+    num_changes = max(num_detections // 10, 1) if within else 0
+
+    return bf_codecs.ZoneStatus(
+        zone=zone,
+        tstamp=tstamp,
+        total_entered={name: rng.randrange(1000) for name in CLASS_NAMES},
+        total_exited={name: rng.randrange(1000) for name in CLASS_NAMES},
+        within=within,
+        entering=within[:num_changes],
+        exiting=within[num_changes:num_changes * 2],
+        alerts=[])
+
+
+def zone_statuses_dict(num_streams: int, num_zones: int,
+                       num_detections: int, tstamp: float = 1600000000.0,
+                       seed: int = 0) -> Dict[str, Dict[str, dict]]:
+    """Creates the JSON-compatible form of a zone status packet, with
+    num_streams streams that each have num_zones zones containing
+    num_detections detections.
+    """
+    rng = random.Random(seed)
+    packet = {}
+    for stream_id in range(1, num_streams + 1):
+        statuses = {}
+        for zone_index in range(num_zones):
+            zone_id = stream_id * num_zones + zone_index
+            status = zone_status(rng, stream_id, zone_id, num_detections,
+                                 tstamp)
+            statuses[status.zone.name] = status.to_dict()
+        packet[str(stream_id)] = statuses
+    return packet
+
+
+def zone_status_packets(num_packets: int, num_streams: int, num_zones: int,
+                        num_detections: int, seed: int = 0) -> List[bytes]:
+    """Creates a series of JSON-encoded zone status packets, one frame apart,
+    as sent on the zone status stream.
+    """
+    template = zone_statuses_dict(num_streams, num_zones, num_detections,
+                                  seed=seed)
+    encoded = json.dumps(template)
+    tstamp = json.dumps(1600000000.0)
+
+    return [encoded.replace(tstamp, json.dumps(1600000000.0 + i / 30))
+            .encode("utf-8")
+            for i in range(num_packets)]
+
+
+def encodings(num_encodings: int, vector_length: int = 512,
+              seed: int = 0) -> List[dict]:
+    """Creates the JSON-compatible form of identity encodings, as returned
+    when listing encodings.
+    """
+    rng = np.random.RandomState(seed)
+    vectors = rng.normal(size=(num_encodings, vector_length)) \
+        .astype(np.float32)
+    return [{"id": i + 1,
+             "identity_id": i // 4 + 1,
+             "class_name": "face",
+             "from_image": None,
+             "vector": vector.tolist()}
+            for i, vector in enumerate(vectors)]
+
+
+def image(width: int = 1280, height: int = 720, seed: int = 0) \
+        -> np.ndarray:
+    """Creates a BGR image with smooth gradients and some noise, which
+    compresses more like a camera frame than pure noise does.
+    """
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width,
+                     y * 255 // height,
+                     (x + y) * 255 // (width + height)], axis=-1)
+    noise = rng.randint(-8, 8, size=base.shape)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
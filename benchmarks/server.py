@@ -0,0 +1,109 @@
+"""A minimal local HTTP server that serves canned payloads, for measuring
+client overhead without a real BrainFrame server.
+"""
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Thread
+from typing import Dict, List, Optional
+
+from brainframe.api.compression import Compressor, compress
+
+
+class PayloadServer:
+    """Serves fixed JSON bodies for GET requests and a chunked zone status
+    stream on /api/streams/statuses.
+    """
+
+    def __init__(self, routes: Dict[str, bytes],
+                 status_packets: List[bytes] = (),
+                 encoding: Optional[str] = None):
+        """
+        :param routes: The JSON body to return for each path
+        :param status_packets: The packets to send on the zone status stream,
+            after which the stream is closed
+        :param encoding: The content encoding to compress all responses with,
+            or None to send them uncompressed
+        """
+        handler = type("Handler", (_Handler,), {
+            "routes": routes,
+            "status_packets": list(status_packets),
+            "encoding": encoding,
+        })
+
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and bodies are written separately, which stalls responses on
+    # kept-alive connections if Nagle's algorithm is enabled
+    disable_nagle_algorithm = True
+    routes: Dict[str, bytes] = {}
+    status_packets: List[bytes] = []
+    encoding: Optional[str] = None
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/api/streams/statuses":
+            self._send_status_stream()
+            return
+
+        body = self.routes.get(path)
+        if body is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if self.encoding is not None:
+            body = compress(body, self.encoding)
+            self.send_header("Content-Encoding", self.encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_status_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        compressor = None
+        if self.encoding is not None:
+            compressor = Compressor(self.encoding)
+            self.send_header("Content-Encoding", self.encoding)
+        self.end_headers()
+
+        for packet in self.status_packets:
+            chunk = packet + b"\r\n"
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        if compressor is not None:
+            chunk = compressor.finish()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, *_):
+        pass
@@ -1,12 +1,94 @@
+import importlib
+import sys
+
 from .stub import BrainFrameAPI
 from .stubs.base_stub import DEFAULT_TIMEOUT
 from .status_receiver import StatusReceiver
+from .retry import RetryPolicy
 from .stubs.zone_statuses import ZONE_STATUS_TYPE, ZONE_STATUS_STREAM_TYPE
 
+# These are imported when first accessed, since many of them depend on slow
+# to import libraries like NumPy and most programs only use a few of them
+_LAZY_IMPORTS = {
+    "ReadinessPolicy": ".readiness",
+    "wait_for_servers": ".readiness",
+    "wait_for_servers_async": ".readiness",
+    "MultiStatusReceiver": ".multi_status_receiver",
+    "ZoneStatusHistory": ".status_history",
+    "ZoneStatusRecorder": ".status_recording",
+    "ZoneStatusReplayer": ".status_recording",
+    "Track": ".track_assembler",
+    "TrackAssembler": ".track_assembler",
+    "OccupancyTracker": ".occupancy",
+    "ZoneOccupancy": ".occupancy",
+    "StorageIndex": ".storage_index",
+    "BulkResult": ".bulk",
+    "FleetAPI": ".fleet",
+    "EncodingIndex": ".encoding_index",
+    "EncodingMatch": ".encoding_index",
+    "IdentityMirror": ".identity_mirror",
+    "IdentityEnroller": ".enrollment",
+    "EnrollmentJob": ".enrollment",
+    "EnrollmentReport": ".enrollment",
+    "Reconciler": ".reconciler",
+    "DesiredState": ".reconciler",
+    "DesiredStream": ".reconciler",
+    "export_snapshot": ".snapshot",
+    "import_snapshot": ".snapshot",
+    "SnapshotImportReport": ".snapshot",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
+
+
+if sys.version_info < (3, 7):
+    # Module-level __getattr__ is not supported before Python 3.7
+    for _name in _LAZY_IMPORTS:
+        __getattr__(_name)
+
 __all__ = [
     "BrainFrameAPI",
     "DEFAULT_TIMEOUT",
     "StatusReceiver",
+    "RetryPolicy",
+    "ReadinessPolicy",
+    "wait_for_servers",
+    "wait_for_servers_async",
+    "MultiStatusReceiver",
+    "ZoneStatusHistory",
+    "ZoneStatusRecorder",
+    "ZoneStatusReplayer",
+    "Track",
+    "TrackAssembler",
+    "OccupancyTracker",
+    "ZoneOccupancy",
+    "StorageIndex",
+    "BulkResult",
+    "FleetAPI",
+    "EncodingIndex",
+    "EncodingMatch",
+    "IdentityMirror",
+    "IdentityEnroller",
+    "EnrollmentJob",
+    "EnrollmentReport",
+    "Reconciler",
+    "DesiredState",
+    "DesiredStream",
+    "export_snapshot",
+    "import_snapshot",
+    "SnapshotImportReport",
     "bf_errors",
     "bf_codecs",
     "ZONE_STATUS_TYPE",
@@ -1,9 +1,13 @@
-from typing import List, Optional
+import base64
+from typing import TYPE_CHECKING, Optional
 
 from dataclasses import dataclass, field
 
 from .base_codecs import Codec
 
+if TYPE_CHECKING:
+    import numpy as np
+
 
 @dataclass
 class Identity(Codec):
@@ -39,7 +43,7 @@ class Identity(Codec):
             metadata=d["metadata"])
 
 
-@dataclass
+@dataclass(eq=False)
 class Encoding(Codec):
     """An encoding attached to an identity."""
 
@@ -54,18 +58,29 @@ class Encoding(Codec):
     None if this encoding was not created from an image.
     """
 
-    vector: List[int]
+    vector: "np.ndarray"
     """A low-dimensional representation of the object's appearance. This is
     what objects found in streams will be compared to in order to decide if
     the object is of the identity this encoding is associated with.
+
+    The vector is a float32 array. It may be set as a list of numbers, a
+    base64 string, or bytes of little-endian float32 values, and is converted
+    to an array the first time it is accessed.
     """
 
     id: Optional[int] = None
     """The unique ID of the encoding."""
 
     def to_dict(self):
-        d = dict(self.__dict__)
-        return d
+        return {
+            "identity_id": self.identity_id,
+            "class_name": self.class_name,
+            "from_image": self.from_image,
+            # Going through str gives the shortest representation of each
+            # float32 value, where tolist would give a much longer float64 one
+            "vector": [float(str(value)) for value in self.vector],
+            "id": self.id,
+        }
 
     @staticmethod
     def from_dict(d):
@@ -74,3 +89,41 @@ class Encoding(Codec):
                         class_name=d["class_name"],
                         from_image=d["from_image"],
                         vector=d["vector"])
+
+
+def _get_vector(self: Encoding) -> "np.ndarray":
+    if self._raw_vector is not None:
+        import numpy as np
+
+        raw = self._raw_vector
+        if isinstance(raw, str):
+            raw = base64.b64decode(raw)
+
+        if isinstance(raw, (bytes, bytearray, memoryview)):
+            # Copied so that the vector is writable, like other arrays
+            vector = np.frombuffer(raw, dtype=_VECTOR_DTYPE).copy()
+        else:
+            vector = np.asarray(raw, dtype=_VECTOR_DTYPE)
+
+        self._vector = vector
+        self._raw_vector = None
+
+    return self._vector
+
+
+def _set_vector(self: Encoding, vector) -> None:
+    # Decoding is deferred until the vector is accessed, since many uses of
+    # encodings never look at the vector
+    self._raw_vector = vector
+    self._vector = None
+
+
+# This is set after the class is created so that the dataclass treats vector
+# as a regular field
+Encoding.vector = property(
+    _get_vector, _set_vector,
+    doc="A low-dimensional representation of the object's appearance, as a "
+        "float32 array.")
+
+_VECTOR_DTYPE = "<f4"
+"""The format of encoding vectors"""
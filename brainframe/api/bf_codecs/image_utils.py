@@ -2,12 +2,18 @@
 easy.
 """
 from io import BytesIO
+from typing import TYPE_CHECKING
 
-import numpy as np
-from PIL import Image
+# NumPy and Pillow are imported when first needed, since they're slow to
+# import and many programs never handle images
+if TYPE_CHECKING:
+    import numpy as np
 
 
-def decode(img_bytes: bytes) -> np.ndarray:
+def decode(img_bytes: bytes) -> "np.ndarray":
+    import numpy as np
+    from PIL import Image
+
     rgb_img = Image.open(BytesIO(img_bytes))
 
     # Load as numpy array
@@ -20,7 +26,9 @@ def decode(img_bytes: bytes) -> np.ndarray:
     return bgr_arr.copy()
 
 
-def encode(format: str, image_bgr_arr: np.ndarray):
+def encode(format: str, image_bgr_arr: "np.ndarray"):
+    from PIL import Image
+
     img_rgb_arr = flip_channels(image_bgr_arr)
     image = Image.fromarray(img_rgb_arr)
     img_bytes = BytesIO()
@@ -0,0 +1,85 @@
+"""Utilities for issuing many API calls concurrently."""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import (
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from dataclasses import dataclass
+
+from . import bf_errors
+
+T = TypeVar("T")
+K = TypeVar("K", bound=Hashable)
+
+DEFAULT_MAX_WORKERS = 8
+"""The default number of API calls to have in flight at once"""
+
+
+@dataclass
+class BulkResult(Generic[T]):
+    """The outcome of a single call made as part of a bulk operation."""
+
+    value: Optional[T] = None
+    """The value returned by the call, if it succeeded"""
+
+    error: Optional[Exception] = None
+    """The error raised by the call, if it failed. This is usually a
+    BaseAPIError, but fleet calls record any error a server's call raises.
+    """
+
+    @property
+    def ok(self) -> bool:
+        """True if the call succeeded"""
+        return self.error is None
+
+
+def run_concurrently(func: Callable[..., T],
+                     calls: Iterable[Tuple[K, tuple]],
+                     max_workers: int = DEFAULT_MAX_WORKERS) \
+        -> Dict[K, BulkResult[T]]:
+    """Calls the given function once for each set of arguments, with up to
+    max_workers calls running at once. API errors are captured in the result
+    for that call instead of being raised. Other errors are raised.
+
+    Calls are only submitted as workers become available, so very large
+    iterables are not loaded into memory all at once.
+
+    :param func: The function to call
+    :param calls: Pairs of a unique key and the positional arguments to call
+        the function with
+    :param max_workers: The maximum number of calls to run at once
+    :return: The result of each call, keyed by the call's key and in the same
+        order as the calls were provided
+    """
+    order = []
+    results = {}
+
+    def run(*args):
+        try:
+            return BulkResult(value=func(*args))
+        except bf_errors.BaseAPIError as exc:
+            return BulkResult(error=exc)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = {}
+
+        for key, args in calls:
+            if len(in_flight) >= max_workers * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[in_flight.pop(future)] = future.result()
+
+            order.append(key)
+            in_flight[executor.submit(run, *args)] = key
+
+        for future, key in in_flight.items():
+            results[key] = future.result()
+
+    return {key: results[key] for key in order}
@@ -0,0 +1,137 @@
+"""Compression of request and response bodies.
+
+Responses are decompressed by Requests, which tells the server which
+encodings it can decode. Brotli and Zstandard are only supported when the
+``brotli`` and ``zstandard`` packages are installed.
+"""
+import zlib
+from typing import List
+
+import requests
+
+GZIP = "gzip"
+DEFLATE = "deflate"
+BROTLI = "br"
+ZSTANDARD = "zstd"
+
+
+def available_encodings() -> List[str]:
+    """
+    :return: The content encodings that responses can be received in, in
+        the order Requests advertises them to the server
+    """
+    accept_encoding = requests.utils.default_headers()["Accept-Encoding"]
+    return [encoding.strip() for encoding in accept_encoding.split(",")]
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compresses a complete body.
+
+    :param data: The data to compress
+    :param encoding: The content encoding to compress with
+    :return: The compressed data
+    """
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    """Decompresses a complete body.
+
+    :param data: The compressed data
+    :param encoding: The content encoding the data is compressed with
+    :return: The decompressed data
+    """
+    if encoding in (GZIP, DEFLATE):
+        return zlib.decompress(data, _zlib_wbits(encoding))
+    elif encoding == BROTLI:
+        import brotli
+        return brotli.decompress(data)
+    elif encoding == ZSTANDARD:
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+class Compressor:
+    """Compresses a body that is sent in parts, like the zone status stream.
+    The output of each call to compress can be decompressed as soon as it's
+    received, without waiting for later parts.
+    """
+
+    def __init__(self, encoding: str):
+        """
+        :param encoding: The content encoding to compress with
+        """
+        self.encoding = encoding
+
+        if encoding in (GZIP, DEFLATE):
+            self._compressor = zlib.compressobj(wbits=_zlib_wbits(encoding))
+        elif encoding == BROTLI:
+            import brotli
+            self._compressor = brotli.Compressor()
+        elif encoding == ZSTANDARD:
+            import zstandard
+            self._compressor = zstandard.ZstdCompressor().compressobj()
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        :param data: The next part of the body
+        :return: The compressed form of the part
+        """
+        if self.encoding in (GZIP, DEFLATE):
+            return self._compressor.compress(data) \
+                + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        elif self.encoding == BROTLI:
+            return self._compressor.process(data) + self._compressor.flush()
+        else:
+            import zstandard
+            return self._compressor.compress(data) \
+                + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        """
+        :return: The data that ends the compressed body
+        """
+        if self.encoding == BROTLI:
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class Decompressor:
+    """Decompresses a body that is received in parts, like the zone status
+    stream.
+    """
+
+    def __init__(self, encoding: str):
+        """
+        :param encoding: The content encoding the body is compressed with
+        """
+        self.encoding = encoding
+
+        if encoding in (GZIP, DEFLATE):
+            self._decompressor = zlib.decompressobj(_zlib_wbits(encoding))
+        elif encoding == BROTLI:
+            import brotli
+            self._decompressor = brotli.Decompressor()
+        elif encoding == ZSTANDARD:
+            import zstandard
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+
+    def decompress(self, data: bytes) -> bytes:
+        """
+        :param data: The next part of the compressed body
+        :return: As much of the decompressed body as is available
+        """
+        if self.encoding == BROTLI:
+            return self._decompressor.process(data)
+        return self._decompressor.decompress(data)
+
+
+def _zlib_wbits(encoding: str) -> int:
+    # Offsetting the window size by 16 adds a gzip header and trailer
+    return zlib.MAX_WBITS | 16 if encoding == GZIP else zlib.MAX_WBITS
@@ -0,0 +1,193 @@
+from typing import List, Optional, Sequence
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from .bf_codecs import Encoding
+from .stubs.base_stub import DEFAULT_TIMEOUT
+
+COSINE = "cosine"
+"""Compare vectors by cosine similarity. Higher scores are closer."""
+
+L2 = "l2"
+"""Compare vectors by Euclidean distance. Lower scores are closer."""
+
+
+@dataclass
+class EncodingMatch:
+    """An encoding found by an EncodingIndex search."""
+
+    encoding_id: Optional[int]
+    """The ID of the matching encoding"""
+
+    identity_id: int
+    """The ID of the identity the matching encoding is attached to"""
+
+    score: float
+    """The cosine similarity or L2 distance between the query and the
+    encoding, depending on the metric used
+    """
+
+
+class EncodingIndex:
+    """A local copy of encodings that can be searched for the encodings
+    closest to a query vector, without contacting the server.
+
+    Vectors are stored in a single contiguous float32 matrix, so searches are
+    vectorized. For very large galleries, an approximate index can be built
+    with Faiss, which must be installed separately.
+    """
+
+    def __init__(self, encodings: Sequence[Encoding],
+                 approximate: bool = False):
+        """
+        :param encodings: The encodings to index. All vectors must be the same
+            length.
+        :param approximate: If True, cosine searches use an approximate HNSW
+            index from Faiss instead of an exhaustive search
+        """
+        lengths = {len(e.vector) for e in encodings}
+        if len(lengths) > 1:
+            raise ValueError(f"All encoding vectors must be the same length, "
+                             f"got lengths {sorted(lengths)}")
+
+        dimensions = lengths.pop() if lengths else 0
+        self._vectors = np.empty((len(encodings), dimensions),
+                                 dtype=np.float32)
+        for row, encoding in enumerate(encodings):
+            self._vectors[row] = encoding.vector
+
+        self._encoding_ids = np.array(
+            [-1 if e.id is None else e.id for e in encodings],
+            dtype=np.int64)
+        self._identity_ids = np.array([e.identity_id for e in encodings],
+                                      dtype=np.int64)
+
+        self._sq_norms = np.einsum("ij,ij->i", self._vectors, self._vectors)
+        self._inv_norms = _inverse_norms(self._vectors)
+
+        self._approximate_index = None
+        if approximate:
+            self._approximate_index = self._build_approximate_index()
+
+    @classmethod
+    def from_api(cls, api, class_name: str,
+                 approximate: bool = False,
+                 timeout=DEFAULT_TIMEOUT) -> "EncodingIndex":
+        """Creates an index of all encodings for the given class on the
+        server.
+
+        :param api: Used to communicate with the BrainFrame server
+        :param class_name: The class to index encodings for
+        :param approximate: If True, use an approximate index for cosine
+            searches
+        :param timeout: The timeout to use for the request
+        :return: The new index
+        """
+        encodings = api.get_encodings(class_name=class_name, timeout=timeout)
+        return cls(encodings, approximate=approximate)
+
+    def __len__(self):
+        return len(self._vectors)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """All indexed vectors as an array of shape (N, D). This array should
+        not be modified.
+        """
+        return self._vectors
+
+    def search(self, query: np.ndarray, k: int = 1,
+               metric: str = COSINE) -> List[List[EncodingMatch]]:
+        """Finds the indexed encodings that are closest to each query vector.
+
+        :param query: A single vector, or an array of shape (Q, D) containing
+            multiple vectors to search for
+        :param k: The number of matches to find for each query vector
+        :param metric: Either COSINE or L2
+        :return: For each query vector, up to k matches ordered from closest
+            to furthest
+        """
+        query = np.atleast_2d(np.asarray(query, dtype=np.float32))
+        k = min(k, len(self))
+        if k <= 0:
+            # An empty index has no vector length to compare against
+            return [[] for _ in query]
+
+        if query.shape[1] != self._vectors.shape[1]:
+            raise ValueError(f"Query vectors have length {query.shape[1]}, "
+                             f"but indexed vectors have length "
+                             f"{self._vectors.shape[1]}")
+
+        if metric == COSINE:
+            if self._approximate_index is not None:
+                scores, rows = self._approximate_index.search(
+                    _normalized(query), k)
+            else:
+                scores = (query @ self._vectors.T) * self._inv_norms
+                scores *= _inverse_norms(query)[:, None]
+                rows = _top_k(-scores, k)
+                scores = np.take_along_axis(scores, rows, axis=1)
+        elif metric == L2:
+            sq_dists = (np.einsum("ij,ij->i", query, query)[:, None]
+                        + self._sq_norms
+                        - 2 * (query @ self._vectors.T))
+            rows = _top_k(sq_dists, k)
+            scores = np.sqrt(np.maximum(
+                np.take_along_axis(sq_dists, rows, axis=1), 0))
+        else:
+            raise ValueError(f"Unknown metric {metric}. Must be either "
+                             f"{COSINE} or {L2}")
+
+        return [
+            [EncodingMatch(
+                encoding_id=_optional_id(self._encoding_ids[row]),
+                identity_id=int(self._identity_ids[row]),
+                score=float(score))
+             for row, score in zip(query_rows, query_scores) if row >= 0]
+            for query_rows, query_scores in zip(rows, scores)
+        ]
+
+    def _build_approximate_index(self):
+        try:
+            import faiss
+        except ImportError as exc:
+            raise ImportError("Faiss must be installed to use approximate "
+                              "encoding indexes") from exc
+
+        index = faiss.IndexHNSWFlat(self._vectors.shape[1], 32,
+                                    faiss.METRIC_INNER_PRODUCT)
+        index.add(_normalized(self._vectors))
+        return index
+
+
+def _inverse_norms(vectors: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore"):
+        inv_norms = 1 / np.linalg.norm(vectors, axis=1)
+    inv_norms[~np.isfinite(inv_norms)] = 0
+    return inv_norms
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(vectors * _inverse_norms(vectors)[:, None],
+                                dtype=np.float32)
+
+
+def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    """Returns the column indices of the k smallest values in each row, in
+    ascending order.
+    """
+    if k < distances.shape[1]:
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(distances.shape[1]),
+                             (len(distances), 1))
+
+    candidate_dists = np.take_along_axis(distances, candidates, axis=1)
+    order = np.argsort(candidate_dists, axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def _optional_id(encoding_id: np.int64) -> Optional[int]:
+    return None if encoding_id < 0 else int(encoding_id)
@@ -0,0 +1,245 @@
+import logging
+import mimetypes
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from dataclasses import dataclass, field
+
+from . import bf_errors
+from .bf_codecs import Identity
+
+_IMAGE_MIME_TYPES = {"image/jpeg", "image/png"}
+"""MIME types that can be trusted from a file extension without inspecting the
+image data
+"""
+
+
+@dataclass
+class EnrollmentJob:
+    """An identity and the images that should be encoded for it."""
+
+    identity: Identity
+    """The identity to enroll. If an identity with the same unique name
+    already exists on the server, the images are added to that identity.
+    """
+
+    class_name: str
+    """The class of object the images show and should be encoded for"""
+
+    images: List[Path]
+    """Paths to the images to encode for this identity"""
+
+
+@dataclass
+class EnrollmentReport:
+    """A summary of the outcome of an enrollment run."""
+
+    identities_created: int = 0
+    """The number of identities that did not exist before this run"""
+
+    identities_existing: int = 0
+    """The number of identities that already existed on the server"""
+
+    images_encoded: int = 0
+    """The number of images that were newly encoded"""
+
+    images_skipped: int = 0
+    """The number of images that were skipped because they were already
+    encoded, either in a previous run according to the checkpoint or on the
+    server
+    """
+
+    error_counts: Counter = field(default_factory=Counter)
+    """The number of each kind of error that was encountered, keyed by the
+    error's class name
+    """
+
+    elapsed: float = 0.0
+    """The time the run took in seconds"""
+
+    @property
+    def images_per_second(self) -> float:
+        """The number of images processed per second, including skipped and
+        failed images
+        """
+        processed = (self.images_encoded + self.images_skipped
+                     + sum(self.error_counts.values()))
+        return processed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class IdentityEnroller:
+    """Enrolls many identities at once by creating identities, uploading
+    images, and encoding them in parallel.
+
+    Enrollment is idempotent. Identities that already exist are reused, and
+    images that have already been encoded are skipped. If a checkpoint file is
+    provided, completed images are recorded in it so that an interrupted run
+    can be resumed without contacting the server for finished work.
+    """
+
+    def __init__(self, api, max_workers: int = 8,
+                 checkpoint_path: Optional[Union[str, Path]] = None):
+        """
+        :param api: Used to communicate with the BrainFrame server
+        :param max_workers: The maximum number of identities to enroll
+            concurrently
+        :param checkpoint_path: A file to record completed images in. If the
+            file already exists, images recorded in it are skipped.
+        """
+        self._api = api
+        self._max_workers = max_workers
+
+        self._checkpoint_path = None
+        self._completed: Set[Tuple[str, str]] = set()
+        if checkpoint_path is not None:
+            self._checkpoint_path = Path(checkpoint_path)
+            self._completed = self._load_checkpoint(self._checkpoint_path)
+
+        self._lock = Lock()
+        self._report = EnrollmentReport()
+
+    def enroll(self, jobs: Iterable[EnrollmentJob]) -> EnrollmentReport:
+        """Enrolls all the given identities.
+
+        :param jobs: The identities and images to enroll
+        :return: A summary of the outcome of the run
+        """
+        self._report = EnrollmentReport()
+        start_time = time()
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            # Jobs are only submitted as workers become available, so that
+            # large directories aren't read all at once
+            in_flight = set()
+            for job in jobs:
+                if len(in_flight) >= self._max_workers * 2:
+                    done, in_flight = wait(in_flight,
+                                           return_when=FIRST_COMPLETED)
+                    # Propagate any unexpected errors
+                    for future in done:
+                        future.result()
+                in_flight.add(executor.submit(self._enroll_job, job))
+
+            for future in in_flight:
+                future.result()
+
+        self._report.elapsed = time() - start_time
+        return self._report
+
+    @staticmethod
+    def jobs_from_directory(path: Union[str, Path], class_name: str) \
+            -> Iterator[EnrollmentJob]:
+        """Creates enrollment jobs from a directory where each subdirectory is
+        an identity. The subdirectory's name is used as the identity's unique
+        name and nickname, and every file inside it is treated as an image.
+
+        :param path: The directory to search for identities in
+        :param class_name: The class of object the images should be encoded
+            for
+        :return: A job for each identity
+        """
+        for identity_dir in sorted(Path(path).iterdir()):
+            if not identity_dir.is_dir():
+                continue
+
+            images = sorted(p for p in identity_dir.iterdir() if p.is_file())
+            identity = Identity(unique_name=identity_dir.name,
+                                nickname=identity_dir.name)
+            yield EnrollmentJob(identity=identity,
+                                class_name=class_name,
+                                images=images)
+
+    def _enroll_job(self, job: EnrollmentJob) -> None:
+        unique_name = job.identity.unique_name
+
+        pending = [image for image in job.images
+                   if (unique_name, image.name) not in self._completed]
+        self._count("images_skipped", len(job.images) - len(pending))
+        if len(pending) == 0:
+            return
+
+        try:
+            identity_id = self._get_or_create_identity(job.identity)
+        except bf_errors.BaseAPIError as exc:
+            logging.warning(f"Could not enroll identity {unique_name}: {exc}")
+            self._count_error(exc, len(pending))
+            return
+
+        for image in pending:
+            self._enroll_image(identity_id, unique_name, job.class_name,
+                               image)
+
+    def _get_or_create_identity(self, identity: Identity) -> int:
+        try:
+            identity = self._api.set_identity(identity)
+        except bf_errors.DuplicateIdentityNameError:
+            identities, _ = self._api.get_identities(
+                unique_name=identity.unique_name)
+            if len(identities) == 0:
+                # The identity was deleted after the name conflict
+                raise bf_errors.IdentityNotFoundError(
+                    f"Identity {identity.unique_name} exists but could not "
+                    f"be found")
+            self._count("identities_existing")
+            return identities[0].id
+
+        self._count("identities_created")
+        return identity.id
+
+    def _enroll_image(self, identity_id: int, unique_name: str,
+                      class_name: str, image: Path) -> None:
+        try:
+            data = image.read_bytes()
+
+            mime_type, _ = mimetypes.guess_type(image.name)
+            if mime_type in _IMAGE_MIME_TYPES:
+                storage_id = self._api.new_storage(data, mime_type)
+            else:
+                storage_id = self._api.new_storage_as_image(data)
+
+            self._api.new_identity_image(identity_id, class_name, storage_id)
+        except bf_errors.ImageAlreadyEncodedError:
+            self._count("images_skipped")
+        except (bf_errors.BaseAPIError, OSError) as exc:
+            # NoDetectionsInImageError and similar errors are permanent for
+            # this image, so they're recorded instead of retried
+            self._count_error(exc)
+            if not isinstance(exc, bf_errors.NoDetectionsInImageError):
+                return
+        else:
+            self._count("images_encoded")
+
+        self._mark_completed(unique_name, image.name)
+
+    def _count(self, attribute: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self._report, attribute,
+                    getattr(self._report, attribute) + amount)
+
+    def _count_error(self, exc: BaseException, amount: int = 1) -> None:
+        with self._lock:
+            self._report.error_counts[type(exc).__name__] += amount
+
+    def _mark_completed(self, unique_name: str, image_name: str) -> None:
+        if self._checkpoint_path is None:
+            return
+
+        with self._lock:
+            self._completed.add((unique_name, image_name))
+            with self._checkpoint_path.open("a") as checkpoint:
+                checkpoint.write(f"{unique_name}\t{image_name}\n")
+
+    @staticmethod
+    def _load_checkpoint(path: Path) -> Set[Tuple[str, str]]:
+        if not path.exists():
+            return set()
+
+        completed = set()
+        for line in path.read_text().splitlines():
+            unique_name, _, image_name = line.partition("\t")
+            completed.add((unique_name, image_name))
+        return completed
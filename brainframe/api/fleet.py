@@ -0,0 +1,179 @@
+import inspect
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from . import bf_errors
+from .bulk import BulkResult
+from .stub import BrainFrameAPI
+from .stubs.base_stub import DEFAULT_TIMEOUT
+
+
+class FleetAPI:
+    """Makes the same API call to many BrainFrame servers at once.
+
+    Any BrainFrameAPI method can be called on a FleetAPI. The call is made
+    to every server concurrently, and the result for each server is returned
+    in a dict keyed by the server's name. Servers that fail or don't respond
+    in time have their error recorded instead of interrupting the call.
+
+    .. code-block:: python
+
+       fleet = FleetAPI.from_urls({
+           "site-a": "http://10.0.0.10",
+           "site-b": "http://10.0.1.10",
+       }, credentials=("admin", "admin"))
+
+       results = fleet.get_alerts(limit=100)
+       alerts = fleet.merge(results, key=lambda result: result[0])
+       for server_name, alert in alerts:
+           ...
+    """
+
+    def __init__(self, apis: Mapping[str, BrainFrameAPI],
+                 timeout: float = DEFAULT_TIMEOUT):
+        """
+        :param apis: API objects for each server, keyed by a name for the
+            server
+        :param timeout: The default timeout for each server's call. Calls that
+            take longer are reported as failed.
+        """
+        self._apis = dict(apis)
+        self._timeout = timeout
+
+    @classmethod
+    def from_urls(cls, server_urls: Mapping[str, str],
+                  credentials: Optional[Tuple[str, str]] = None,
+                  timeout: float = DEFAULT_TIMEOUT) -> "FleetAPI":
+        """Creates a FleetAPI, connecting to each server with the same
+        credentials.
+
+        :param server_urls: The URL of each server, keyed by a name for the
+            server
+        :param credentials: The username and password to authenticate with
+        :param timeout: The default timeout for each server's call
+        :return: The new FleetAPI
+        """
+        apis = {name: BrainFrameAPI(url, credentials)
+                for name, url in server_urls.items()}
+        return cls(apis, timeout=timeout)
+
+    @property
+    def apis(self) -> Dict[str, BrainFrameAPI]:
+        """The API object for each server, keyed by the server's name"""
+        return dict(self._apis)
+
+    def call(self, method_name: str, *args,
+             timeout: Optional[float] = None,
+             **kwargs) -> Dict[str, BulkResult]:
+        """Calls the given BrainFrameAPI method on every server concurrently.
+
+        :param method_name: The name of the method to call
+        :param args: Positional arguments to pass to the method
+        :param timeout: The timeout for each server's call. Defaults to the
+            timeout given to the constructor.
+        :param kwargs: Keyword arguments to pass to the method
+        :return: The result for each server, keyed by the server's name
+        """
+        if timeout is None:
+            timeout = self._timeout
+
+        method = getattr(BrainFrameAPI, method_name)
+        if "timeout" in inspect.signature(method).parameters:
+            kwargs["timeout"] = timeout
+
+        return self.call_each(
+            lambda api: getattr(api, method_name)(*args, **kwargs),
+            timeout=timeout)
+
+    def call_each(self, func: Callable[[BrainFrameAPI], Any],
+                  timeout: Optional[float] = None) -> Dict[str, BulkResult]:
+        """Calls the given function with every server's API object
+        concurrently.
+
+        Calls that don't finish in time are reported as failed but keep
+        running in the background until they return. Each fleet call uses its
+        own threads, so a server that hangs doesn't hold up later calls.
+
+        :param func: The function to call
+        :param timeout: The time to wait for each server. Defaults to the
+            timeout given to the constructor.
+        :return: The result for each server, keyed by the server's name
+        """
+        if timeout is None:
+            timeout = self._timeout
+
+        def run(api):
+            try:
+                return BulkResult(value=func(api))
+            except Exception as exc:
+                # Any failure, like an unexpected response that can't be
+                # decoded, only affects this server's result
+                return BulkResult(error=exc)
+
+        executor = ThreadPoolExecutor(max_workers=max(len(self._apis), 1),
+                                      thread_name_prefix="FleetAPI")
+        try:
+            futures = {name: executor.submit(run, api)
+                       for name, api in self._apis.items()}
+            # Allow a little extra time for responses that arrive right at the
+            # timeout to be processed
+            wait(futures.values(), timeout=timeout * 1.5)
+        finally:
+            # Don't wait for servers that didn't respond in time
+            executor.shutdown(wait=False)
+
+        results = {}
+        for name, future in futures.items():
+            if future.done():
+                results[name] = future.result()
+            else:
+                error = bf_errors.ServerNotReadyError(
+                    f"Server {name} did not respond within {timeout}s")
+                results[name] = BulkResult(error=error)
+        return results
+
+    @staticmethod
+    def merge(results: Mapping[str, BulkResult],
+              key: Callable[[Any], Iterable] = None) -> List[Tuple[str, Any]]:
+        """Combines list results from every server into one list, tagging each
+        item with the name of the server it came from. Failed results are
+        skipped.
+
+        :param results: Results from a fleet call
+        :param key: If provided, this is used to get the list of items from
+            each result. This is useful for methods that return more than just
+            a list, like get_alerts.
+        :return: Pairs of server name and item
+        """
+        merged = []
+        for name, result in results.items():
+            if not result.ok:
+                continue
+            items = result.value if key is None else key(result.value)
+            merged += [(name, item) for item in items]
+        return merged
+
+    def close(self) -> None:
+        """Cleans up every API object. The FleetAPI may no longer be used
+        after this call.
+        """
+        for api in self._apis.values():
+            api.close()
+
+    def __getattr__(self, name: str):
+        if name.startswith("_") or not hasattr(BrainFrameAPI, name):
+            raise AttributeError(name)
+
+        def fleet_method(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+
+        return fleet_method
@@ -0,0 +1,304 @@
+import json
+import sqlite3
+from pathlib import Path
+from threading import RLock
+from time import time
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+
+from .bf_codecs import Encoding, Identity, Ordering, SortOptions
+from .bulk import DEFAULT_MAX_WORKERS, run_concurrently
+from .stubs.base_stub import DEFAULT_TIMEOUT
+
+_IDENTITY_PAGE_SIZE = 500
+"""The number of identities to request at a time while looking for new
+identities
+"""
+
+_FULL_PULL_RATIO = 0.5
+"""If more than this fraction of the server's encodings are missing locally,
+all encodings are pulled in one request instead of one request per encoding
+"""
+
+
+class IdentityMirror:
+    """A persistent local copy of a server's identities and encodings that is
+    kept up to date incrementally.
+
+    Each sync only downloads identities and encodings that were added since
+    the last sync, and removes those that were deleted. Lookups are served
+    locally, syncing first if the last sync is older than the freshness
+    bound.
+
+    Changes to existing identities, like a new nickname, are not detected by
+    incremental syncs. Use sync(full=True) to pick those up.
+
+    Encodings are compared by ID using get_encoding_ids, which relies on the
+    server supporting the ``fields`` query parameter. On servers that don't,
+    every sync downloads every encoding's vector just to list their IDs.
+    """
+
+    def __init__(self, api, path: Union[str, Path] = ":memory:",
+                 max_staleness: Optional[float] = 60,
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 timeout=DEFAULT_TIMEOUT):
+        """
+        :param api: Used to communicate with the BrainFrame server
+        :param path: The path to the SQLite database file to persist the
+            mirror in. If the file does not exist, it will be created.
+        :param max_staleness: The maximum time in seconds since the last sync
+            before lookups sync again. If None, lookups never sync
+            automatically.
+        :param max_workers: The maximum number of requests to have in flight
+            at once while syncing
+        :param timeout: The timeout to use for each request
+        """
+        self._api = api
+        self._max_staleness = max_staleness
+        self._max_workers = max_workers
+        self._timeout = timeout
+
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = RLock()
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS identities ("
+                "id INTEGER PRIMARY KEY, "
+                "unique_name TEXT NOT NULL, "
+                "nickname TEXT NOT NULL, "
+                "metadata TEXT NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS encodings ("
+                "id INTEGER PRIMARY KEY, "
+                "identity_id INTEGER NOT NULL, "
+                "class_name TEXT NOT NULL, "
+                "from_image INTEGER, "
+                "vector BLOB NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                "key TEXT PRIMARY KEY, "
+                "value REAL NOT NULL)")
+
+    @property
+    def last_sync(self) -> Optional[float]:
+        """The Unix timestamp of the last completed sync, or None if the
+        mirror has never been synced
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM sync_state WHERE key = 'last_sync'"
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def sync(self, full: bool = False) -> None:
+        """Brings the mirror up to date with the server.
+
+        :param full: If True, all identities are downloaded again, picking up
+            any changes made to existing identities
+        """
+        with self._lock:
+            start_time = time()
+            self._sync_identities(full)
+            self._sync_encodings()
+
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (key, value) "
+                    "VALUES ('last_sync', ?)", (start_time,))
+
+    def get_identity(self, identity_id: int) -> Identity:
+        """Gets the identity with the given ID, contacting the server only if
+        it isn't in the mirror.
+
+        :param identity_id: The ID of the identity to get
+        :return: Identity
+        """
+        self._sync_if_stale()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, unique_name, nickname, metadata FROM identities "
+                "WHERE id = ?", (identity_id,)).fetchone()
+
+        if row is None:
+            identity = self._api.get_identity(identity_id,
+                                              timeout=self._timeout)
+            self._store_identities([identity])
+            return identity
+
+        return _row_to_identity(row)
+
+    def get_encoding(self, encoding_id: int) -> Encoding:
+        """Gets the encoding with the given ID, contacting the server only if
+        it isn't in the mirror.
+
+        :param encoding_id: The ID of the encoding to get
+        :return: Encoding
+        """
+        self._sync_if_stale()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, identity_id, class_name, from_image, vector "
+                "FROM encodings WHERE id = ?", (encoding_id,)).fetchone()
+
+        if row is None:
+            encoding = self._api.get_encoding(encoding_id,
+                                              timeout=self._timeout)
+            self._store_encodings([encoding])
+            return encoding
+
+        return _row_to_encoding(row)
+
+    def get_encodings(self, identity_id: Optional[int] = None,
+                      class_name: Optional[str] = None) -> List[Encoding]:
+        """Gets all encodings in the mirror that match the given filters.
+
+        :param identity_id: If specified, only encodings attached to this
+            identity will be returned
+        :param class_name: If specified, only encodings for the given class
+            name will be returned
+        :return: All encodings that match this filter
+        """
+        self._sync_if_stale()
+
+        query = ("SELECT id, identity_id, class_name, from_image, vector "
+                 "FROM encodings WHERE 1")
+        params = []
+        if identity_id is not None:
+            query += " AND identity_id = ?"
+            params.append(identity_id)
+        if class_name is not None:
+            query += " AND class_name = ?"
+            params.append(class_name)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [_row_to_encoding(row) for row in rows]
+
+    def close(self) -> None:
+        """Closes the underlying database. The mirror may no longer be used
+        after this call.
+        """
+        with self._lock:
+            self._conn.close()
+
+    def _sync_if_stale(self) -> None:
+        if self._max_staleness is None:
+            return
+
+        last_sync = self.last_sync
+        if last_sync is None or time() - last_sync > self._max_staleness:
+            self.sync()
+
+    def _sync_identities(self, full: bool) -> None:
+        local_ids = self._local_ids("identities")
+        new_identities = []
+        total_count = None
+
+        # New identities get increasing IDs, so page backwards from the newest
+        # identity until one that is already known is reached
+        offset = 0
+        while True:
+            identities, total_count = self._api.get_identities(
+                limit=_IDENTITY_PAGE_SIZE,
+                offset=offset,
+                sort_by=SortOptions("id", Ordering.DESC),
+                timeout=self._timeout)
+
+            unseen = [i for i in identities if full or i.id not in local_ids]
+            new_identities += unseen
+            offset += len(identities)
+
+            if len(unseen) < len(identities) \
+                    or len(identities) < _IDENTITY_PAGE_SIZE:
+                break
+
+        self._store_identities(new_identities)
+
+        known_count = len(local_ids | {i.id for i in new_identities})
+        if full or known_count != total_count:
+            # Identities were deleted, so find out which ones by listing them
+            # all
+            if not full:
+                identities, _ = self._api.get_identities(
+                    timeout=self._timeout)
+                self._store_identities(
+                    [i for i in identities if i.id not in local_ids])
+                new_identities = identities
+
+            server_ids = {i.id for i in new_identities}
+            deleted = local_ids - server_ids
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM identities WHERE id = ?",
+                    [(i,) for i in deleted])
+                self._conn.executemany(
+                    "DELETE FROM encodings WHERE identity_id = ?",
+                    [(i,) for i in deleted])
+
+    def _sync_encodings(self) -> None:
+        local_ids = self._local_ids("encodings")
+        server_ids = set(self._api.get_encoding_ids(timeout=self._timeout))
+
+        deleted = local_ids - server_ids
+        with self._conn:
+            self._conn.executemany("DELETE FROM encodings WHERE id = ?",
+                                   [(i,) for i in deleted])
+
+        added = server_ids - local_ids
+        if len(added) == 0:
+            return
+
+        if len(added) > len(server_ids) * _FULL_PULL_RATIO:
+            encodings = self._api.get_encodings(timeout=self._timeout)
+            self._store_encodings([e for e in encodings if e.id in added])
+        else:
+            results = run_concurrently(
+                lambda encoding_id: self._api.get_encoding(
+                    encoding_id, timeout=self._timeout),
+                ((i, (i,)) for i in added),
+                self._max_workers)
+            # Encodings deleted during the sync will have failed, and are
+            # simply not stored
+            self._store_encodings(
+                [r.value for r in results.values() if r.ok])
+
+    def _local_ids(self, table: str) -> set:
+        rows = self._conn.execute(f"SELECT id FROM {table}").fetchall()
+        return {row[0] for row in rows}
+
+    def _store_identities(self, identities: Iterable[Identity]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO identities "
+                "(id, unique_name, nickname, metadata) VALUES (?, ?, ?, ?)",
+                [(i.id, i.unique_name, i.nickname, json.dumps(i.metadata))
+                 for i in identities])
+
+    def _store_encodings(self, encodings: Iterable[Encoding]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO encodings "
+                "(id, identity_id, class_name, from_image, vector) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(e.id, e.identity_id, e.class_name, e.from_image,
+                  np.asarray(e.vector, dtype=np.float32).tobytes())
+                 for e in encodings])
+
+
+def _row_to_identity(row) -> Identity:
+    identity_id, unique_name, nickname, metadata = row
+    return Identity(id=identity_id,
+                    unique_name=unique_name,
+                    nickname=nickname,
+                    metadata=json.loads(metadata))
+
+
+def _row_to_encoding(row) -> Encoding:
+    encoding_id, identity_id, class_name, from_image, vector = row
+    return Encoding(id=encoding_id,
+                    identity_id=identity_id,
+                    class_name=class_name,
+                    from_image=from_image,
+                    vector=vector)
@@ -0,0 +1,298 @@
+"""Hooks for measuring the performance of requests made by the API.
+
+Hooks are added to an API object with BrainFrameAPI.add_instrumentation_hook
+and are called for every request the API object makes. Errors raised by a
+hook are logged instead of failing the request.
+
+Events cover the time until the response headers arrive and the time spent
+downloading and parsing JSON bodies. Converting parsed JSON into codecs, like
+Identity.from_dict, is not measured, since each stub method does it after the
+response is decoded.
+
+.. code-block:: python
+
+   metrics = RequestMetrics()
+   api.add_instrumentation_hook(metrics)
+   ...
+   for (method, endpoint), stats in metrics.summary().items():
+       print(method, endpoint, stats.count, stats.mean_latency)
+"""
+import re
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from dataclasses import dataclass, field
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                           2.5, 5.0, 10.0)
+"""The default upper bounds of latency histogram buckets, in seconds"""
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+@dataclass
+class RequestEvent:
+    """Describes a request, once the server's response headers have been
+    received or the request has failed.
+    """
+
+    method: str
+    """The HTTP method, like GET or POST"""
+
+    endpoint: str
+    """The requested URL path with IDs replaced by {id}, like
+    /api/streams/{id}/analyze. This keeps the number of distinct endpoints
+    small.
+    """
+
+    response_time: float
+    """The time in seconds from sending the request to receiving the response
+    headers. This includes connecting, sending the request body, and the time
+    the server spent handling the request.
+    """
+
+    bytes_sent: int
+    """The size of the request body"""
+
+    status_code: Optional[int] = None
+    """The HTTP status code, or None if no response was received"""
+
+    error: Optional[BaseException] = None
+    """The error the request failed with, if any"""
+
+
+@dataclass
+class DecodeEvent:
+    """Describes the downloading and parsing of a JSON response body."""
+
+    method: str
+    """The HTTP method, like GET or POST"""
+
+    endpoint: str
+    """The requested URL path with IDs replaced by {id}"""
+
+    bytes_received: int
+    """The size of the response body"""
+
+    download_time: float
+    """The time in seconds spent reading the response body"""
+
+    decode_time: float
+    """The time in seconds spent parsing the response body as JSON"""
+
+
+class InstrumentationHook:
+    """Receives events about requests made by the API. Subclass this and
+    override the methods for events of interest.
+
+    Hooks are called on the thread that made the request, so they should be
+    fast and thread-safe.
+    """
+
+    def request_finished(self, event: RequestEvent) -> None:
+        """Called when the response headers for a request are received, or
+        when the request fails.
+        """
+
+    def response_decoded(self, event: DecodeEvent) -> None:
+        """Called when a JSON response body has been downloaded and parsed."""
+
+
+@dataclass
+class EndpointStats:
+    """Aggregated statistics for one endpoint."""
+
+    latency_buckets: Sequence[float]
+    """The upper bound of each latency histogram bucket, in seconds"""
+
+    latency_counts: List[int] = field(default_factory=list)
+    """The number of requests in each latency bucket. The last count is for
+    requests slower than every bucket.
+    """
+
+    count: int = 0
+    """The number of requests"""
+
+    errors: int = 0
+    """The number of requests that failed"""
+
+    total_latency: float = 0.0
+    """The sum of the response times of every request, in seconds"""
+
+    bytes_sent: int = 0
+    """The total size of all request bodies"""
+
+    bytes_received: int = 0
+    """The total size of all decoded response bodies"""
+
+    total_download_time: float = 0.0
+    """The total time spent reading response bodies, in seconds"""
+
+    total_decode_time: float = 0.0
+    """The total time spent parsing response bodies, in seconds"""
+
+    @property
+    def mean_latency(self) -> Optional[float]:
+        """The average response time in seconds, or None if there have been
+        no requests
+        """
+        return self.total_latency / self.count if self.count else None
+
+
+class RequestMetrics(InstrumentationHook):
+    """Keeps latency histograms and byte counters for every endpoint."""
+
+    def __init__(self, latency_buckets: Sequence[float]
+                 = DEFAULT_LATENCY_BUCKETS):
+        """
+        :param latency_buckets: The upper bounds of the latency histogram
+            buckets in seconds, in ascending order
+        """
+        self._latency_buckets = tuple(latency_buckets)
+        self._stats: Dict[Tuple[str, str], EndpointStats] = {}
+        self._lock = Lock()
+
+    def request_finished(self, event: RequestEvent) -> None:
+        bucket = bisect_left(self._latency_buckets, event.response_time)
+
+        with self._lock:
+            stats = self._get_stats(event.method, event.endpoint)
+            stats.count += 1
+            stats.total_latency += event.response_time
+            stats.latency_counts[bucket] += 1
+            stats.bytes_sent += event.bytes_sent
+            if event.error is not None:
+                stats.errors += 1
+
+    def response_decoded(self, event: DecodeEvent) -> None:
+        with self._lock:
+            stats = self._get_stats(event.method, event.endpoint)
+            stats.bytes_received += event.bytes_received
+            stats.total_download_time += event.download_time
+            stats.total_decode_time += event.decode_time
+
+    def summary(self) -> Dict[Tuple[str, str], EndpointStats]:
+        """
+        :return: A copy of the statistics for each endpoint, keyed by HTTP
+            method and endpoint
+        """
+        with self._lock:
+            return {key: EndpointStats(**{**stats.__dict__,
+                                          "latency_counts":
+                                              list(stats.latency_counts)})
+                    for key, stats in self._stats.items()}
+
+    def reset(self) -> None:
+        """Forgets all collected statistics."""
+        with self._lock:
+            self._stats.clear()
+
+    def _get_stats(self, method: str, endpoint: str) -> EndpointStats:
+        stats = self._stats.get((method, endpoint))
+        if stats is None:
+            stats = EndpointStats(
+                latency_buckets=self._latency_buckets,
+                latency_counts=[0] * (len(self._latency_buckets) + 1))
+            self._stats[(method, endpoint)] = stats
+        return stats
+
+
+class PrometheusHook(InstrumentationHook):
+    """Exports request metrics with the prometheus_client library, which must
+    be installed separately.
+    """
+
+    def __init__(self, registry=None, prefix: str = "brainframe_api"):
+        """
+        :param registry: The Prometheus registry to register metrics with.
+            Defaults to the global registry.
+        :param prefix: The prefix of every metric name
+        """
+        import prometheus_client
+
+        kwargs = {} if registry is None else {"registry": registry}
+        labels = ["method", "endpoint"]
+
+        self._latency = prometheus_client.Histogram(
+            f"{prefix}_response_seconds",
+            "Time until response headers were received",
+            labels, buckets=DEFAULT_LATENCY_BUCKETS, **kwargs)
+        self._errors = prometheus_client.Counter(
+            f"{prefix}_errors_total", "Requests that failed",
+            labels, **kwargs)
+        self._bytes_sent = prometheus_client.Counter(
+            f"{prefix}_sent_bytes_total", "Request body bytes sent",
+            labels, **kwargs)
+        self._bytes_received = prometheus_client.Counter(
+            f"{prefix}_received_bytes_total", "Response body bytes decoded",
+            labels, **kwargs)
+        self._decode_time = prometheus_client.Histogram(
+            f"{prefix}_decode_seconds",
+            "Time spent downloading and parsing response bodies",
+            labels, buckets=DEFAULT_LATENCY_BUCKETS, **kwargs)
+
+    def request_finished(self, event: RequestEvent) -> None:
+        labels = (event.method, event.endpoint)
+        self._latency.labels(*labels).observe(event.response_time)
+        self._bytes_sent.labels(*labels).inc(event.bytes_sent)
+        if event.error is not None:
+            self._errors.labels(*labels).inc()
+
+    def response_decoded(self, event: DecodeEvent) -> None:
+        labels = (event.method, event.endpoint)
+        self._bytes_received.labels(*labels).inc(event.bytes_received)
+        self._decode_time.labels(*labels).observe(
+            event.download_time + event.decode_time)
+
+
+class OpenTelemetryHook(InstrumentationHook):
+    """Exports request metrics with the OpenTelemetry metrics API, which must
+    be installed separately.
+    """
+
+    def __init__(self, meter_provider=None):
+        """
+        :param meter_provider: The meter provider to create instruments with.
+            Defaults to the global meter provider.
+        """
+        from opentelemetry import metrics
+
+        meter = metrics.get_meter("brainframe.api",
+                                  meter_provider=meter_provider)
+        self._latency = meter.create_histogram(
+            "brainframe.api.response_time", unit="s",
+            description="Time until response headers were received")
+        self._errors = meter.create_counter(
+            "brainframe.api.errors", description="Requests that failed")
+        self._bytes_sent = meter.create_counter(
+            "brainframe.api.bytes_sent", unit="By",
+            description="Request body bytes sent")
+        self._bytes_received = meter.create_counter(
+            "brainframe.api.bytes_received", unit="By",
+            description="Response body bytes decoded")
+        self._decode_time = meter.create_histogram(
+            "brainframe.api.decode_time", unit="s",
+            description="Time spent downloading and parsing response bodies")
+
+    def request_finished(self, event: RequestEvent) -> None:
+        attributes = {"method": event.method, "endpoint": event.endpoint}
+        self._latency.record(event.response_time, attributes)
+        self._bytes_sent.add(event.bytes_sent, attributes)
+        if event.error is not None:
+            self._errors.add(1, attributes)
+
+    def response_decoded(self, event: DecodeEvent) -> None:
+        attributes = {"method": event.method, "endpoint": event.endpoint}
+        self._bytes_received.add(event.bytes_received, attributes)
+        self._decode_time.record(event.download_time + event.decode_time,
+                                 attributes)
+
+
+def endpoint_name(path: str) -> str:
+    """Replaces IDs in a URL path with {id}.
+
+    :param path: A URL path, like /api/streams/3/analyze
+    :return: The endpoint name, like /api/streams/{id}/analyze
+    """
+    return _ID_SEGMENT.sub("/{id}", path)
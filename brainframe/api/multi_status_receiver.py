@@ -0,0 +1,366 @@
+import asyncio
+import base64
+import http.client
+import logging
+import ssl
+from io import BytesIO
+from threading import RLock, Thread
+from time import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urlparse
+
+from dataclasses import dataclass
+
+from . import bf_codecs, bf_errors
+from .compression import Decompressor, available_encodings
+from .stub import BrainFrameAPI
+from .stubs.zone_statuses import parse_zone_status_packet
+
+MULTI_ZONE_STATUS_TYPE = Dict[Tuple[str, int],
+                              Dict[str, bf_codecs.ZoneStatus]]
+"""Zone statuses from many servers. The keys are a server name and stream ID,
+and the values are dicts whose keys are zone names and whose values are the
+ZoneStatus for that zone.
+"""
+
+_STATUS_STREAM_PATH = "/api/streams/statuses"
+_PACKET_DELIMITER = b"\r\n"
+
+
+@dataclass
+class ServerStreamMetrics:
+    """Connection health for one server's zone status stream."""
+
+    connected: bool = False
+    """True if the stream is currently connected"""
+
+    reconnects: int = 0
+    """The number of times the stream has been reconnected"""
+
+    packets: int = 0
+    """The number of packets received from this server"""
+
+    last_packet_time: Optional[float] = None
+    """The Unix timestamp when the last packet was received"""
+
+    lag: Optional[float] = None
+    """The time in seconds between when the most recent zone status in the
+    last packet was created and when the packet was received
+    """
+
+    last_error: Optional[str] = None
+    """A description of the last connection error, if any"""
+
+
+class MultiStatusReceiver:
+    """Follows the zone status streams of many servers on a single thread and
+    merges them into one feed.
+
+    Unlike the StatusReceiver, which uses one thread per server, all streams
+    are read on a single asyncio event loop. Each server is reconnected
+    independently with exponential backoff when its stream fails.
+
+    Streams are authenticated with each API object's session, so reconnecting
+    doesn't send the password to the server again while the session is
+    valid. Responses may be compressed with any encoding the API objects
+    accept. Streams are read with a built-in HTTP/1.1 client, which connects
+    to servers directly and verifies certificates against the system's
+    trusted authorities. Proxies and transports set on the API objects are
+    not used.
+
+    .. code-block:: python
+
+       receiver = MultiStatusReceiver({
+           "site-a": BrainFrameAPI("http://10.0.0.10"),
+           "site-b": BrainFrameAPI("http://10.0.1.10"),
+       })
+
+       def on_statuses(zone_statuses):
+           for (server_name, stream_id), statuses in zone_statuses.items():
+               ...
+
+       receiver.add_listener(on_statuses)
+    """
+
+    def __init__(self, apis: Mapping[str, BrainFrameAPI],
+                 idle_timeout: float = 10,
+                 max_reconnect_delay: float = 30):
+        """
+        :param apis: API objects for each server, keyed by a name for the
+            server. The server URL and credentials are taken from each API
+            object.
+        :param idle_timeout: The time in seconds without any data from a
+            server before its connection is considered dead and reconnected
+        :param max_reconnect_delay: The longest time in seconds to wait
+            between reconnection attempts
+        """
+        self._apis = dict(apis)
+        self._idle_timeout = idle_timeout
+        self._max_reconnect_delay = max_reconnect_delay
+
+        self._listeners: List[Callable[[MULTI_ZONE_STATUS_TYPE], Any]] = []
+        self._listener_lock = RLock()
+
+        self._latest_statuses: MULTI_ZONE_STATUS_TYPE = {}
+        self._metrics = {name: ServerStreamMetrics() for name in self._apis}
+
+        self._loop = asyncio.new_event_loop()
+        self._tasks: List[asyncio.Task] = []
+        self._running = True
+        self._thread = Thread(
+            name="MultiStatusReceiverThread",
+            target=self._run,
+            daemon=True,
+        )
+        self._thread.start()
+
+    def add_listener(self,
+                     listener: Callable[[MULTI_ZONE_STATUS_TYPE], Any]):
+        """
+        :param listener: Called with new zone statuses whenever a packet is
+            received from any server
+        """
+        with self._listener_lock:
+            self._listeners.append(listener)
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def latest_statuses(self, server_name: str, stream_id: int) \
+            -> Dict[str, bf_codecs.ZoneStatus]:
+        """Returns the latest cached ZoneStatuses for a stream on a server, or
+        an empty dict if none are cached
+        """
+        return self._latest_statuses.get((server_name, stream_id), {})
+
+    def metrics(self) -> Dict[str, ServerStreamMetrics]:
+        """
+        :return: Connection health for each server, keyed by server name
+        """
+        return dict(self._metrics)
+
+    def close(self) -> None:
+        """Closes every connection and stops the receiving thread"""
+        self._running = False
+        try:
+            # Scheduled even if the loop hasn't started yet, in which case the
+            # tasks are cancelled as soon as it does
+            self._loop.call_soon_threadsafe(self._cancel_all)
+        except RuntimeError:
+            # The loop has already stopped and been closed
+            pass
+        self._thread.join()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._tasks = [self._loop.create_task(self._follow(name, api))
+                       for name, api in self._apis.items()]
+        try:
+            self._loop.run_until_complete(
+                asyncio.gather(*self._tasks, return_exceptions=True))
+        finally:
+            self._loop.close()
+            self._running = False
+
+    def _cancel_all(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def _follow(self, server_name: str, api: BrainFrameAPI):
+        """Keeps a connection to a server's zone status stream open,
+        reconnecting when it fails.
+        """
+        metrics = self._metrics[server_name]
+        delay = 0.5
+        stale_session_id = None
+
+        try:
+            while self._running:
+                session_id = None
+                try:
+                    # Sessions are fetched through the API object, so that
+                    # reconnecting streams don't each check the credentials
+                    session_id = await self._loop.run_in_executor(
+                        None, api.get_session_id, stale_session_id,
+                        self._idle_timeout)
+                    async for packet in self._packets(api, session_id):
+                        if not self._running:
+                            return
+                        metrics.connected = True
+                        delay = 0.5
+                        self._ingest(server_name, packet)
+                except asyncio.CancelledError:
+                    return
+                except (OSError, asyncio.TimeoutError, ValueError,
+                        asyncio.IncompleteReadError,
+                        bf_errors.BaseAPIError) as exc:
+                    if isinstance(exc, bf_errors.InvalidSessionError):
+                        stale_session_id = session_id
+                    # API errors already include their kind
+                    metrics.last_error = str(exc) \
+                        if isinstance(exc, bf_errors.BaseAPIError) \
+                        else f"{type(exc).__name__}: {exc}"
+                    logging.warning(f"MultiStatusReceiver: Could not read "
+                                    f"from server {server_name}: {exc}")
+
+                metrics.connected = False
+                if not self._running:
+                    return
+
+                metrics.reconnects += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self._max_reconnect_delay)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            metrics.connected = False
+
+    async def _packets(self, api: BrainFrameAPI, session_id: Optional[str]):
+        """Opens a zone status stream with a minimal HTTP/1.1 client and
+        yields each raw packet.
+
+        :param api: The API object of the server to read from
+        :param session_id: The session to authenticate with, or None to use
+            the API object's credentials, if any
+        """
+        url = urlparse(api.server_url)
+        secure = url.scheme == "https"
+        port = url.port or (443 if secure else 80)
+
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                url.hostname, port,
+                ssl=ssl.create_default_context() if secure else None),
+            self._idle_timeout)
+
+        try:
+            writer.write(_status_stream_request(url, session_id,
+                                                api.credentials))
+            await writer.drain()
+
+            status_line = await self._read(reader.readline())
+            status = status_line.split(b" ", 2)
+            if len(status) < 2 or not status[1].isdigit():
+                raise ValueError(f"Invalid status line: {status_line!r}")
+
+            header_lines = []
+            while True:
+                line = await self._read(reader.readline())
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                header_lines.append(line)
+            headers = http.client.parse_headers(
+                BytesIO(b"".join(header_lines) + b"\r\n"))
+
+            status_code = int(status[1])
+            if status_code == 401:
+                if session_id is not None:
+                    raise bf_errors.InvalidSessionError(
+                        "The session was rejected")
+                raise bf_errors.UnauthorizedError("The credentials were "
+                                                  "rejected")
+            if status_code != 200:
+                raise ValueError(f"Unexpected response: {status_line!r}")
+
+            transfer_codings = [
+                coding.strip().lower() for coding
+                in headers.get("Transfer-Encoding", "").split(",")]
+            chunked = "chunked" in transfer_codings
+
+            decompressor = None
+            content_encoding = headers.get("Content-Encoding", "identity")
+            if content_encoding.strip().lower() != "identity":
+                decompressor = Decompressor(content_encoding.strip().lower())
+
+            buffer = b""
+            while True:
+                if chunked:
+                    size_line = await self._read(reader.readline())
+                    try:
+                        size = int(size_line.split(b";")[0].strip(), 16)
+                    except ValueError:
+                        raise ValueError(f"Invalid chunk size: "
+                                         f"{size_line!r}") from None
+                    if size == 0:
+                        return
+                    data = await self._read(reader.readexactly(size + 2))
+                    data = data[:-2]
+                else:
+                    data = await self._read(reader.read(65536))
+                    if data == b"":
+                        return
+
+                if decompressor is not None:
+                    data = decompressor.decompress(data)
+
+                buffer += data
+                *packets, buffer = buffer.split(_PACKET_DELIMITER)
+                for packet in packets:
+                    if packet:
+                        yield packet
+        finally:
+            writer.close()
+
+    async def _read(self, coroutine):
+        return await asyncio.wait_for(coroutine, self._idle_timeout)
+
+    def _ingest(self, server_name: str, packet: bytes):
+        try:
+            zone_statuses = parse_zone_status_packet(packet)
+        except (ValueError, KeyError) as exc:
+            # A bad packet doesn't mean the connection is broken, so it's
+            # skipped instead of reconnecting
+            logging.warning(f"MultiStatusReceiver: Skipping invalid packet "
+                            f"from server {server_name}: {exc}")
+            return
+        now = time()
+
+        metrics = self._metrics[server_name]
+        metrics.packets += 1
+        metrics.last_packet_time = now
+
+        tstamps = [status.tstamp for statuses in zone_statuses.values()
+                   for status in statuses.values()]
+        if tstamps:
+            metrics.lag = now - max(tstamps)
+
+        merged = {(server_name, stream_id): statuses
+                  for stream_id, statuses in zone_statuses.items()}
+        self._latest_statuses.update(merged)
+
+        with self._listener_lock:
+            for listener in self._listeners:
+                try:
+                    listener(merged)
+                except Exception:
+                    # One broken listener shouldn't stop the stream or the
+                    # other listeners
+                    logging.exception("MultiStatusReceiver: Listener failed "
+                                      "to handle zone statuses")
+
+
+def _status_stream_request(url, session_id: Optional[str],
+                           credentials: Optional[Tuple[str, str]]) -> bytes:
+    """Creates an HTTP request for the zone status stream, authenticated with
+    the session if there is one, and otherwise with the credentials.
+    """
+    host = url.hostname if url.port is None \
+        else f"{url.hostname}:{url.port}"
+    lines = [
+        f"GET {url.path.rstrip('/')}{_STATUS_STREAM_PATH} HTTP/1.1",
+        f"Host: {host}",
+        "Accept: */*",
+        f"Accept-Encoding: {', '.join(available_encodings())}",
+        "Connection: keep-alive",
+    ]
+
+    if session_id is not None:
+        lines.append(f"Cookie: session_id={session_id}")
+    elif credentials is not None:
+        # Only used with servers that don't give out sessions
+        username, password = credentials
+        token = base64.b64encode(f"{username}:{password}".encode("utf-8"))
+        lines.append(f"Authorization: Basic {token.decode('ascii')}")
+
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
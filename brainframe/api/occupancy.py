@@ -0,0 +1,252 @@
+import time
+from collections import Counter
+from threading import RLock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from .stubs.zone_statuses import ZONE_STATUS_TYPE
+
+DEFAULT_DWELL_BIN_EDGES = (0, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+"""The default dwell time histogram bins, in seconds. The last bin includes
+all dwell times longer than the last edge.
+"""
+
+
+@dataclass
+class ZoneOccupancy:
+    """A snapshot of occupancy statistics for a zone."""
+
+    stream_id: int
+    """The ID of the stream the zone is in"""
+
+    zone_name: str
+    """The name of the zone"""
+
+    occupancy: Dict[str, int]
+    """The number of objects currently in the zone, keyed by class name"""
+
+    peak_occupancy: int
+    """The highest total number of objects that have been in the zone at
+    once
+    """
+
+    peak_time: Optional[float]
+    """The Unix timestamp when the peak occupancy was first reached"""
+
+    entries: int
+    """The total number of objects that have entered the zone"""
+
+    exits: int
+    """The total number of objects that have exited the zone"""
+
+    dwell_histogram: np.ndarray
+    """The number of tracked objects whose stay in the zone fell in each dwell
+    time bin
+    """
+
+    dwell_bin_edges: np.ndarray
+    """The lower edge of each dwell time bin, in seconds"""
+
+    mean_dwell: Optional[float]
+    """The average time in seconds tracked objects stayed in the zone, or None
+    if no tracked object has exited yet
+    """
+
+    hourly_entries: np.ndarray
+    """The number of entries during each hour of the day, in local time"""
+
+    hourly_peak_occupancy: np.ndarray
+    """The peak occupancy during each hour of the day, in local time"""
+
+    @property
+    def total_occupancy(self) -> int:
+        """The number of objects of any class currently in the zone"""
+        return sum(self.occupancy.values())
+
+
+class _ZoneState:
+    """Running occupancy statistics for a single zone."""
+
+    def __init__(self, num_dwell_bins: int):
+        self.occupancy = Counter()
+        self.total = 0
+        self.peak = 0
+        self.peak_time = None
+        self.entries = 0
+        self.exits = 0
+        self.dwell_histogram = np.zeros(num_dwell_bins, dtype=np.int64)
+        self.dwell_sum = 0.0
+        self.dwell_count = 0
+        self.hourly_entries = np.zeros(24, dtype=np.int64)
+        self.hourly_peak = np.zeros(24, dtype=np.int64)
+        self.entered_at: Dict = {}
+        self.last_sweep = 0.0
+        self.last_resync = None
+
+
+class OccupancyTracker:
+    """Keeps running occupancy and dwell time statistics for every zone.
+
+    The work done for most frames is proportional to the number of objects
+    entering and exiting, not the number of objects in the zone. Occupancy is
+    taken from the objects within the zone on a zone's first frame and
+    resynced from them periodically, so objects that were already in the zone
+    or that left without being seen exiting don't make it drift for long.
+    Dwell times are measured for detections with a track ID.
+
+    .. code-block:: python
+
+       tracker = OccupancyTracker()
+       tracker.attach(api.get_status_receiver())
+       ...
+       occupancy = tracker.snapshot(stream_id, "Lobby")
+       print(occupancy.total_occupancy, occupancy.peak_occupancy)
+    """
+
+    def __init__(self,
+                 dwell_bin_edges: Sequence[float] = DEFAULT_DWELL_BIN_EDGES,
+                 max_dwell: float = 24 * 60 * 60,
+                 resync_interval: float = 10.0):
+        """
+        :param dwell_bin_edges: The lower edge of each dwell time histogram
+            bin, in seconds, in ascending order
+        :param max_dwell: The maximum time in seconds an object is expected to
+            stay in a zone. Objects that entered longer ago than this are
+            assumed to have left without being seen exiting, and are not
+            counted towards dwell times.
+        :param resync_interval: The time in seconds between recounts of the
+            objects within each zone
+        """
+        self._dwell_bin_edges = np.asarray(dwell_bin_edges, dtype=np.float64)
+        self._max_dwell = max_dwell
+        self._resync_interval = resync_interval
+
+        self._zones: Dict[Tuple[int, str], _ZoneState] = {}
+        self._lock = RLock()
+
+    def attach(self, status_receiver) -> None:
+        """Starts tracking occupancy from the given StatusReceiver.
+
+        :param status_receiver: The receiver to get zone statuses from
+        """
+        status_receiver.add_listener(self.ingest)
+
+    def ingest(self, zone_statuses: ZONE_STATUS_TYPE) -> None:
+        """Updates occupancy with a set of zone statuses, as produced by the
+        zone status stream.
+
+        :param zone_statuses: The zone statuses to process
+        """
+        with self._lock:
+            for stream_id, statuses in zone_statuses.items():
+                for zone_name, status in statuses.items():
+                    state = self._zones.get((stream_id, zone_name))
+                    if state is None:
+                        state = _ZoneState(len(self._dwell_bin_edges))
+                        self._zones[(stream_id, zone_name)] = state
+
+                    self._update(state, status)
+
+    def snapshot(self, stream_id: int, zone_name: str) \
+            -> Optional[ZoneOccupancy]:
+        """
+        :param stream_id: The ID of the stream the zone is in
+        :param zone_name: The name of the zone
+        :return: The current occupancy statistics for the zone, or None if no
+            statuses have been received for it yet
+        """
+        with self._lock:
+            state = self._zones.get((stream_id, zone_name))
+            if state is None:
+                return None
+            return self._to_snapshot(stream_id, zone_name, state)
+
+    def snapshots(self) -> List[ZoneOccupancy]:
+        """
+        :return: The current occupancy statistics for every zone that
+            statuses have been received for
+        """
+        with self._lock:
+            return [self._to_snapshot(stream_id, zone_name, state)
+                    for (stream_id, zone_name), state in self._zones.items()]
+
+    def _update(self, state: _ZoneState, status) -> None:
+        tstamp = status.tstamp
+        hour = time.localtime(tstamp).tm_hour
+
+        for detection in status.entering:
+            state.occupancy[detection.class_name] += 1
+            state.total += 1
+            state.entries += 1
+            state.hourly_entries[hour] += 1
+            if detection.track_id is not None:
+                state.entered_at[detection.track_id] = tstamp
+
+        for detection in status.exiting:
+            # Objects that entered before the last resync may have been
+            # missed, so counts can't go below zero
+            if state.occupancy[detection.class_name] > 0:
+                state.occupancy[detection.class_name] -= 1
+                state.total -= 1
+            state.exits += 1
+
+            entered_at = state.entered_at.pop(detection.track_id, None)
+            if entered_at is not None:
+                dwell = tstamp - entered_at
+                bin_index = np.searchsorted(self._dwell_bin_edges, dwell,
+                                            side="right") - 1
+                state.dwell_histogram[max(bin_index, 0)] += 1
+                state.dwell_sum += dwell
+                state.dwell_count += 1
+
+        if state.last_resync is None \
+                or tstamp - state.last_resync >= self._resync_interval:
+            # Running counts drift when objects are missed entering or
+            # exiting, so they're periodically replaced with a recount
+            state.occupancy = Counter(status.detection_within_counts)
+            state.total = sum(state.occupancy.values())
+            state.last_resync = tstamp
+
+        if state.total > state.peak:
+            state.peak = state.total
+            state.peak_time = tstamp
+        if state.total > state.hourly_peak[hour]:
+            state.hourly_peak[hour] = state.total
+
+        if tstamp - state.last_sweep > self._max_dwell:
+            self._sweep(state, tstamp)
+
+    def _sweep(self, state: _ZoneState, now: float) -> None:
+        """Forgets objects that have been in the zone for longer than the
+        maximum dwell time, since they most likely left without being seen.
+        """
+        state.entered_at = {track_id: entered_at
+                            for track_id, entered_at
+                            in state.entered_at.items()
+                            if now - entered_at <= self._max_dwell}
+        state.last_sweep = now
+
+    def _to_snapshot(self, stream_id: int, zone_name: str,
+                     state: _ZoneState) -> ZoneOccupancy:
+        mean_dwell = None
+        if state.dwell_count > 0:
+            mean_dwell = state.dwell_sum / state.dwell_count
+
+        return ZoneOccupancy(
+            stream_id=stream_id,
+            zone_name=zone_name,
+            occupancy={class_name: count
+                       for class_name, count in state.occupancy.items()
+                       if count > 0},
+            peak_occupancy=state.peak,
+            peak_time=state.peak_time,
+            entries=state.entries,
+            exits=state.exits,
+            dwell_histogram=state.dwell_histogram.copy(),
+            dwell_bin_edges=self._dwell_bin_edges.copy(),
+            mean_dwell=mean_dwell,
+            hourly_entries=state.hourly_entries.copy(),
+            hourly_peak_occupancy=state.hourly_peak.copy())
@@ -0,0 +1,232 @@
+"""Waits for BrainFrame servers to be ready to handle requests.
+
+Servers are checked with an exponentially growing wait between checks, so a
+server that takes a while to start isn't flooded with requests. Checks are
+sent through the API object, reusing its pooled connections.
+
+.. code-block:: python
+
+   for server_name, result in wait_for_servers(fleet.apis, timeout=300):
+       if result.ok:
+           print(f"{server_name} is ready")
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import Event
+from time import monotonic
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Iterator,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from dataclasses import dataclass
+
+from . import bf_errors
+from .bulk import BulkResult
+from .retry import backoff_delay
+
+if TYPE_CHECKING:
+    from .stub import BrainFrameAPI
+
+
+@dataclass
+class ReadinessPolicy:
+    """Decides how often to check if a server is ready."""
+
+    initial_delay: float = 0.1
+    """The time in seconds to wait after the first check"""
+
+    multiplier: float = 1.5
+    """The wait time is multiplied by this after each check"""
+
+    max_delay: float = 2.0
+    """The longest time in seconds to wait between checks"""
+
+    jitter: float = 0.2
+    """The wait time is randomly adjusted by up to this fraction, so that
+    clients waiting on the same server don't all check at the same time
+    """
+
+    check_timeout: float = 5.0
+    """The timeout to use for each check"""
+
+    def delay(self, attempt: int) -> float:
+        """
+        :param attempt: The number of checks made so far
+        :return: The time in seconds to wait before the next check
+        """
+        return backoff_delay(attempt, self.initial_delay, self.multiplier,
+                             self.max_delay, self.jitter)
+
+
+def is_server_ready(api: "BrainFrameAPI",
+                    timeout: Optional[float] = None) -> bool:
+    """Checks once if a server is ready to handle requests.
+
+    :param api: The API of the server to check
+    :param timeout: The timeout to use for this request
+    :return: True if the server is ready, False if it's still starting or
+        can't be reached
+    """
+    try:
+        api.version(timeout=timeout)
+    except (bf_errors.ServerNotReadyError, bf_errors.UnauthorizedError):
+        # Server not started yet or there is a communication error
+        return False
+    except bf_errors.UnknownError as exc:
+        if exc.status_code not in [502]:
+            raise
+        return False
+    return True
+
+
+def wait_until_ready(api: "BrainFrameAPI", timeout: Optional[float] = None,
+                     policy: Optional[ReadinessPolicy] = None) -> None:
+    """Waits for a server to be ready to handle requests.
+
+    :param api: The API of the server to wait for
+    :param timeout: The maximum amount of time, in seconds, to wait for the
+        server to start. If None, this function will wait indefinitely.
+    :param policy: Decides how often to check the server. Defaults to
+        ReadinessPolicy()
+    :raises TimeoutError: If the server did not start in time
+    """
+    _wait_until_ready(api, timeout, policy, Event())
+
+
+async def wait_until_ready_async(api: "BrainFrameAPI",
+                                 timeout: Optional[float] = None,
+                                 policy: Optional[ReadinessPolicy] = None) \
+        -> None:
+    """Like wait_until_ready, but waits without blocking the event loop.
+    Checks are run in the loop's default executor.
+    """
+    import asyncio
+
+    policy = policy or ReadinessPolicy()
+    deadline = None if timeout is None else monotonic() + timeout
+    # get_running_loop was added in Python 3.7
+    loop = getattr(asyncio, "get_running_loop", asyncio.get_event_loop)()
+
+    attempt = 0
+    while True:
+        attempt += 1
+        if await loop.run_in_executor(
+                None, is_server_ready, api,
+                _check_timeout(policy, deadline)):
+            return
+
+        delay = policy.delay(attempt)
+        if deadline is not None:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise TimeoutError("The server did not start in time!")
+            delay = min(delay, remaining)
+        await asyncio.sleep(delay)
+
+
+def wait_for_servers(apis: Mapping[str, "BrainFrameAPI"],
+                     timeout: Optional[float] = None,
+                     policy: Optional[ReadinessPolicy] = None) \
+        -> Iterator[Tuple[str, BulkResult[None]]]:
+    """Waits for many servers at once, yielding each server as soon as it's
+    ready.
+
+    :param apis: The API of each server, keyed by a name for the server
+    :param timeout: The maximum amount of time, in seconds, to wait for the
+        servers. If None, this function will wait indefinitely.
+    :param policy: Decides how often to check each server. Defaults to
+        ReadinessPolicy()
+    :return: Pairs of the server's name and the result of waiting for it, in
+        the order the servers became ready. Servers that did not start in
+        time hold a ServerNotReadyError, and servers that failed hold the
+        error that occurred.
+    """
+    if len(apis) == 0:
+        return
+
+    stop = Event()
+    executor = ThreadPoolExecutor(max_workers=len(apis),
+                                  thread_name_prefix="ReadinessWaiter")
+    try:
+        futures = {executor.submit(_wait_until_ready, api, timeout, policy,
+                                   stop):
+                   name for name, api in apis.items()}
+        for future in as_completed(futures):
+            yield futures[future], _wait_result(futures[future], future)
+    finally:
+        # If iteration stops early, stop checking the remaining servers.
+        # Checks that are already in flight finish in the background.
+        stop.set()
+        executor.shutdown(wait=False)
+
+
+async def wait_for_servers_async(apis: Mapping[str, "BrainFrameAPI"],
+                                 timeout: Optional[float] = None,
+                                 policy: Optional[ReadinessPolicy] = None) \
+        -> AsyncIterator[Tuple[str, BulkResult[None]]]:
+    """Like wait_for_servers, but waits without blocking the event loop."""
+    import asyncio
+
+    async def wait(name, api):
+        try:
+            await wait_until_ready_async(api, timeout, policy)
+        except (TimeoutError, bf_errors.BaseAPIError) as exc:
+            return name, exc
+        return name, None
+
+    for next_done in asyncio.as_completed(
+            [wait(name, api) for name, api in apis.items()]):
+        name, exc = await next_done
+        yield name, _result(name, exc)
+
+
+def _wait_until_ready(api: "BrainFrameAPI", timeout: Optional[float],
+                      policy: Optional[ReadinessPolicy], stop: Event) -> None:
+    """Like wait_until_ready, but returns early without checking the server
+    again once the stop event is set.
+    """
+    policy = policy or ReadinessPolicy()
+    deadline = None if timeout is None else monotonic() + timeout
+
+    attempt = 0
+    while not stop.is_set():
+        attempt += 1
+        if is_server_ready(api, _check_timeout(policy, deadline)):
+            return
+
+        delay = policy.delay(attempt)
+        if deadline is not None:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise TimeoutError("The server did not start in time!")
+            delay = min(delay, remaining)
+        stop.wait(delay)
+
+
+def _wait_result(name: str, future) -> BulkResult[None]:
+    try:
+        future.result()
+    except (TimeoutError, bf_errors.BaseAPIError) as exc:
+        return _result(name, exc)
+    return BulkResult()
+
+
+def _result(name: str, exc: Optional[BaseException]) -> BulkResult[None]:
+    if isinstance(exc, TimeoutError):
+        exc = bf_errors.ServerNotReadyError(
+            f"Server {name} did not start in time")
+    return BulkResult(error=exc)
+
+
+def _check_timeout(policy: ReadinessPolicy,
+                   deadline: Optional[float]) -> float:
+    """Shortens the check timeout so that a check that hangs doesn't run past
+    the deadline.
+    """
+    if deadline is None:
+        return policy.check_timeout
+    return max(min(policy.check_timeout, deadline - monotonic()), 0.01)
@@ -0,0 +1,624 @@
+"""Brings a server's premises, streams, zones and zone alarms in line with a
+desired state, making only the changes that are needed.
+
+Objects are matched with the server's objects by name, since the desired
+state doesn't know their IDs. Matched objects are compared with
+``Codec.__eq__`` and only sent to the server if they differ, so unchanged
+streams aren't restarted.
+
+.. code-block:: python
+
+   desired = DesiredState.from_dict(json.load(open("cameras.json")))
+   reconciler = Reconciler(api)
+
+   plan = reconciler.plan(desired)
+   print(plan)  # A dry run
+   report = reconciler.apply(plan)
+"""
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional, Tuple
+
+from . import bf_errors
+from .bf_codecs import (
+    Codec,
+    Premises,
+    StreamConfiguration,
+    Zone,
+    ZoneAlarm,
+)
+from .bulk import BulkResult, DEFAULT_MAX_WORKERS, run_concurrently
+from .stub import BrainFrameAPI
+from .stubs.base_stub import DEFAULT_TIMEOUT
+
+CREATE = "create"
+UPDATE = "update"
+DELETE = "delete"
+
+PREMISES = "premises"
+STREAM = "stream"
+ZONE = "zone"
+ALARM = "alarm"
+
+_ACTION_SYMBOLS = {CREATE: "+", UPDATE: "~", DELETE: "-"}
+
+# Creates and updates are made parents first, so that children can refer to
+# their parent's ID. Deletes are made children first, after everything else,
+# so that streams can be moved off of a premises before it's deleted.
+_PHASES = [
+    (CREATE, PREMISES), (CREATE, STREAM), (UPDATE, STREAM),
+    (CREATE, ZONE), (UPDATE, ZONE), (CREATE, ALARM), (UPDATE, ALARM),
+    (DELETE, ALARM), (DELETE, ZONE), (DELETE, STREAM), (DELETE, PREMISES),
+]
+
+
+@dataclass
+class DesiredStream:
+    """A stream that should exist, along with its zones and their alarms."""
+
+    stream: StreamConfiguration
+    """The configuration of the stream. Its ID and premises ID are ignored."""
+
+    premises_name: Optional[str] = None
+    """The name of the premises the stream is a part of, or None if it isn't
+    part of a premises
+    """
+
+    zones: List[Zone] = field(default_factory=list)
+    """The zones that should exist in the stream, other than the full-frame
+    zone, which always exists. The full-frame zone may be included to manage
+    its alarms. The IDs and stream IDs of zones and alarms are ignored.
+    """
+
+
+@dataclass
+class DesiredState:
+    """The premises, streams, zones and alarms that should exist on a
+    server.
+    """
+
+    premises: List[Premises] = field(default_factory=list)
+    """The premises that should exist. Their IDs are ignored."""
+
+    streams: List[DesiredStream] = field(default_factory=list)
+    """The streams that should exist"""
+
+    @staticmethod
+    def from_dict(d: dict) -> "DesiredState":
+        """Parses a desired state document. Objects are in the same format as
+        their codecs, without IDs. Streams refer to their premises by name
+        and contain their zones, which contain their alarms:
+
+        .. code-block:: json
+
+           {
+             "premises": [{"name": "Warehouse"}],
+             "streams": [{
+               "name": "Loading Dock",
+               "premises": "Warehouse",
+               "connection_type": "ip_camera",
+               "connection_options": {"url": "rtsp://192.168.1.10/live"},
+               "zones": [{
+                 "name": "Door",
+                 "coords": [[0, 0], [100, 0], [100, 100], [0, 100]],
+                 "alarms": [...]
+               }]
+             }]
+           }
+
+        :param d: The document
+        :return: The desired state it describes
+        """
+        premises = [Premises(name=p["name"]) for p in d.get("premises", [])]
+
+        streams = []
+        for stream_d in d.get("streams", []):
+            stream = StreamConfiguration.from_dict({
+                "id": None,
+                "premises_id": None,
+                "runtime_options": {},
+                "metadata": {},
+                **{key: value for key, value in stream_d.items()
+                   if key not in ("premises", "zones")},
+            })
+
+            zones = []
+            for zone_d in stream_d.get("zones", []):
+                alarms = [_alarm_from_dict(alarm_d)
+                          for alarm_d in zone_d.get("alarms", [])]
+                zones.append(Zone(name=zone_d["name"],
+                                  stream_id=None,
+                                  coords=zone_d.get("coords", []),
+                                  alarms=alarms))
+
+            streams.append(DesiredStream(
+                stream=stream,
+                premises_name=stream_d.get("premises"),
+                zones=zones))
+
+        return DesiredState(premises=premises, streams=streams)
+
+
+@dataclass
+class Change:
+    """A single change to make to the server."""
+
+    action: str
+    """One of CREATE, UPDATE or DELETE"""
+
+    kind: str
+    """The type of object to change. One of PREMISES, STREAM, ZONE or ALARM"""
+
+    path: Tuple[str, ...]
+    """The names that identify the object. For premises and streams, this is
+    their name. For zones, this is the stream name and zone name. For alarms,
+    this is the stream name, zone name and alarm name.
+    """
+
+    desired: Optional[Codec] = None
+    """The object as it should be, or None if it's being deleted"""
+
+    current: Optional[Codec] = None
+    """The object as it is now, or None if it's being created"""
+
+    changed_fields: List[str] = field(default_factory=list)
+    """For updates, the names of the fields that are different"""
+
+    def __str__(self):
+        description = f"{_ACTION_SYMBOLS[self.action]} {self.kind} " \
+                      f"{'/'.join(self.path)}"
+        if self.changed_fields:
+            description += f" ({', '.join(self.changed_fields)})"
+        return description
+
+
+@dataclass
+class ReconciliationPlan:
+    """The changes needed to bring a server to a desired state. Printing the
+    plan describes each change.
+    """
+
+    changes: List[Change]
+    """All changes, in no particular order"""
+
+    stream_premises: Dict[str, Optional[str]] = field(default_factory=dict)
+    """The name of the premises each desired stream belongs to"""
+
+    premises_ids: Dict[str, int] = field(default_factory=dict)
+    """The IDs of existing premises, by name"""
+
+    stream_ids: Dict[str, int] = field(default_factory=dict)
+    """The IDs of existing streams, by name"""
+
+    zone_ids: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    """The IDs of existing zones, by stream name and zone name"""
+
+    @property
+    def empty(self) -> bool:
+        """True if the server is already in the desired state"""
+        return len(self.changes) == 0
+
+    def __str__(self):
+        if self.empty:
+            return "No changes"
+        ordered = sorted(self.changes, key=lambda c: (
+            _PHASES.index((c.action, c.kind)), c.path))
+        return "\n".join(str(change) for change in ordered)
+
+
+@dataclass
+class ReconciliationReport:
+    """The outcome of applying a plan."""
+
+    plan: ReconciliationPlan
+    """The plan that was applied"""
+
+    results: List[BulkResult]
+    """The result of each change, in the same order as the plan's changes.
+    Changes that depended on a failed change hold the error of the change
+    they depended on.
+    """
+
+    @property
+    def ok(self) -> bool:
+        """True if every change was made"""
+        return all(result.ok for result in self.results)
+
+    @property
+    def failures(self) -> List[Tuple[Change, bf_errors.BaseAPIError]]:
+        """Each change that failed, with the error that occurred"""
+        return [(change, result.error) for change, result
+                in zip(self.plan.changes, self.results) if not result.ok]
+
+
+class Reconciler:
+    """Plans and applies the changes needed to bring a server to a desired
+    state.
+    """
+
+    def __init__(self, api: BrainFrameAPI, prune: bool = False,
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 timeout=DEFAULT_TIMEOUT):
+        """
+        :param api: The API of the server to reconcile
+        :param prune: If True, objects that aren't in the desired state are
+            deleted. Premises and streams are deleted from the whole server.
+            Zones are only deleted from desired streams, and alarms are only
+            deleted from desired zones. The full-frame zone is never deleted.
+        :param max_workers: The maximum number of requests to have in flight
+            at once
+        :param timeout: The timeout to use for each request
+        """
+        self._api = api
+        self.prune = prune
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def reconcile(self, desired: DesiredState) -> ReconciliationReport:
+        """Plans and immediately applies the changes needed to reach the
+        desired state.
+
+        :param desired: The state the server should be in
+        :return: The outcome of each change
+        """
+        return self.apply(self.plan(desired))
+
+    def plan(self, desired: DesiredState) -> ReconciliationPlan:
+        """Finds the changes needed to reach the desired state, without
+        making them. This takes three requests, no matter the size of the
+        state.
+
+        :param desired: The state the server should be in
+        :return: The changes to make
+        :raises ValueError: If the desired state has duplicate names or
+            refers to a premises that doesn't exist
+        """
+        current_premises = self._api.get_all_premises(timeout=self.timeout)
+        current_streams = self._api.get_stream_configurations(
+            timeout=self.timeout)
+        current_zones = self._api.get_zones(timeout=self.timeout)
+
+        premises_by_name = _by_name(current_premises)
+        streams_by_name = _by_name(current_streams)
+        stream_names = {stream.id: stream.name for stream in current_streams}
+        zones_by_key: Dict[Tuple[str, str], Zone] = {}
+        for zone in current_zones:
+            key = (stream_names.get(zone.stream_id), zone.name)
+            zones_by_key.setdefault(key, zone)
+
+        _check_unique("premises", [p.name for p in desired.premises])
+        _check_unique("stream", [s.stream.name for s in desired.streams])
+
+        plan = ReconciliationPlan(
+            changes=[],
+            premises_ids={name: p.id for name, p in premises_by_name.items()},
+            stream_ids={name: s.id for name, s in streams_by_name.items()},
+            zone_ids={key: zone.id for key, zone in zones_by_key.items()})
+        changes = plan.changes
+
+        desired_premises = {premises.name for premises in desired.premises}
+        for name in sorted(desired_premises - premises_by_name.keys()):
+            changes.append(Change(CREATE, PREMISES, (name,),
+                                  desired=Premises(name=name)))
+
+        for desired_stream in desired.streams:
+            premises_name = desired_stream.premises_name
+            if premises_name is not None \
+                    and premises_name not in desired_premises \
+                    and premises_name not in premises_by_name:
+                raise ValueError(f"Stream {desired_stream.stream.name} is "
+                                 f"part of premises {premises_name}, which "
+                                 f"does not exist")
+            plan.stream_premises[desired_stream.stream.name] = premises_name
+
+            changes += self._plan_stream(desired_stream, streams_by_name,
+                                         premises_by_name, zones_by_key)
+
+        if self.prune:
+            desired_streams = {s.stream.name for s in desired.streams}
+            for name, stream in streams_by_name.items():
+                if name not in desired_streams:
+                    changes.append(Change(DELETE, STREAM, (name,),
+                                          current=stream))
+            for name, premises in premises_by_name.items():
+                if name not in desired_premises:
+                    changes.append(Change(DELETE, PREMISES, (name,),
+                                          current=premises))
+
+        return plan
+
+    def apply(self, plan: ReconciliationPlan) -> ReconciliationReport:
+        """Makes the changes in a plan. Changes of the same kind are made
+        concurrently, and parents are created before their children.
+
+        :param plan: The plan to apply
+        :return: The outcome of each change
+        """
+        premises_ids = dict(plan.premises_ids)
+        stream_ids = dict(plan.stream_ids)
+        zone_ids = dict(plan.zone_ids)
+        # The errors of objects that failed to be created, by their kind and
+        # path
+        failed: Dict[Tuple[str, Tuple[str, ...]],
+                     bf_errors.BaseAPIError] = {}
+        results: Dict[int, BulkResult] = {}
+
+        def make_change(change: Change):
+            if change.action == DELETE:
+                self._delete(change)
+                return None
+
+            desired = change.desired
+            if change.kind == STREAM:
+                premises_name = plan.stream_premises.get(change.path[0])
+                desired = replace(
+                    desired, premises_id=None if premises_name is None
+                    else premises_ids[premises_name])
+            elif change.kind == ZONE:
+                desired = replace(desired, stream_id=stream_ids[change.path[0]])
+            elif change.kind == ALARM:
+                zone_id = zone_ids.get(change.path[:2])
+                if zone_id is None:
+                    raise bf_errors.ZoneNotFoundError(
+                        f"Zone {'/'.join(change.path[:2])} does not exist")
+                desired = replace(desired,
+                                  stream_id=stream_ids[change.path[0]],
+                                  zone_id=zone_id)
+            return self._save(change.kind, desired)
+
+        for action, kind in _PHASES:
+            phase = [(i, change) for i, change in enumerate(plan.changes)
+                     if change.action == action and change.kind == kind]
+            if not phase:
+                continue
+
+            if kind == ALARM and action != DELETE:
+                self._find_full_frame_zones(
+                    [change for _, change in phase], stream_ids, zone_ids)
+
+            calls = []
+            for i, change in phase:
+                error = _dependency_error(change, plan, failed)
+                if error is None:
+                    calls.append((i, (change,)))
+                    continue
+                results[i] = BulkResult(error=error)
+                if change.action == CREATE:
+                    failed[(change.kind, change.path)] = error
+
+            for i, result in run_concurrently(
+                    make_change, calls, self.max_workers).items():
+                results[i] = result
+                change = plan.changes[i]
+                if change.action != CREATE:
+                    continue
+                if not result.ok:
+                    failed[(change.kind, change.path)] = result.error
+                else:
+                    if kind == PREMISES:
+                        premises_ids[change.path[0]] = result.value.id
+                    elif kind == STREAM:
+                        stream_ids[change.path[0]] = result.value.id
+                    elif kind == ZONE:
+                        zone_ids[change.path] = result.value.id
+
+        return ReconciliationReport(
+            plan=plan,
+            results=[results[i] for i in range(len(plan.changes))])
+
+    def _plan_stream(self, desired_stream: DesiredStream,
+                     streams_by_name: Dict[str, StreamConfiguration],
+                     premises_by_name: Dict[str, Premises],
+                     zones_by_key: Dict[Tuple[str, str], Zone]) \
+            -> List[Change]:
+        changes = []
+        stream_name = desired_stream.stream.name
+        current = streams_by_name.get(stream_name)
+
+        premises = premises_by_name.get(desired_stream.premises_name)
+        target = replace(desired_stream.stream,
+                         id=None if current is None else current.id,
+                         premises_id=None if premises is None else premises.id)
+        if current is None:
+            changes.append(Change(CREATE, STREAM, (stream_name,),
+                                  desired=target))
+        else:
+            changed_fields = _changed_fields(target, current)
+            if desired_stream.premises_name is not None and premises is None:
+                # The stream's premises is new, so its ID isn't known yet
+                changed_fields.append("premises_id")
+            if changed_fields:
+                changes.append(Change(UPDATE, STREAM, (stream_name,),
+                                      desired=target, current=current,
+                                      changed_fields=changed_fields))
+
+        _check_unique(f"zone in stream {stream_name}",
+                      [zone.name for zone in desired_stream.zones])
+        for zone in desired_stream.zones:
+            zone_key = (stream_name, zone.name)
+            current_zone = zones_by_key.get(zone_key)
+            current_alarms = [] if current_zone is None \
+                else current_zone.alarms
+
+            # The full-frame zone is made by the server with each stream, and
+            # can't be edited
+            if zone.name != Zone.FULL_FRAME_ZONE_NAME:
+                # Alarms are sent separately, and existing ones are kept when
+                # a zone is updated
+                target = replace(
+                    zone, alarms=current_alarms,
+                    id=None if current_zone is None else current_zone.id,
+                    stream_id=None if current_zone is None
+                    else current_zone.stream_id)
+                if current_zone is None:
+                    changes.append(Change(CREATE, ZONE, zone_key,
+                                          desired=replace(target, alarms=[])))
+                elif target != current_zone:
+                    changes.append(Change(
+                        UPDATE, ZONE, zone_key,
+                        desired=target, current=current_zone,
+                        changed_fields=_changed_fields(target, current_zone)))
+
+            changes += self._plan_alarms(zone_key, zone.alarms,
+                                         current_alarms)
+
+        if self.prune and current is not None:
+            desired_zones = {zone.name for zone in desired_stream.zones}
+            for (zone_stream, zone_name), zone in zones_by_key.items():
+                if zone_stream == stream_name \
+                        and zone_name not in desired_zones \
+                        and zone_name != Zone.FULL_FRAME_ZONE_NAME:
+                    changes.append(Change(DELETE, ZONE, (stream_name,
+                                                         zone_name),
+                                          current=zone))
+        return changes
+
+    def _plan_alarms(self, zone_key: Tuple[str, str],
+                     alarms: List[ZoneAlarm],
+                     current_alarms: List[ZoneAlarm]) -> List[Change]:
+        changes = []
+        current_by_name = _by_name(current_alarms)
+
+        _check_unique(f"alarm in zone {'/'.join(zone_key)}",
+                      [alarm.name for alarm in alarms])
+        for alarm in alarms:
+            alarm_key = (*zone_key, alarm.name)
+            current = current_by_name.get(alarm.name)
+            if current is None:
+                changes.append(Change(CREATE, ALARM, alarm_key,
+                                      desired=alarm))
+                continue
+
+            target = _with_ids(alarm, current)
+            if target != current:
+                changes.append(Change(
+                    UPDATE, ALARM, alarm_key, desired=target, current=current,
+                    changed_fields=_changed_fields(target, current)))
+
+        if self.prune:
+            desired_alarms = {alarm.name for alarm in alarms}
+            for name, current in current_by_name.items():
+                if name not in desired_alarms:
+                    changes.append(Change(DELETE, ALARM, (*zone_key, name),
+                                          current=current))
+        return changes
+
+    def _find_full_frame_zones(self, changes: List[Change],
+                               stream_ids: Dict[str, int],
+                               zone_ids: Dict[Tuple[str, str], int]) -> None:
+        """Looks up the IDs of full-frame zones that were created along with
+        new streams, so that alarms can be added to them.
+        """
+        stream_names = {change.path[0] for change in changes
+                        if change.path[:2] not in zone_ids
+                        and change.path[1] == Zone.FULL_FRAME_ZONE_NAME
+                        and change.path[0] in stream_ids}
+
+        def get_zones(stream_name):
+            return self._api.get_zones(stream_ids[stream_name],
+                                       timeout=self.timeout)
+
+        calls = ((name, (name,)) for name in stream_names)
+        for stream_name, result in run_concurrently(
+                get_zones, calls, self.max_workers).items():
+            for zone in result.value or []:
+                zone_ids.setdefault((stream_name, zone.name), zone.id)
+
+    def _save(self, kind: str, codec: Codec) -> Codec:
+        if kind == PREMISES:
+            return self._api.set_premises(codec, timeout=self.timeout)
+        elif kind == STREAM:
+            return self._api.set_stream_configuration(
+                codec, timeout=self.timeout)
+        elif kind == ZONE:
+            return self._api.set_zone(codec, timeout=self.timeout)
+        else:
+            return self._api.set_zone_alarm(codec, timeout=self.timeout)
+
+    def _delete(self, change: Change) -> None:
+        object_id = change.current.id
+        if change.kind == PREMISES:
+            self._api.delete_premises(object_id, timeout=self.timeout)
+        elif change.kind == STREAM:
+            self._api.delete_stream_configuration(
+                object_id, timeout=self.timeout)
+        elif change.kind == ZONE:
+            self._api.delete_zone(object_id, timeout=self.timeout)
+        else:
+            self._api.delete_zone_alarm(object_id, timeout=self.timeout)
+
+
+def _alarm_from_dict(d: dict) -> ZoneAlarm:
+    d = {"id": None, "zone_id": None, "stream_id": None,
+         "count_conditions": [], "rate_conditions": [],
+         "use_active_time": False, "active_start_time": "00:00:00",
+         "active_end_time": "23:59:59", **d}
+    d["count_conditions"] = [{"id": None, "with_attribute": None, **c}
+                             for c in d["count_conditions"]]
+    d["rate_conditions"] = [{"id": None, "with_attribute": None, **c}
+                            for c in d["rate_conditions"]]
+    return ZoneAlarm.from_dict(d)
+
+
+def _with_ids(alarm: ZoneAlarm, current: ZoneAlarm) -> ZoneAlarm:
+    """Copies the server-assigned IDs of an alarm and its conditions onto the
+    desired alarm, so that the two can be compared.
+    """
+    def condition_ids(conditions, current_conditions):
+        if len(conditions) != len(current_conditions):
+            return conditions
+        return [replace(condition, id=current_condition.id)
+                for condition, current_condition
+                in zip(conditions, current_conditions)]
+
+    return replace(
+        alarm,
+        id=current.id,
+        zone_id=current.zone_id,
+        stream_id=current.stream_id,
+        count_conditions=condition_ids(alarm.count_conditions,
+                                       current.count_conditions),
+        rate_conditions=condition_ids(alarm.rate_conditions,
+                                      current.rate_conditions))
+
+
+def _dependency_error(change: Change, plan: ReconciliationPlan,
+                      failed: Dict[Tuple[str, Tuple[str, ...]],
+                                   bf_errors.BaseAPIError]) \
+        -> Optional[bf_errors.BaseAPIError]:
+    """Returns the error of the failed creation of an object that this
+    change depends on, if any.
+    """
+    if change.kind == STREAM:
+        premises_name = plan.stream_premises.get(change.path[0])
+        dependencies = [(PREMISES, (premises_name,))]
+    elif change.kind == ZONE:
+        dependencies = [(STREAM, change.path[:1])]
+    elif change.kind == ALARM:
+        dependencies = [(STREAM, change.path[:1]), (ZONE, change.path[:2])]
+    else:
+        dependencies = []
+
+    for dependency in dependencies:
+        if dependency in failed:
+            return failed[dependency]
+    return None
+
+
+def _by_name(codecs: list) -> dict:
+    by_name = {}
+    for codec in codecs:
+        by_name.setdefault(codec.name, codec)
+    return by_name
+
+
+def _changed_fields(desired: Codec, current: Codec) -> List[str]:
+    desired_d, current_d = desired.to_dict(), current.to_dict()
+    return [key for key in desired_d if desired_d[key] != current_d.get(key)]
+
+
+def _check_unique(kind: str, names: List[str]) -> None:
+    seen = set()
+    for name in names:
+        if name in seen:
+            raise ValueError(f"There is more than one {kind} named {name}")
+        seen.add(name)
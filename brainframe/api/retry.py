@@ -0,0 +1,186 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import FrozenSet, Optional
+from urllib.parse import urlparse
+
+import requests
+from dataclasses import dataclass
+
+from .instrumentation import endpoint_name
+
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+"""HTTP status codes that indicate a temporary problem with the server"""
+
+
+@dataclass
+class RetryPolicy:
+    """Decides which failed requests are retried, and how long to wait
+    between attempts.
+
+    Requests are only retried when doing so can't cause an action to happen
+    twice. By default, GET, PUT, DELETE, HEAD and OPTIONS requests are retried
+    after any transient failure, since repeating them has the same effect as
+    sending them once. Other requests, like POST, are only retried if the
+    request provably never reached the server, or if their endpoint is
+    listed in ``idempotent_endpoints``.
+
+    .. code-block:: python
+
+       api.set_retry_policy(RetryPolicy(max_attempts=5, deadline=30))
+    """
+
+    max_attempts: int = 3
+    """The maximum number of times to send a request, including the first
+    attempt
+    """
+
+    backoff: float = 0.2
+    """The time in seconds to wait before the first retry"""
+
+    backoff_multiplier: float = 2.0
+    """The wait time is multiplied by this after each retry"""
+
+    max_backoff: float = 10.0
+    """The longest time in seconds to wait between attempts"""
+
+    jitter: float = 0.2
+    """The wait time is randomly adjusted by up to this fraction, so that
+    clients that failed at the same time don't all retry at the same time
+    """
+
+    deadline: Optional[float] = None
+    """The maximum time in seconds to spend on a request across all attempts.
+    A retry is not attempted if waiting for it would exceed the deadline. If
+    None, only max_attempts limits retries.
+    """
+
+    idempotent_methods: FrozenSet[str] = frozenset(
+        {"GET", "PUT", "DELETE", "HEAD", "OPTIONS"})
+    """HTTP methods that are always safe to retry"""
+
+    idempotent_endpoints: FrozenSet[str] = frozenset({"/api/process_image"})
+    """Endpoints whose requests are safe to retry regardless of method, in
+    the form returned by instrumentation.endpoint_name, like
+    /api/streams/{id}/analyze
+    """
+
+    def retry_delay(self, request: requests.Request, attempt: int,
+                    elapsed: float,
+                    resp: Optional[requests.Response] = None,
+                    exception: Optional[BaseException] = None) \
+            -> Optional[float]:
+        """Decides whether a failed request should be retried.
+
+        :param request: The request that failed
+        :param attempt: The number of attempts made so far, including the one
+            that just failed
+        :param elapsed: The time in seconds since the first attempt started
+        :param resp: The error response, if one was received
+        :param exception: The error that prevented a response from being
+            received, if any
+        :return: The time in seconds to wait before retrying, or None if the
+            request should not be retried
+        """
+        if attempt >= self.max_attempts or not _can_resend(request):
+            return None
+
+        if exception is not None:
+            if isinstance(exception, requests.exceptions.ConnectTimeout):
+                # The connection was never made, so the server never saw the
+                # request
+                retryable = True
+            else:
+                retryable = isinstance(
+                    exception, (requests.exceptions.ConnectionError,
+                                requests.exceptions.Timeout)) \
+                    and self.is_idempotent(request)
+        elif resp is not None and resp.status_code in RETRYABLE_STATUS_CODES:
+            # A 429 means the server refused to process the request
+            retryable = resp.status_code == 429 \
+                or self.is_idempotent(request)
+        else:
+            retryable = False
+
+        if not retryable:
+            return None
+
+        delay = backoff_delay(attempt, self.backoff, self.backoff_multiplier,
+                              self.max_backoff, self.jitter)
+
+        if resp is not None:
+            retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+        return delay
+
+    def is_idempotent(self, request: requests.Request) -> bool:
+        """
+        :param request: The request to check
+        :return: True if sending the request more than once has the same
+            effect as sending it once
+        """
+        if request.method.upper() in self.idempotent_methods:
+            return True
+        path = urlparse(request.url).path
+        return endpoint_name(path) in self.idempotent_endpoints
+
+
+def backoff_delay(attempt: int, initial: float, multiplier: float,
+                  maximum: float, jitter: float) -> float:
+    """Calculates an exponentially growing wait time with random jitter.
+
+    :param attempt: The number of attempts made so far, starting at 1
+    :param initial: The wait time after the first attempt
+    :param multiplier: The wait time is multiplied by this after each attempt
+    :param maximum: The longest wait time, before jitter is applied
+    :param jitter: The wait time is randomly adjusted by up to this fraction
+    :return: The time in seconds to wait
+    """
+    delay = min(initial * multiplier ** (attempt - 1), maximum)
+    return delay * (1 + random.uniform(-jitter, jitter))
+
+
+def _can_resend(request: requests.Request) -> bool:
+    """Checks if the request's body can be sent again. Bodies read from files
+    or iterators are consumed by the first attempt.
+    """
+    data = request.data
+    if not (data is None
+            or isinstance(data, (bytes, str, dict, list, tuple))):
+        return False
+
+    files = request.files or {}
+    if isinstance(files, dict):
+        files = files.items()
+    for _, value in files:
+        # Files are given either as their contents or as a tuple of the file
+        # name, contents, and optionally the content type and headers
+        if isinstance(value, tuple):
+            value = value[1] if len(value) > 1 else None
+        if not isinstance(value, (bytes, str)):
+            return False
+    return True
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header, which is either a number of seconds or an
+    HTTP date.
+    """
+    if value is None:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
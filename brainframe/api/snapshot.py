@@ -0,0 +1,472 @@
+"""Copies a server's configuration to another server, through a single
+compressed archive.
+
+.. code-block:: python
+
+   export_snapshot(production_api, "production.bfsnap")
+   report = import_snapshot(staging_api, "production.bfsnap")
+
+The archive holds premises, streams, zones, zone alarms, which streams are
+being analyzed, capsule option values and active flags, identities and
+encodings, along with the video files of file streams. Objects are identified
+by name inside the archive, and given new IDs when they're imported. Premises,
+streams, zones and alarms are imported with a Reconciler, so importing into a
+server that already has some of them only changes what's different.
+
+Capsules themselves, users, alerts and the images that encodings were made
+from are not included. Encodings are imported from their vectors, so the
+server doesn't need to encode anything again.
+
+The archive is a gzip-compressed tar file. Its first member is
+``snapshot.json``, which describes the configuration in the same format that
+``DesiredState.from_dict`` reads, with extra sections for everything else.
+Each storage object follows as ``storage/<id>``.
+"""
+import base64
+import json
+import os
+import tarfile
+from collections import defaultdict
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryFile, mkstemp
+from threading import Lock
+from typing import Dict, Iterator, List, Tuple, Union
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from . import bf_errors
+from .bf_codecs import Identity, StreamConfiguration
+from .bulk import BulkResult, DEFAULT_MAX_WORKERS, run_concurrently
+from .reconciler import DesiredState, Reconciler, ReconciliationReport
+from .stub import BrainFrameAPI
+from .stubs.base_stub import DEFAULT_TIMEOUT
+from .stubs.storage import STORAGE_CHUNK_SIZE
+
+SNAPSHOT_VERSION = 1
+"""The version of the snapshot format written by export_snapshot"""
+
+_SNAPSHOT_MEMBER = "snapshot.json"
+_STORAGE_PREFIX = "storage/"
+
+
+@dataclass
+class SnapshotImportReport:
+    """The outcome of importing a snapshot."""
+
+    reconciliation: ReconciliationReport
+    """The outcome of creating and updating premises, streams, zones and
+    alarms
+    """
+
+    storage_ids: Dict[int, int] = field(default_factory=dict)
+    """The new ID of each storage object that was uploaded, keyed by its ID
+    in the snapshot
+    """
+
+    failures: List[Tuple[str, bf_errors.BaseAPIError]] = \
+        field(default_factory=list)
+    """A description of everything else that couldn't be imported, with the
+    error that occurred
+    """
+
+    @property
+    def ok(self) -> bool:
+        """True if everything in the snapshot was imported"""
+        return self.reconciliation.ok and len(self.failures) == 0
+
+
+def export_snapshot(api: BrainFrameAPI, path: Union[str, Path],
+                    compression_level: int = 6,
+                    max_workers: int = DEFAULT_MAX_WORKERS,
+                    timeout=DEFAULT_TIMEOUT) -> None:
+    """Saves the configuration of a server to a snapshot archive. Requests
+    are sent concurrently, and storage objects are written to the archive as
+    they're downloaded instead of being held in memory.
+
+    :param api: The API of the server to export
+    :param path: The file to write the snapshot to. It's replaced if it
+        already exists, but only once the new snapshot is complete.
+    :param compression_level: The gzip compression level, from 0 to 9
+    :param max_workers: The maximum number of requests to have in flight at
+        once
+    :param timeout: The timeout to use for each request
+    :raises bf_errors.BaseAPIError: If anything couldn't be read from the
+        server, so that incomplete snapshots aren't written
+    """
+    listings = _unwrap(run_concurrently(
+        lambda get: get(timeout=timeout),
+        [("premises", (api.get_all_premises,)),
+         ("streams", (api.get_stream_configurations,)),
+         ("zones", (api.get_zones,)),
+         ("identities", (api.get_identities,)),
+         ("encodings", (api.get_encodings,)),
+         ("capsules", (api.get_capsules,))],
+        max_workers))
+
+    streams: List[StreamConfiguration] = listings["streams"]
+    capsule_names = [capsule.name for capsule in listings["capsules"]]
+    details = _unwrap(run_concurrently(
+        lambda get, *args: get(*args, timeout=timeout),
+        _detail_calls(api, streams, capsule_names),
+        max_workers))
+
+    doc = _snapshot_doc(listings, details, capsule_names)
+
+    storage_ids = {stream.connection_options["storage_id"]
+                   for stream in streams
+                   if stream.connection_type
+                   is StreamConfiguration.ConnType.FILE}
+    write_lock = Lock()
+
+    # The archive is written next to its destination and moved into place
+    # once it's complete, so a failed export never leaves a partial snapshot
+    path = Path(path)
+    temp_fd, temp_path = mkstemp(dir=str(path.parent),
+                                 prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(temp_fd, "wb") as temp_file, \
+                tarfile.open(fileobj=temp_file, mode="w:gz",
+                             format=tarfile.PAX_FORMAT,
+                             compresslevel=compression_level) as archive:
+            _add_member(archive, _SNAPSHOT_MEMBER,
+                        json.dumps(doc).encode("utf-8"))
+
+            def export_storage(storage_id):
+                with TemporaryFile() as data:
+                    mime_type = api.download_storage_data(
+                        storage_id, data, timeout=timeout)
+                    size = data.tell()
+                    data.seek(0)
+
+                    info = tarfile.TarInfo(f"{_STORAGE_PREFIX}{storage_id}")
+                    info.size = size
+                    info.pax_headers = {"mime_type": mime_type}
+                    with write_lock:
+                        archive.addfile(info, data)
+
+            _unwrap(run_concurrently(
+                export_storage,
+                ((storage_id, (storage_id,)) for storage_id in storage_ids),
+                max_workers))
+
+        os.replace(temp_path, str(path))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def import_snapshot(api: BrainFrameAPI, path: Union[str, Path],
+                    max_workers: int = DEFAULT_MAX_WORKERS,
+                    timeout=DEFAULT_TIMEOUT) -> SnapshotImportReport:
+    """Loads a snapshot archive into a server. Storage objects are uploaded
+    as they're read from the archive, and all other objects are sent
+    concurrently, parents first.
+
+    Capsule options are only set for capsules that are loaded on the server,
+    and identities that already exist on the server are left alone, along
+    with their encodings.
+
+    :param api: The API of the server to import into
+    :param path: The snapshot file to read
+    :param max_workers: The maximum number of requests to have in flight at
+        once
+    :param timeout: The timeout to use for each request
+    :return: The outcome of the import
+    :raises ValueError: If the file isn't a snapshot, or was written by a
+        newer version of this library
+    """
+    failures = []
+
+    with tarfile.open(str(path), "r|gz") as archive:
+        doc = _read_snapshot_doc(archive)
+
+        def upload(data, mime_type):
+            with data:
+                return api.new_storage(data, mime_type, timeout=timeout)
+
+        storage_results = run_concurrently(
+            upload, _storage_members(archive), max_workers)
+
+    storage_ids = {}
+    for storage_id, result in storage_results.items():
+        if result.ok:
+            storage_ids[storage_id] = result.value
+        else:
+            failures.append((f"storage {storage_id}", result.error))
+
+    # Streams whose video file couldn't be uploaded can't be created
+    stream_docs = []
+    for stream_d in doc["streams"]:
+        options = stream_d["connection_options"]
+        if stream_d["connection_type"] \
+                == StreamConfiguration.ConnType.FILE.value:
+            storage_id = options["storage_id"]
+            if storage_id not in storage_ids:
+                failures.append((f"stream {stream_d['name']}",
+                                 bf_errors.StorageNotFoundError(
+                                     f"Storage {storage_id} was not "
+                                     f"uploaded")))
+                continue
+            options = {**options, "storage_id": storage_ids[storage_id]}
+        stream_docs.append({**stream_d, "connection_options": options})
+
+    desired = DesiredState.from_dict({"premises": doc["premises"],
+                                      "streams": stream_docs})
+    reconciliation = Reconciler(api, max_workers=max_workers,
+                                timeout=timeout).reconcile(desired)
+
+    stream_ids = {stream.name: stream.id for stream
+                  in api.get_stream_configurations(timeout=timeout)}
+    failures += _import_identities(api, doc, max_workers, timeout)
+    failures += _import_capsules(api, doc, stream_ids, max_workers, timeout)
+
+    analyzing = [stream_ids[name] for name in doc["analyzing"]
+                 if name in stream_ids]
+    stream_names = {stream_id: name for name, stream_id in stream_ids.items()}
+    for stream_id, result in api.start_analyzing_many(
+            analyzing, max_workers, timeout).items():
+        if not result.ok:
+            failures.append((f"analysis of stream {stream_names[stream_id]}",
+                             result.error))
+
+    return SnapshotImportReport(reconciliation=reconciliation,
+                                storage_ids=storage_ids,
+                                failures=failures)
+
+
+def _detail_calls(api: BrainFrameAPI, streams: List[StreamConfiguration],
+                  capsule_names: List[str]) -> Iterator[Tuple[tuple, tuple]]:
+    """Makes a call for every per-stream and per-capsule value that the
+    snapshot includes.
+    """
+    for stream in streams:
+        yield ("analyzing", stream.id), (api.check_analyzing, stream.id)
+
+    for capsule_name in capsule_names:
+        for stream_id in [None] + [stream.id for stream in streams]:
+            yield (("options", capsule_name, stream_id),
+                   (api.get_capsule_option_vals, capsule_name, stream_id))
+            yield (("active", capsule_name, stream_id),
+                   (api.is_capsule_active, capsule_name, stream_id))
+
+
+def _snapshot_doc(listings: dict, details: dict,
+                  capsule_names: List[str]) -> dict:
+    premises_names = {premises.id: premises.name
+                      for premises in listings["premises"]}
+    streams: List[StreamConfiguration] = listings["streams"]
+
+    zones_by_stream = defaultdict(list)
+    for zone in listings["zones"]:
+        zone_d = _without(zone.to_dict(), "id", "stream_id")
+        zone_d["alarms"] = [_alarm_doc(alarm.to_dict())
+                            for alarm in zone.alarms]
+        zones_by_stream[zone.stream_id].append(zone_d)
+
+    stream_docs = []
+    for stream in streams:
+        stream_d = _without(stream.to_dict(), "id", "premises_id")
+        stream_d["premises"] = premises_names.get(stream.premises_id)
+        stream_d["zones"] = zones_by_stream[stream.id]
+        stream_docs.append(stream_d)
+
+    # Only stream-level values that differ from the global ones are kept, so
+    # that streams keep inheriting global values after they're imported
+    capsules = {}
+    for capsule_name in capsule_names:
+        option_vals = details[("options", capsule_name, None)]
+        active = details[("active", capsule_name, None)]
+        stream_option_vals = {}
+        stream_active = {}
+        for stream in streams:
+            stream_vals = details[("options", capsule_name, stream.id)]
+            changed = {name: value for name, value in stream_vals.items()
+                       if option_vals.get(name) != value}
+            if changed:
+                stream_option_vals[stream.name] = changed
+            if details[("active", capsule_name, stream.id)] != active:
+                stream_active[stream.name] = not active
+        capsules[capsule_name] = {
+            "option_vals": option_vals,
+            "active": active,
+            "stream_option_vals": stream_option_vals,
+            "stream_active": stream_active,
+        }
+
+    identity_names = {identity.id: identity.unique_name
+                      for identity in listings["identities"][0]}
+    encodings = [{
+        "identity": identity_names[encoding.identity_id],
+        "class_name": encoding.class_name,
+        "vector": base64.b64encode(
+            np.asarray(encoding.vector, dtype="<f4").tobytes()).decode(),
+    } for encoding in listings["encodings"]
+        if encoding.identity_id in identity_names]
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "premises": [{"name": premises.name}
+                     for premises in listings["premises"]],
+        "streams": stream_docs,
+        "analyzing": [stream.name for stream in streams
+                      if details[("analyzing", stream.id)]],
+        "capsules": capsules,
+        "identities": [_without(identity.to_dict(), "id")
+                       for identity in listings["identities"][0]],
+        "encodings": encodings,
+    }
+
+
+def _import_identities(api: BrainFrameAPI, doc: dict, max_workers: int,
+                       timeout) -> List[Tuple[str, bf_errors.BaseAPIError]]:
+    failures = []
+    existing, _ = api.get_identities(timeout=timeout)
+    existing_names = {identity.unique_name for identity in existing}
+
+    new_identities = [Identity.from_dict({"id": None, **identity_d})
+                      for identity_d in doc["identities"]
+                      if identity_d["unique_name"] not in existing_names]
+    identity_ids = {}
+    for unique_name, result in run_concurrently(
+            lambda identity: api.set_identity(identity, timeout=timeout),
+            ((identity.unique_name, (identity,))
+             for identity in new_identities),
+            max_workers).items():
+        if result.ok:
+            identity_ids[unique_name] = result.value.id
+        else:
+            failures.append((f"identity {unique_name}", result.error))
+
+    # new_identity_vectors takes vectors of one length at a time
+    by_length = defaultdict(list)
+    for encoding_d in doc["encodings"]:
+        if encoding_d["identity"] in identity_ids:
+            vector = np.frombuffer(base64.b64decode(encoding_d["vector"]),
+                                   dtype="<f4")
+            by_length[len(vector)].append((encoding_d, vector))
+
+    for encodings in by_length.values():
+        results = api.new_identity_vectors(
+            [identity_ids[encoding_d["identity"]]
+             for encoding_d, _ in encodings],
+            [encoding_d["class_name"] for encoding_d, _ in encodings],
+            np.stack([vector for _, vector in encodings]),
+            max_workers=max_workers,
+            timeout=timeout)
+        for row, result in results.items():
+            if not result.ok:
+                encoding_d = encodings[row][0]
+                failures.append((f"{encoding_d['class_name']} encoding of "
+                                 f"identity {encoding_d['identity']}",
+                                 result.error))
+
+    return failures
+
+
+def _import_capsules(api: BrainFrameAPI, doc: dict,
+                     stream_ids: Dict[str, int], max_workers: int,
+                     timeout) -> List[Tuple[str, bf_errors.BaseAPIError]]:
+    loaded = {capsule.name for capsule in api.get_capsules(timeout=timeout)}
+
+    calls = []
+    for capsule_name, capsule_d in doc["capsules"].items():
+        if capsule_name not in loaded:
+            continue
+
+        calls.append((f"{capsule_name} options",
+                      (api.set_capsule_option_vals,
+                       {"capsule_name": capsule_name,
+                        "option_vals": capsule_d["option_vals"]})))
+        calls.append((f"{capsule_name} active flag",
+                      (api.set_capsule_active,
+                       {"capsule_name": capsule_name,
+                        "active": capsule_d["active"]})))
+        for stream_name, option_vals \
+                in capsule_d["stream_option_vals"].items():
+            if stream_name in stream_ids:
+                calls.append((
+                    f"{capsule_name} options of stream {stream_name}",
+                    (api.set_capsule_option_vals,
+                     {"capsule_name": capsule_name,
+                      "stream_id": stream_ids[stream_name],
+                      "option_vals": option_vals})))
+        for stream_name, active in capsule_d["stream_active"].items():
+            if stream_name in stream_ids:
+                calls.append((
+                    f"{capsule_name} active flag of stream {stream_name}",
+                    (api.set_capsule_active,
+                     {"capsule_name": capsule_name,
+                      "stream_id": stream_ids[stream_name],
+                      "active": active})))
+
+    results = run_concurrently(
+        lambda setter, kwargs: setter(timeout=timeout, **kwargs),
+        calls, max_workers)
+    return [(description, result.error)
+            for description, result in results.items() if not result.ok]
+
+
+def _read_snapshot_doc(archive: tarfile.TarFile) -> dict:
+    member = archive.next()
+    if member is None or member.name != _SNAPSHOT_MEMBER:
+        raise ValueError("The file is not a snapshot")
+
+    doc = json.loads(archive.extractfile(member).read())
+    if doc.get("version", 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"The snapshot has version {doc['version']}, but "
+                         f"only versions up to {SNAPSHOT_VERSION} are "
+                         f"supported")
+    return doc
+
+
+def _storage_members(archive: tarfile.TarFile) \
+        -> Iterator[Tuple[int, tuple]]:
+    """Copies each storage object out of an archive that's being read in
+    order, so that it can be uploaded while the next one is read.
+    """
+    for member in archive:
+        if not member.name.startswith(_STORAGE_PREFIX):
+            continue
+
+        data = TemporaryFile()
+        source = archive.extractfile(member)
+        while True:
+            chunk = source.read(STORAGE_CHUNK_SIZE)
+            if not chunk:
+                break
+            data.write(chunk)
+        data.seek(0)
+
+        storage_id = int(member.name[len(_STORAGE_PREFIX):])
+        yield storage_id, (data, member.pax_headers["mime_type"])
+
+
+def _add_member(archive: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    archive.addfile(info, BytesIO(data))
+
+
+def _alarm_doc(alarm_d: dict) -> dict:
+    alarm_d = _without(alarm_d, "id", "zone_id", "stream_id")
+    for key in ("count_conditions", "rate_conditions"):
+        alarm_d[key] = [_without(condition, "id")
+                        for condition in alarm_d[key]]
+    return alarm_d
+
+
+def _without(d: dict, *keys: str) -> dict:
+    return {key: value for key, value in d.items() if key not in keys}
+
+
+def _unwrap(results: Dict[object, BulkResult]) -> dict:
+    """Returns the value of each result, raising the first error if any call
+    failed.
+    """
+    for result in results.values():
+        if not result.ok:
+            raise result.error
+    return {key: result.value for key, result in results.items()}
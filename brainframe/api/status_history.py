@@ -0,0 +1,363 @@
+from itertools import count
+from pathlib import Path
+from threading import RLock
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .stubs.zone_statuses import ZONE_STATUS_TYPE
+
+ENTERED = "entered"
+"""The number of objects that entered the zone"""
+
+EXITED = "exited"
+"""The number of objects that exited the zone"""
+
+WITHIN = "within"
+"""The number of objects within the zone"""
+
+_COUNT_COLUMNS = {
+    "tstamp": np.float64,
+    ENTERED: np.int64,
+    EXITED: np.int64,
+    WITHIN: np.int32,
+}
+"""The columns recorded for each zone and class"""
+
+_ALERT_COLUMNS = {
+    "tstamp": np.float64,
+    "alert_id": np.int64,
+    "alarm_id": np.int64,
+}
+"""The columns recorded for each new alert in a zone"""
+
+SeriesKey = Tuple[int, str, Optional[str]]
+"""Identifies a series by stream ID, zone name, and class name"""
+
+
+class _ChunkedColumns:
+    """Columns of values stored in fixed-size NumPy chunks. Rows are appended
+    to the newest chunk, and a new chunk is allocated when it is full.
+
+    When more than max_chunks chunks are full, the oldest chunk is written to
+    a Parquet file if a spill directory is set, or dropped otherwise.
+    """
+
+    def __init__(self, dtypes: Dict[str, type], chunk_size: int,
+                 max_chunks: Optional[int], spill_prefix: Optional[Path]):
+        self._dtypes = dtypes
+        self._chunk_size = chunk_size
+        self._max_chunks = max_chunks
+        self._spill_prefix = spill_prefix
+
+        self._chunks: List[Dict[str, np.ndarray]] = []
+        self._fill = chunk_size
+        self._spilled: List[Tuple[float, float, Path]] = []
+
+    def append(self, row: Tuple) -> None:
+        if self._fill == self._chunk_size:
+            self._chunks.append({name: np.empty(self._chunk_size, dtype)
+                                 for name, dtype in self._dtypes.items()})
+            self._fill = 0
+
+            if self._max_chunks is not None \
+                    and len(self._chunks) > self._max_chunks:
+                self._evict(self._chunks.pop(0))
+
+        chunk = self._chunks[-1]
+        for name, value in zip(self._dtypes, row):
+            chunk[name][self._fill] = value
+        self._fill += 1
+
+    def select(self, start: float, end: float) -> Dict[str, np.ndarray]:
+        """Returns all rows with a timestamp between start and end,
+        inclusive.
+        """
+        parts = [_read_parquet(path, self._dtypes)
+                 for first, last, path in self._spilled
+                 if first <= end and last >= start]
+
+        for i, chunk in enumerate(self._chunks):
+            size = self._fill if i == len(self._chunks) - 1 \
+                else self._chunk_size
+            tstamps = chunk["tstamp"][:size]
+            if size == 0 or tstamps[0] > end or tstamps[-1] < start:
+                continue
+            parts.append({name: column[:size]
+                          for name, column in chunk.items()})
+
+        if len(parts) == 0:
+            return {name: np.empty(0, dtype)
+                    for name, dtype in self._dtypes.items()}
+
+        columns = {name: np.concatenate([part[name] for part in parts])
+                   for name in self._dtypes}
+        in_range = (columns["tstamp"] >= start) & (columns["tstamp"] <= end)
+        return {name: column[in_range] for name, column in columns.items()}
+
+    def last_before(self, tstamp: float) -> Optional[Dict[str, object]]:
+        """Returns the last row with a timestamp before the given one, or
+        None if there isn't one.
+        """
+        parts = []
+        for i, chunk in enumerate(self._chunks):
+            size = self._fill if i == len(self._chunks) - 1 \
+                else self._chunk_size
+            parts.append({name: column[:size]
+                          for name, column in chunk.items()})
+
+        for first, _, path in reversed(self._spilled):
+            if first < tstamp:
+                parts.insert(0, _read_parquet(path, self._dtypes))
+                break
+
+        for part in reversed(parts):
+            row = np.searchsorted(part["tstamp"], tstamp, side="left") - 1
+            if row >= 0:
+                return {name: column[row] for name, column in part.items()}
+        return None
+
+    def delete_spilled(self) -> None:
+        """Deletes all Parquet files written for these columns."""
+        for _, _, path in self._spilled:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        self._spilled = []
+
+    def _evict(self, chunk: Dict[str, np.ndarray]) -> None:
+        if self._spill_prefix is None:
+            return
+
+        import pyarrow
+        import pyarrow.parquet
+
+        path = self._spill_prefix.with_name(
+            f"{self._spill_prefix.name}-{len(self._spilled)}.parquet")
+        pyarrow.parquet.write_table(pyarrow.table(chunk), str(path))
+        self._spilled.append(
+            (chunk["tstamp"][0], chunk["tstamp"][-1], path))
+
+
+class ZoneStatusHistory:
+    """Records counts and alerts from zone statuses in columnar form, for
+    efficient analytics over long periods of time.
+
+    For every zone and class, the number of objects that have entered, exited,
+    and are within the zone is recorded for each frame. New alerts are
+    recorded for each zone. Data is stored in fixed-size NumPy chunks, and
+    memory use can be bounded by limiting the number of chunks kept per series.
+    Older chunks are either dropped or, if a spill directory is provided,
+    written to Parquet files and read back when queried. Spilling requires
+    PyArrow to be installed.
+
+    .. code-block:: python
+
+       history = ZoneStatusHistory()
+       history.attach(api.get_status_receiver())
+       ...
+       bucket_starts, entries = history.bucketed(
+           stream_id, "Entrance", "person", start, end, bucket_size=300)
+    """
+
+    def __init__(self, chunk_size: int = 4096,
+                 max_chunks: Optional[int] = None,
+                 spill_dir: Optional[Union[str, Path]] = None):
+        """
+        :param chunk_size: The number of rows in each chunk
+        :param max_chunks: The maximum number of chunks to keep in memory for
+            each series. If None, all data is kept in memory.
+        :param spill_dir: If provided, chunks that no longer fit in memory are
+            written to Parquet files in this directory instead of being
+            dropped
+        """
+        self._chunk_size = chunk_size
+        self._max_chunks = max_chunks
+        self._spill_dir = None if spill_dir is None else Path(spill_dir)
+        self._spill_ids = count()
+
+        self._counts: Dict[SeriesKey, _ChunkedColumns] = {}
+        self._alerts: Dict[Tuple[int, str], _ChunkedColumns] = {}
+        self._seen_alerts: Dict[Tuple[int, str], set] = {}
+        self._lock = RLock()
+
+    def attach(self, status_receiver) -> None:
+        """Starts recording zone statuses from the given StatusReceiver.
+
+        :param status_receiver: The receiver to get zone statuses from
+        """
+        status_receiver.add_listener(self.ingest)
+
+    def ingest(self, zone_statuses: ZONE_STATUS_TYPE) -> None:
+        """Records a set of zone statuses, as produced by the zone status
+        stream.
+
+        :param zone_statuses: The zone statuses to record
+        """
+        with self._lock:
+            for stream_id, statuses in zone_statuses.items():
+                for zone_name, status in statuses.items():
+                    within_counts = status.detection_within_counts
+                    class_names = (status.total_entered.keys()
+                                   | status.total_exited.keys()
+                                   | within_counts.keys())
+
+                    for class_name in class_names:
+                        series = self._series(self._counts,
+                                              (stream_id, zone_name,
+                                               class_name),
+                                              _COUNT_COLUMNS)
+                        series.append((
+                            status.tstamp,
+                            status.total_entered.get(class_name, 0),
+                            status.total_exited.get(class_name, 0),
+                            within_counts.get(class_name, 0)))
+
+                    self._ingest_alerts(stream_id, zone_name, status)
+
+    def series_keys(self) -> List[SeriesKey]:
+        """
+        :return: The stream ID, zone name, and class name of every series that
+            has been recorded
+        """
+        with self._lock:
+            return list(self._counts)
+
+    def query(self, stream_id: int, zone_name: str, class_name: str,
+              start: float, end: float) -> Dict[str, np.ndarray]:
+        """Gets the raw recorded counts for a zone and class.
+
+        :param stream_id: The ID of the stream the zone is in
+        :param zone_name: The name of the zone
+        :param class_name: The class of object to get counts for
+        :param start: The Unix timestamp to start from, inclusive
+        :param end: The Unix timestamp to end at, inclusive
+        :return: Columns keyed by "tstamp", ENTERED, EXITED, and WITHIN. The
+            ENTERED and EXITED columns are cumulative, as reported by the
+            server.
+        """
+        with self._lock:
+            series = self._counts.get((stream_id, zone_name, class_name))
+            if series is None:
+                return {name: np.empty(0, dtype)
+                        for name, dtype in _COUNT_COLUMNS.items()}
+            return series.select(start, end)
+
+    def bucketed(self, stream_id: int, zone_name: str, class_name: str,
+                 start: float, end: float, bucket_size: float,
+                 metric: str = ENTERED) -> Tuple[np.ndarray, np.ndarray]:
+        """Aggregates a metric into fixed-size time buckets. For example,
+        entries per 5-minute bucket can be found with a bucket_size of 300
+        and the ENTERED metric.
+
+        :param stream_id: The ID of the stream the zone is in
+        :param zone_name: The name of the zone
+        :param class_name: The class of object to aggregate counts for
+        :param start: The Unix timestamp of the start of the first bucket
+        :param end: The Unix timestamp to end at, inclusive
+        :param bucket_size: The length of each bucket in seconds
+        :param metric: ENTERED or EXITED to count objects that entered or
+            exited in each bucket, or WITHIN to get the peak number of objects
+            within the zone in each bucket
+        :return: The start time of each bucket, and the value for each bucket
+        """
+        if metric not in (ENTERED, EXITED, WITHIN):
+            raise ValueError(f"Unknown metric {metric}")
+
+        num_buckets = max(int(np.ceil((end - start) / bucket_size)), 1)
+        bucket_starts = start + np.arange(num_buckets) * bucket_size
+
+        columns = self.query(stream_id, zone_name, class_name, start, end)
+        buckets = np.minimum(
+            ((columns["tstamp"] - start) // bucket_size).astype(np.int64),
+            num_buckets - 1)
+
+        if metric == WITHIN:
+            values = np.zeros(num_buckets, dtype=np.int64)
+            np.maximum.at(values, buckets, columns[WITHIN])
+            return bucket_starts, values
+
+        totals = columns[metric]
+        # The first increment is measured from the last total before the
+        # range, if there is one
+        with self._lock:
+            series = self._counts.get((stream_id, zone_name, class_name))
+            previous = None if series is None \
+                else series.last_before(start)
+        first_total = totals[:1] if previous is None else [previous[metric]]
+        increments = np.diff(totals, prepend=first_total)
+        # Totals go back to zero when the server restarts, in which case the
+        # new total is the increment
+        resets = increments < 0
+        increments[resets] = totals[resets]
+
+        values = np.bincount(buckets, weights=increments,
+                             minlength=num_buckets).astype(np.int64)
+        return bucket_starts, values
+
+    def alerts(self, stream_id: int, zone_name: str,
+               start: float, end: float) -> Dict[str, np.ndarray]:
+        """Gets the alerts that started in a zone.
+
+        :param stream_id: The ID of the stream the zone is in
+        :param zone_name: The name of the zone
+        :param start: The Unix timestamp to start from, inclusive
+        :param end: The Unix timestamp to end at, inclusive
+        :return: Columns keyed by "tstamp", "alert_id", and "alarm_id", with
+            one row for every alert that was first seen in this period
+        """
+        with self._lock:
+            series = self._alerts.get((stream_id, zone_name))
+            if series is None:
+                return {name: np.empty(0, dtype)
+                        for name, dtype in _ALERT_COLUMNS.items()}
+            return series.select(start, end)
+
+    def close(self) -> None:
+        """Deletes any Parquet files written to the spill directory. The
+        history may no longer be used after this call.
+        """
+        with self._lock:
+            for series in list(self._counts.values()) \
+                    + list(self._alerts.values()):
+                series.delete_spilled()
+            self._counts.clear()
+            self._alerts.clear()
+            self._seen_alerts.clear()
+
+    def _ingest_alerts(self, stream_id: int, zone_name: str,
+                       status) -> None:
+        key = (stream_id, zone_name)
+        seen = self._seen_alerts.get(key, set())
+
+        for alert in status.alerts:
+            if alert.id not in seen:
+                series = self._series(self._alerts, key, _ALERT_COLUMNS)
+                series.append((status.tstamp, alert.id, alert.alarm_id))
+
+        # Only remember active alerts, so this set doesn't grow forever
+        self._seen_alerts[key] = {alert.id for alert in status.alerts}
+
+    def _series(self, all_series: dict, key: tuple,
+                dtypes: Dict[str, type]) -> _ChunkedColumns:
+        series = all_series.get(key)
+        if series is None:
+            spill_prefix = None
+            if self._spill_dir is not None:
+                spill_id = next(self._spill_ids)
+                spill_prefix = self._spill_dir / f"series-{spill_id}"
+
+            series = _ChunkedColumns(dtypes, self._chunk_size,
+                                     self._max_chunks, spill_prefix)
+            all_series[key] = series
+        return series
+
+
+def _read_parquet(path: Path, dtypes: Dict[str, type]) \
+        -> Dict[str, np.ndarray]:
+    import pyarrow.parquet
+
+    table = pyarrow.parquet.read_table(str(path))
+    return {name: table.column(name).to_numpy().astype(dtype)
+            for name, dtype in dtypes.items()}
@@ -0,0 +1,218 @@
+import struct
+import zlib
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from threading import Lock
+from time import sleep, time
+from typing import Iterator, List, Optional, Tuple, Union
+
+from .stubs.zone_statuses import (
+    ZONE_STATUS_STREAM_TYPE,
+    parse_zone_status_packet,
+)
+
+_MAGIC = b"BFZS\x01"
+"""Identifies a zone status recording and the version of its format"""
+
+_RECORD_HEADER = struct.Struct("<dI")
+"""Precedes every record with the time the packet was received and the length
+of the compressed packet that follows
+"""
+
+
+class ZoneStatusRecorder:
+    """Writes raw packets from the zone status stream to an append-only,
+    compressed log file, so that they can be replayed later with a
+    ZoneStatusReplayer.
+
+    Each packet is compressed individually and stored alongside the time it
+    was received. If recording is interrupted, everything up to the last
+    complete packet can still be replayed.
+
+    .. code-block:: python
+
+       with ZoneStatusRecorder("statuses.bfzs") as recorder:
+           for zone_statuses in api.get_zone_status_stream(recorder=recorder):
+               ...
+    """
+
+    def __init__(self, path: Union[str, Path], compression_level: int = 6):
+        """
+        :param path: The file to record to. If it already exists, new packets
+            are appended to it.
+        :param compression_level: The zlib compression level, from 0 to 9
+        """
+        path = Path(path)
+        is_new = not path.exists() or path.stat().st_size == 0
+
+        if not is_new:
+            # Drop any partially written record left by an interrupted
+            # recording, so that new records are appended after the last
+            # complete one
+            _, _, valid_size = _scan_records(path)
+            with path.open("r+b") as recording:
+                recording.truncate(valid_size)
+
+        self._file = path.open("ab")
+        self._compression_level = compression_level
+        self._lock = Lock()
+
+        if is_new:
+            self._file.write(_MAGIC)
+
+    def write(self, packet: bytes, tstamp: Optional[float] = None) -> None:
+        """Appends a packet to the recording.
+
+        :param packet: The raw JSON-encoded packet from the zone status stream
+        :param tstamp: The time the packet was received as a Unix timestamp.
+            Defaults to the current time.
+        """
+        if tstamp is None:
+            tstamp = time()
+
+        compressed = zlib.compress(packet, self._compression_level)
+        with self._lock:
+            self._file.write(_RECORD_HEADER.pack(tstamp, len(compressed)))
+            self._file.write(compressed)
+            # Hand each record to the OS right away, so that everything up to
+            # the last packet can be replayed if the process crashes
+            self._file.flush()
+
+    def flush(self) -> None:
+        """Makes sure all written packets are on disk."""
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Closes the recording file. The recorder may no longer be used after
+        this call.
+        """
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "ZoneStatusRecorder":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ZoneStatusReplayer:
+    """Reads a recording made by a ZoneStatusRecorder and feeds it back as a
+    zone status stream.
+
+    Only the record headers are read when the replayer is created, so seeking
+    to any point in the recording is cheap.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        :param path: The recording file to replay
+        """
+        self._path = Path(path)
+        self._timestamps, self._offsets, _ = _scan_records(self._path)
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    @property
+    def start_time(self) -> Optional[float]:
+        """The time the first packet was received, or None if the recording
+        is empty
+        """
+        return self._timestamps[0] if self._timestamps else None
+
+    @property
+    def end_time(self) -> Optional[float]:
+        """The time the last packet was received, or None if the recording is
+        empty
+        """
+        return self._timestamps[-1] if self._timestamps else None
+
+    def packets(self, start: Optional[float] = None,
+                end: Optional[float] = None) \
+            -> Iterator[Tuple[float, bytes]]:
+        """Reads raw packets from the recording.
+
+        :param start: If provided, packets received before this Unix timestamp
+            are skipped
+        :param end: If provided, packets received after this Unix timestamp
+            are skipped
+        :return: An iterator of the time each packet was received and the raw
+            packet
+        """
+        first = 0 if start is None else bisect_left(self._timestamps, start)
+        last = len(self) if end is None \
+            else bisect_right(self._timestamps, end)
+
+        with self._path.open("rb") as recording:
+            if first < last:
+                recording.seek(self._offsets[first])
+
+            for tstamp in self._timestamps[first:last]:
+                _, length = _RECORD_HEADER.unpack(
+                    recording.read(_RECORD_HEADER.size))
+                yield tstamp, zlib.decompress(recording.read(length))
+
+    def stream(self, start: Optional[float] = None,
+               end: Optional[float] = None,
+               speed: Optional[float] = 1.0) -> ZONE_STATUS_STREAM_TYPE:
+        """Replays the recording in the same format as
+        BrainFrameAPI.get_zone_status_stream.
+
+        :param start: If provided, replaying starts from the first packet
+            received at or after this Unix timestamp
+        :param end: If provided, replaying stops after the last packet received
+            at or before this Unix timestamp
+        :param speed: How many times faster than real-time to replay packets.
+            If None, packets are replayed as fast as possible.
+        :return: A generator that outputs zone statuses
+        """
+        replay_start = time()
+        first_tstamp = None
+
+        for tstamp, packet in self.packets(start, end):
+            if speed is not None:
+                if first_tstamp is None:
+                    first_tstamp = tstamp
+
+                delay = ((tstamp - first_tstamp) / speed
+                         - (time() - replay_start))
+                if delay > 0:
+                    sleep(delay)
+
+            yield parse_zone_status_packet(packet)
+
+
+def _scan_records(path: Path) -> Tuple[List[float], List[int], int]:
+    """Reads the headers of every complete record in a recording.
+
+    :param path: The recording file
+    :return: The timestamp and file offset of each record, and the size of the
+        file up to the end of the last complete record
+    """
+    timestamps = []
+    offsets = []
+
+    file_size = path.stat().st_size
+    with path.open("rb") as recording:
+        if recording.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{path} is not a zone status recording")
+
+        offset = len(_MAGIC)
+        while True:
+            header = recording.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                break
+            tstamp, length = _RECORD_HEADER.unpack(header)
+
+            if offset + _RECORD_HEADER.size + length > file_size:
+                # The last record was only partially written
+                break
+            recording.seek(length, 1)
+
+            timestamps.append(tstamp)
+            offsets.append(offset)
+            offset += _RECORD_HEADER.size + length
+
+    return timestamps, offsets, offset
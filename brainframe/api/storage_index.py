@@ -0,0 +1,112 @@
+import hashlib
+from pathlib import Path
+from threading import Lock
+from typing import Any, Optional, Union
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+"""The number of bytes to read at a time when hashing file-like objects"""
+
+
+class StorageIndex:
+    """A persistent, client-side mapping of content hashes to storage IDs.
+
+    When attached to an API object using set_storage_index, uploads of data
+    that has already been stored on that server are skipped and the existing
+    storage ID is returned instead. Entries are keyed by server URL, so a
+    single index can be shared between API objects connected to different
+    servers.
+    """
+
+    def __init__(self, path: Union[str, Path] = ":memory:"):
+        """
+        :param path: The path to the SQLite database file to persist the index
+            in. If the file does not exist, it will be created. By default, the
+            index is only kept in memory.
+        """
+        import sqlite3
+
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = Lock()
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS storage_index ("
+                "server_url TEXT NOT NULL, "
+                "digest TEXT NOT NULL, "
+                "storage_id INTEGER NOT NULL, "
+                "PRIMARY KEY (server_url, digest))")
+
+    def get(self, server_url: str, digest: str) -> Optional[int]:
+        """
+        :param server_url: The URL of the server the data was uploaded to
+        :param digest: The content digest, as returned by content_digest
+        :return: The storage ID of the data, or None if it is not indexed
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT storage_id FROM storage_index "
+                "WHERE server_url = ? AND digest = ?",
+                (server_url, digest)).fetchone()
+
+        return None if row is None else row[0]
+
+    def put(self, server_url: str, digest: str, storage_id: int) -> None:
+        """Records that data with the given digest is stored on the server.
+
+        :param server_url: The URL of the server the data was uploaded to
+        :param digest: The content digest, as returned by content_digest
+        :param storage_id: The storage ID the server assigned to the data
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO storage_index "
+                "(server_url, digest, storage_id) VALUES (?, ?, ?)",
+                (server_url, digest, storage_id))
+
+    def discard(self, server_url: str, storage_id: int) -> None:
+        """Removes any entries pointing to the given storage ID. This should be
+        called when storage is deleted from the server.
+
+        :param server_url: The URL of the server the data was stored on
+        :param storage_id: The storage ID to forget about
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM storage_index "
+                "WHERE server_url = ? AND storage_id = ?",
+                (server_url, storage_id))
+
+    def close(self) -> None:
+        """Closes the underlying database. The index may no longer be used
+        after this call.
+        """
+        with self._lock:
+            self._conn.close()
+
+
+def content_digest(data: Any, mime_type: str) -> Optional[str]:
+    """Calculates a digest that uniquely identifies the given data and MIME
+    type.
+
+    :param data: The data to hash, either as bytes or as a file-like. File-like
+        objects must be seekable and are returned to their original position
+        after hashing.
+    :param mime_type: The MIME type of the data
+    :return: The hex digest, or None if the data can't be hashed without
+        consuming it
+    """
+    hasher = hashlib.sha256()
+    hasher.update(mime_type.encode("utf-8") + b"\0")
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        hasher.update(data)
+    elif hasattr(data, "read") \
+            and hasattr(data, "seekable") and data.seekable():
+        start = data.tell()
+        for chunk in iter(lambda: data.read(_HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+        data.seek(start)
+    else:
+        return None
+
+    return hasher.hexdigest()
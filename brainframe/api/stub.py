@@ -1,12 +1,11 @@
-from typing import Tuple
-from time import sleep, time
+from typing import TYPE_CHECKING, Optional, Tuple
 
-from requests.exceptions import ConnectionError, ReadTimeout
-
-from .bf_errors import UnauthorizedError, UnknownError, ServerNotReadyError
 from . import stubs
 from .stubs.base_stub import DEFAULT_TIMEOUT
 
+if TYPE_CHECKING:
+    from .readiness import ReadinessPolicy
+
 
 class BrainFrameAPI(stubs.AlertStubMixin,
                     stubs.AnalysisStubMixin,
@@ -48,34 +47,30 @@ class BrainFrameAPI(stubs.AlertStubMixin,
         resp, _ = self._get_json(req, timeout)
         return resp
 
-    def wait_for_server_initialization(self, timeout: float = None):
-        """Waits for the server to be ready to handle requests.
+    def wait_for_server_initialization(
+            self, timeout: float = None,
+            policy: Optional["ReadinessPolicy"] = None):
+        """Waits for the server to be ready to handle requests. The server is
+        checked less often the longer it takes to start.
 
         :param timeout: The maximum amount of time, in seconds, to wait for the
             server to start. If None, this method will wait indefinitely.
+        :param policy: Decides how often to check the server. Defaults to
+            ReadinessPolicy()
         """
-        start_time = time()
-        while True:
-            if timeout is not None and time() - start_time > timeout:
-                raise TimeoutError("The server did not start in time!")
+        from . import readiness
+        readiness.wait_until_ready(self, timeout, policy)
 
-            try:
-                # Test connection to server
-                self.version()
-            except (ConnectionError, ConnectionRefusedError, ReadTimeout,
-                    UnauthorizedError, ServerNotReadyError):
-                # Server not started yet or there is a communication
-                # error
-                pass
-            except UnknownError as exc:
-                if exc.status_code not in [502]:
-                    raise
-            else:
-                break
-
-            # Prevent busy loop
-            sleep(.1)
+    async def wait_for_server_initialization_async(
+            self, timeout: float = None,
+            policy: Optional["ReadinessPolicy"] = None):
+        """Like wait_for_server_initialization, but waits without blocking the
+        event loop.
+        """
+        from . import readiness
+        await readiness.wait_until_ready_async(self, timeout, policy)
 
     def close(self):
         """Clean up the API. It may no longer be used after this call."""
         stubs.StreamStubMixin.close(self)
+        self._close_transport()
@@ -1,13 +1,15 @@
 from enum import Flag, auto
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-import numpy as np
 import json
 
 from brainframe.api.bf_errors import FrameNotFoundForAlertError
 from brainframe.api.bf_codecs import Alert, image_utils
 from .base_stub import BaseStub, DEFAULT_TIMEOUT
 
+if TYPE_CHECKING:
+    import numpy as np
+
 
 class AlertStubMixin(BaseStub):
     """Provides stubs for calling APIs related to controlling and getting
@@ -106,7 +108,7 @@ class AlertStubMixin(BaseStub):
         self._put_json(req, timeout, json.dumps(verified_as))
 
     def get_alert_frame(self, alert_id: int,
-                        timeout=DEFAULT_TIMEOUT) -> Optional[np.ndarray]:
+                        timeout=DEFAULT_TIMEOUT) -> Optional["np.ndarray"]:
         """Returns the frame saved for this alert, or None if no frame is
         recorded for this alert.
 
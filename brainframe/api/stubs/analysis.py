@@ -1,3 +1,8 @@
+from typing import Dict, Iterable
+
+from brainframe.api import bf_errors
+from brainframe.api.bulk import BulkResult, DEFAULT_MAX_WORKERS, \
+    run_concurrently
 from .base_stub import BaseStub, DEFAULT_TIMEOUT
 
 
@@ -39,3 +44,113 @@ class AnalysisStubMixin(BaseStub):
         req = f"/api/streams/{stream_id}/analyze"
         resp, _ = self._get_json(req, timeout)
         return resp
+
+    def start_analyzing_many(self, stream_ids: Iterable[int],
+                             max_workers: int = DEFAULT_MAX_WORKERS,
+                             timeout=DEFAULT_TIMEOUT) \
+            -> Dict[int, BulkResult[bool]]:
+        """Starts analysis on many streams at once. Requests are sent
+        concurrently.
+
+        Streams that are already being analyzed are left alone. If starting
+        all of the streams would exceed the license's maximum number of
+        analyzed streams, streams are started in the given order until the
+        limit is reached, and the rest fail with an AnalysisLimitExceededError
+        without being attempted. Streams whose analysis state can't be
+        checked are counted towards the limit.
+
+        :param stream_ids: The IDs of the streams to start analysis on
+        :param max_workers: The maximum number of requests to have in flight
+            at once
+        :param timeout: The timeout to use for each request
+        :return: The result for each stream, keyed by stream ID. The value is
+            True if analysis was started and False if it was already running.
+            Failed streams hold the error that occurred.
+        """
+        stream_ids = list(dict.fromkeys(stream_ids))
+
+        terms = self.get_license_info(timeout=timeout).terms
+
+        # Every stream only needs to be checked when there's a limit on how
+        # many can be analyzed at once
+        to_check = set(stream_ids)
+        if terms is not None:
+            streams = self.get_stream_configurations(timeout=timeout)
+            to_check.update(stream.id for stream in streams)
+        analyzing = self.check_analyzing_many(to_check, max_workers, timeout)
+
+        results = {}
+        to_start = []
+        for stream_id in stream_ids:
+            result = analyzing[stream_id]
+            if not result.ok:
+                results[stream_id] = result
+            elif result.value:
+                results[stream_id] = BulkResult(value=False)
+            else:
+                to_start.append(stream_id)
+
+        if terms is not None:
+            num_analyzing = 0
+            for result in analyzing.values():
+                if result.ok:
+                    num_analyzing += result.value
+                elif not isinstance(result.error,
+                                    bf_errors.StreamConfigNotFoundError):
+                    # A stream that couldn't be checked may be using a slot
+                    num_analyzing += 1
+            available = max(terms.max_streams - num_analyzing, 0)
+            for stream_id in to_start[available:]:
+                results[stream_id] = BulkResult(
+                    error=bf_errors.AnalysisLimitExceededError(
+                        f"The license allows {terms.max_streams} streams to "
+                        f"be analyzed at once"))
+            to_start = to_start[:available]
+
+        def start(stream_id):
+            self.start_analyzing(stream_id, timeout=timeout)
+            return True
+
+        calls = ((stream_id, (stream_id,)) for stream_id in to_start)
+        results.update(run_concurrently(start, calls, max_workers))
+        return {stream_id: results[stream_id] for stream_id in stream_ids}
+
+    def stop_analyzing_many(self, stream_ids: Iterable[int],
+                            max_workers: int = DEFAULT_MAX_WORKERS,
+                            timeout=DEFAULT_TIMEOUT) \
+            -> Dict[int, BulkResult[None]]:
+        """Stops analysis on many streams at once. Requests are sent
+        concurrently.
+
+        :param stream_ids: The IDs of the streams to stop analysis on
+        :param max_workers: The maximum number of requests to have in flight
+            at once
+        :param timeout: The timeout to use for each request
+        :return: The result for each stream, keyed by stream ID. Failed
+            streams hold the error that occurred.
+        """
+        def stop(stream_id):
+            self.stop_analyzing(stream_id, timeout=timeout)
+
+        calls = ((stream_id, (stream_id,)) for stream_id in stream_ids)
+        return run_concurrently(stop, calls, max_workers)
+
+    def check_analyzing_many(self, stream_ids: Iterable[int],
+                             max_workers: int = DEFAULT_MAX_WORKERS,
+                             timeout=DEFAULT_TIMEOUT) \
+            -> Dict[int, BulkResult[bool]]:
+        """Checks if many streams are being analyzed at once. Requests are
+        sent concurrently.
+
+        :param stream_ids: The IDs of the streams to check
+        :param max_workers: The maximum number of requests to have in flight
+            at once
+        :param timeout: The timeout to use for each request
+        :return: True for each stream that is being analyzed, keyed by stream
+            ID. Failed streams hold the error that occurred.
+        """
+        def check(stream_id):
+            return self.check_analyzing(stream_id, timeout=timeout)
+
+        calls = ((stream_id, (stream_id,)) for stream_id in stream_ids)
+        return run_concurrently(check, calls, max_workers)
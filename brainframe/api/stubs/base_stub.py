@@ -1,6 +1,8 @@
 import json
 import logging
 import typing
+from threading import Lock, RLock
+from time import perf_counter, sleep, time
 from typing import Any, BinaryIO, Optional, Tuple, Union
 from urllib.parse import urlparse
 
@@ -8,10 +10,27 @@ import requests
 from requests import Response
 
 from brainframe.api import bf_codecs, bf_errors
+from brainframe.api.compression import compress
+from brainframe.api.instrumentation import (
+    DecodeEvent,
+    InstrumentationHook,
+    RequestEvent,
+    endpoint_name,
+)
+from brainframe.api.retry import RetryPolicy
+from brainframe.api.transport import PooledTransport, Transport
 
 DEFAULT_TIMEOUT = 30
 """The default timeout for most requests."""
 
+SESSION_REFRESH_MARGIN = 30
+"""The time in seconds before a session expires that a new session is
+requested, for sessions whose expiry time is known.
+"""
+
+_session_lock_creation_lock = Lock()
+_transport_creation_lock = Lock()
+
 
 class BaseStub:
     """A base class for API stubs: Classes that provide methods which call the
@@ -22,6 +41,13 @@ class BaseStub:
     _server_url = None
     _credentials = None
     _session_id = None
+    _session_expires_at = None
+    _session_lock = None
+    _sessions_supported = True
+    _instrumentation_hooks = ()
+    _retry_policy = None
+    _request_compression = None
+    _transport = None
 
     def set_url(self, url):
         scheme = urlparse(url).scheme
@@ -38,10 +64,67 @@ class BaseStub:
         :param credentials: The username and password in a tuple, or None to
             not use authorization on requests
         """
-        self._credentials = credentials
+        with self._get_session_lock():
+            self._credentials = credentials
+
+            # Stop using the old session with outdated credentials
+            self._session_id = None
+            self._session_expires_at = None
+            self._sessions_supported = True
+
+    @property
+    def server_url(self) -> Optional[str]:
+        """The URL of the server requests are sent to"""
+        return self._server_url
+
+    @property
+    def credentials(self) -> Optional[Tuple[str, str]]:
+        """The username and password requests are authorized with, or None
+        if requests are not authorized
+        """
+        return self._credentials
+
+    def add_instrumentation_hook(self, hook: InstrumentationHook):
+        """Start reporting the timing and size of all future requests to the
+        given hook.
+
+        :param hook: The hook to report to
+        """
+        self._instrumentation_hooks = (*self._instrumentation_hooks, hook)
+
+    def set_retry_policy(self, policy: Optional[RetryPolicy]):
+        """Start retrying requests that fail because of transient network or
+        server problems, according to the given policy.
 
-        # Stop using the old session with outdated credentials
-        self._session_id = None
+        :param policy: The policy to use, or None to never retry requests
+        """
+        self._retry_policy = policy
+
+    def set_transport(self, transport: Transport):
+        """Start sending all future requests with the given transport, like
+        one that uses HTTP/2. The previous transport is closed.
+
+        :param transport: The transport to use
+        """
+        with _transport_creation_lock:
+            old_transport, self._transport = self._transport, transport
+        if old_transport is not None:
+            old_transport.close()
+
+    def set_request_compression(self, encoding: Optional[str] = "gzip",
+                                min_size: int = 16 * 1024):
+        """Start compressing large JSON request bodies. The server must
+        support compressed requests.
+
+        :param encoding: The content encoding to compress with, like "gzip",
+            or None to stop compressing requests
+        :param min_size: Bodies smaller than this many bytes are sent
+            uncompressed, since compressing them saves little
+        """
+        if encoding is None:
+            self._request_compression = None
+        else:
+            self._request_compression = (encoding, min_size)
 
     def _get_json(self, api_url, timeout, params=None) -> Tuple[Any, dict]:
         """Send a GET request to the given URL and parse the result as JSON.
@@ -54,9 +137,7 @@ class BaseStub:
         """
         resp = self._get(api_url, timeout, params=params)
 
-        if resp.content:
-            return json.loads(resp.content), resp.headers
-        return None, resp.headers
+        return self._read_json(resp), resp.headers
 
     def _put_codec(self, api_url, timeout, codec: bf_codecs.Codec):
         """Send a PUT request to the given URL.
@@ -72,9 +153,7 @@ class BaseStub:
                          data=codec_data,
                          content_type="application/json")
 
-        if resp.content:
-            return json.loads(resp.content)
-        return None
+        return self._read_json(resp)
 
     def _put_json(self, api_url, timeout, json_data) -> Any:
         """Send a PUT request to the given URL.
@@ -89,9 +168,7 @@ class BaseStub:
                          data=json_data,
                          content_type="application/json")
 
-        if resp.content:
-            return json.loads(resp.content)
-        return None
+        return self._read_json(resp)
 
     def _post_codec(self, api_url, timeout, codec: bf_codecs.Codec):
         """Send a POST request to the given URL.
@@ -107,9 +184,7 @@ class BaseStub:
                           data=codec_data.encode("utf-8"),
                           content_type="application/json")
 
-        if resp.content:
-            return json.loads(resp.content)
-        return None
+        return self._read_json(resp)
 
     def _post_json(self, api_url, timeout, json_data):
         """Send a POST request to the given URL.
@@ -123,9 +198,7 @@ class BaseStub:
                           data=json_data,
                           content_type="application/json")
 
-        if resp.content:
-            return json.loads(resp.content)
-        return None
+        return self._read_json(resp)
 
     def _post_multipart(self, api_url, timeout, files):
         """Send a POST request to the given URL.
@@ -136,9 +209,7 @@ class BaseStub:
         """
         resp = self._post(api_url, timeout, files=files)
 
-        if resp.content:
-            return json.loads(resp.content)
-        return None
+        return self._read_json(resp)
 
     def _patch_json(self, api_url, timeout, json_data):
         """Sends a PATCH request to the given URL.
@@ -153,9 +224,7 @@ class BaseStub:
                            data=json_data,
                            content_type="application/json")
 
-        if resp.content:
-            return json.loads(resp.content)
-        return None
+        return self._read_json(resp)
 
     def _get(self, api_url, timeout, params=None) -> Response:
         """Send a GET request to the given URL, managing authentication and
@@ -188,9 +257,7 @@ class BaseStub:
         :param content_type: The content type of the data
         :return: The response object
         """
-        headers = None
-        if content_type is not None:
-            headers = {"content-type": content_type}
+        data, headers = self._encode_body(data, content_type)
 
         request = requests.Request(
             method="PUT",
@@ -216,9 +283,7 @@ class BaseStub:
         :param files: If provided, the POST request will be a multipart request
         :return: The response object
         """
-        headers = None
-        if content_type is not None:
-            headers = {"content-type": content_type}
+        data, headers = self._encode_body(data, content_type)
 
         request = requests.Request(
             method="POST",
@@ -259,9 +324,7 @@ class BaseStub:
         :param content_type: The content type of the data
         :return: The response object
         """
-        headers = None
-        if content_type is not None:
-            headers = {"content-type": content_type}
+        data, headers = self._encode_body(data, content_type)
 
         request = requests.Request(
             method="PATCH",
@@ -283,6 +346,32 @@ class BaseStub:
 
         return self._send_authorized(request, timeout)
 
+    def _encode_body(self, data, content_type: Optional[str]) \
+            -> Tuple[Any, Optional[dict]]:
+        """Creates the headers for a request body, compressing the body if
+        request compression is enabled and the body is large JSON.
+
+        :param data: The body to send
+        :param content_type: The content type of the body
+        :return: The body to send and its headers
+        """
+        if content_type is None:
+            return data, None
+        headers = {"content-type": content_type}
+
+        if self._request_compression is None \
+                or content_type != "application/json" \
+                or not isinstance(data, (bytes, str)):
+            return data, headers
+
+        encoding, min_size = self._request_compression
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if len(data) >= min_size:
+            data = compress(data, encoding)
+            headers["content-encoding"] = encoding
+        return data, headers
+
     def _full_url(self, api_url):
         """Converts an API URL path to a fully qualified URL.
 
@@ -301,16 +390,15 @@ class BaseStub:
         """
         if self._credentials is None:
             # No credentials provided, send the request without any auth
-            send_func = self._send_no_auth
-        elif self._session_id is None:
+            return self._send_no_auth(request, timeout)
+
+        session_id = self._usable_session_id()
+        if session_id is None:
             # Authenticate with username and password to get a new session ID
-            send_func = self._send_with_credentials
-        else:
-            # Authenticate with the session ID
-            send_func = self._send_with_session_id
+            return self._send_with_credentials(request, timeout)
 
-        resp = send_func(request, timeout)
-        return resp
+        # Authenticate with the session ID
+        return self._send_with_session_id(request, timeout, session_id)
 
     def _send_no_auth(self, request: requests.Request, timeout) \
             -> requests.Response:
@@ -318,59 +406,256 @@ class BaseStub:
         resp = self._perform_request(request, timeout)
         return resp
 
-    def _send_with_credentials(self, request: requests.Request, timeout) \
+    def _send_with_credentials(self, request: requests.Request, timeout,
+                               stale_session_id: Optional[str] = None) \
             -> requests.Response:
-        """Sends the given request with HTTP Basic Authorization."""
+        """Sends the given request with HTTP Basic Authorization.
 
-        request.auth = self._credentials
-        resp = self._perform_request(request, timeout)
-
-        if "session_id" in resp.cookies:
-            # Update the session ID if we don't already have one
-            self._session_id = resp.cookies["session_id"]
-
-        return resp
+        Only one thread at a time authenticates this way. Other threads that
+        need a new session wait for it, then use the session it got instead of
+        authenticating again. This prevents a burst of password checks on the
+        server when a session expires under load.
 
-    def _send_with_session_id(self, request: requests.Request, timeout) \
+        :param stale_session_id: The session ID that the server rejected, if
+            any. A session with this ID will not be reused.
+        """
+        if not self._sessions_supported:
+            # The server hasn't been giving out sessions, so there's nothing
+            # to wait for
+            request.auth = self._credentials
+            resp = self._perform_request(request, timeout)
+            with self._get_session_lock():
+                self._update_session(resp)
+            return resp
+
+        with self._get_session_lock():
+            session_id = self._usable_session_id()
+            if session_id is None or session_id == stale_session_id:
+                request.auth = self._credentials
+                resp = self._perform_request(request, timeout)
+                self._update_session(resp)
+                return resp
+
+        # Another thread got a new session while this one was waiting
+        return self._send_with_session_id(request, timeout, session_id)
+
+    def _send_with_session_id(self, request: requests.Request, timeout,
+                              session_id: Optional[str] = None) \
             -> requests.Response:
         """Sends the given request with the session ID."""
-        request.cookies = {"session_id": self._session_id}
+        if session_id is None:
+            session_id = self._session_id
+
+        request.cookies = {"session_id": session_id}
         try:
             resp = self._perform_request(request, timeout)
         except bf_errors.InvalidSessionError:
             # The session likely expired. Try again with the username and
             # password to fetch a new session
             request.cookies = None
-            return self._send_with_credentials(request, timeout)
+            return self._send_with_credentials(
+                request, timeout, stale_session_id=session_id)
 
         return resp
 
-    def _perform_request(self, *args, **kwargs):
-        """Sends a request and handles any errors in the result
+    def get_session_id(self, stale_session_id: Optional[str] = None,
+                       timeout=DEFAULT_TIMEOUT) -> Optional[str]:
+        """Gets a session ID for authenticating requests that are sent
+        outside of this API object, like zone status streams read on an event
+        loop. The current session is reused if possible. Otherwise, a new one
+        is fetched the same way other requests fetch one, so only one thread
+        checks the credentials with the server at a time.
+
+        :param stale_session_id: A session ID the server rejected, which will
+            not be returned
+        :param timeout: The timeout to use if a new session is needed
+        :return: The session ID, or None if no credentials are set or the
+            server doesn't give out sessions
+        """
+        if self._credentials is None:
+            return None
 
-        All arguments are passed to BaseStub._send_request
+        session_id = self._usable_session_id()
+        if session_id is not None and session_id != stale_session_id:
+            return session_id
+
+        request = requests.Request(method="GET",
+                                   url=self._full_url("/api/version"))
+        self._send_with_credentials(
+            request, timeout, stale_session_id=stale_session_id).close()
+        return self._usable_session_id()
+
+    def _usable_session_id(self) -> Optional[str]:
         """
-        try:
-            resp = self._send_request(*args, **kwargs)
-        except requests.exceptions.RequestException as exc:
-            raise _make_api_error(exception=exc)
+        :return: The current session ID, or None if there is no session or
+            it's about to expire
+        """
+        session_id, expires_at = self._session_id, self._session_expires_at
+        if expires_at is not None \
+                and time() > expires_at - SESSION_REFRESH_MARGIN:
+            return None
+        return session_id
+
+    def _update_session(self, resp: requests.Response) -> None:
+        """Starts using the session the server gave in the response to a
+        request authenticated with credentials, if any.
+        """
+        for cookie in resp.cookies:
+            if cookie.name == "session_id":
+                self._session_id = cookie.value
+                self._session_expires_at = cookie.expires
+                self._sessions_supported = True
+                return
 
-        if not resp.ok:
-            raise _make_api_error(resp=resp)
+        self._sessions_supported = False
 
-        return resp
+    def _get_session_lock(self) -> RLock:
+        """
+        :return: The lock that must be held to authenticate with credentials
+        """
+        if self._session_lock is None:
+            with _session_lock_creation_lock:
+                if self._session_lock is None:
+                    self._session_lock = RLock()
+        return self._session_lock
 
-    @staticmethod
-    def _send_request(request: requests.Request, timeout: int) \
+    def _perform_request(self, request: requests.Request, timeout) \
             -> requests.Response:
-        """Sends a request to the server. This method is mocked out in unit
-        tests.
+        """Sends a request and handles any errors in the result, retrying
+        transient failures according to the retry policy.
+
+        All arguments are passed to BaseStub._send_request
+        """
+        policy = self._retry_policy
+        first_start_time = perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            start_time = perf_counter()
+            try:
+                resp = self._send_request(request, timeout)
+            except requests.exceptions.RequestException as exc:
+                resp, exception = None, exc
+                error = _make_api_error(exception=exc)
+                self._report_request(request, None, start_time, error)
+            else:
+                if resp.ok:
+                    self._report_request(request, resp, start_time)
+                    return resp
+                exception = None
+                error = _make_api_error(resp=resp)
+                self._report_request(request, resp, start_time, error)
+
+            if policy is None:
+                raise error
+            delay = policy.retry_delay(
+                request, attempt, perf_counter() - first_start_time,
+                resp=resp, exception=exception)
+            if delay is None:
+                raise error
+
+            if resp is not None:
+                resp.close()
+            logging.info(f"Retrying {request.method} {request.url} in "
+                         f"{delay:.2f} seconds after error: {error}")
+            sleep(delay)
+
+    def _report_request(self, request: requests.Request,
+                        resp: Optional[Response],
+                        start_time: float,
+                        error: Optional[BaseException] = None):
+        """Reports a finished request to all instrumentation hooks."""
+        if not self._instrumentation_hooks:
+            return
+
+        response_time = perf_counter() - start_time
+
+        body = None
+        if resp is not None and resp.request is not None:
+            body = resp.request.body
+        bytes_sent = len(body) if isinstance(body, (bytes, str)) else 0
+
+        event = RequestEvent(
+            method=request.method,
+            endpoint=endpoint_name(urlparse(request.url).path),
+            response_time=response_time,
+            bytes_sent=bytes_sent,
+            status_code=None if resp is None else resp.status_code,
+            error=error)
+        self._call_hooks("request_finished", event)
+
+    def _read_json(self, resp: Response) -> Any:
+        """Downloads the response body and parses it as JSON, reporting the
+        time taken to all instrumentation hooks.
+
+        :param resp: The response to read
+        :return: The parsed response, or None if the response has no body
+        """
+        if not self._instrumentation_hooks:
+            if resp.content:
+                return json.loads(resp.content)
+            return None
+
+        start_time = perf_counter()
+        content = resp.content
+        download_time = perf_counter() - start_time
+
+        data = json.loads(content) if content else None
+        decode_time = perf_counter() - start_time - download_time
+
+        event = DecodeEvent(
+            method=resp.request.method,
+            endpoint=endpoint_name(urlparse(resp.request.url).path),
+            bytes_received=len(content),
+            download_time=download_time,
+            decode_time=decode_time)
+        self._call_hooks("response_decoded", event)
+
+        return data
+
+    def _call_hooks(self, method_name: str, event) -> None:
+        """Passes an event to all instrumentation hooks. A hook that fails is
+        logged, and doesn't affect the request or the other hooks.
+        """
+        for hook in self._instrumentation_hooks:
+            try:
+                getattr(hook, method_name)(event)
+            except Exception:
+                logging.exception(f"Instrumentation hook {hook!r} failed to "
+                                  f"handle {type(event).__name__}")
+
+    def _get_transport(self) -> Transport:
+        """
+        :return: The transport to send requests with
+        """
+        if self._transport is None:
+            with _transport_creation_lock:
+                if self._transport is None:
+                    self._transport = PooledTransport()
+        return self._transport
+
+    def _close_transport(self) -> None:
+        """Closes all connections to the server."""
+        with _transport_creation_lock:
+            transport, self._transport = self._transport, None
+        if transport is not None:
+            transport.close()
+
+    def _send_request(self, request: requests.Request, timeout: int) \
+            -> requests.Response:
+        """Sends a request to the server through the API object's transport.
+
+        This used to be a static method that opened a new connection for
+        every request. It now needs the instance to reach the transport, so
+        unit tests that mocked it should patch it on the instance instead, or
+        give the API object a fake transport with set_transport.
 
         :param request: The request to send
+        :param timeout: The timeout to send the request with
         :return: The response data
         """
         prepared = request.prepare()
-        return requests.Session().send(prepared, stream=True, timeout=timeout)
+        return self._get_transport().send(prepared, timeout)
 
 
 @typing.overload
@@ -1,11 +1,13 @@
 import json
 from pathlib import Path
 from time import time
-from typing import Dict, List, Optional, BinaryIO, Union
+from typing import Dict, Iterable, List, Optional, BinaryIO, Union
 
 import requests.exceptions
 
 from brainframe.api.bf_codecs import Capsule
+from brainframe.api.bulk import BulkResult, DEFAULT_MAX_WORKERS, \
+    run_concurrently
 from .base_stub import DEFAULT_TIMEOUT
 from .storage import StorageStubMixin
 
@@ -200,3 +202,178 @@ class CapsuleStubMixin(StorageStubMixin):
         active_json = json.dumps(active)
 
         self._put_json(req, timeout, active_json)
+
+    def get_capsule_option_vals_many(self, capsule_name: str,
+                                     stream_ids: Iterable[int],
+                                     max_workers: int = DEFAULT_MAX_WORKERS,
+                                     timeout=DEFAULT_TIMEOUT) \
+            -> Dict[int, BulkResult[Dict[str, object]]]:
+        """Gets the current values for every capsule option on many streams
+        at once. Requests are sent concurrently.
+
+        :param capsule_name: The capsule to find options for
+        :param stream_ids: The IDs of the streams to get options for
+        :param max_workers: The maximum number of requests to have in flight
+            at once
+        :param timeout: The timeout to use for each request
+        :return: The option values of each stream, keyed by stream ID. Failed
+            streams hold the error that occurred.
+        """
+        def get_option_vals(stream_id):
+            return self.get_capsule_option_vals(
+                capsule_name, stream_id, timeout=timeout)
+
+        calls = ((stream_id, (stream_id,)) for stream_id in stream_ids)
+        return run_concurrently(get_option_vals, calls, max_workers)
+
+    def set_capsule_option_vals_many(
+            self, *, capsule_name: str,
+            option_vals: Dict[int, Dict[str, object]],
+            skip_unchanged: bool = True,
+            max_workers: int = DEFAULT_MAX_WORKERS,
+            timeout=DEFAULT_TIMEOUT) -> Dict[int, BulkResult[bool]]:
+        """Sets the stream-level option values of a capsule on many streams
+        at once, replacing any that each stream already has. Requests are sent
+        concurrently.
+
+        :param capsule_name: The name of the capsule whose options to set
+        :param option_vals: The option values to set for each stream, keyed
+            by stream ID
+        :param skip_unchanged: If True, the current option values of each
+            stream are checked first, and streams whose values wouldn't
+            change are not written to. A stream that inherits a global value
+            is left inheriting it, instead of being set to the same value.
+        :param max_workers: The maximum number of requests to have in flight
+            at once
+        :param timeout: The timeout to use for each request
+        :return: The result for each stream, keyed by stream ID. The value is
+            True if the options were written and False if they were already
+            set. Failed streams hold the error that occurred.
+        """
+        global_option_vals = None
+        if skip_unchanged:
+            # Streams use the global value of any option they don't set
+            global_option_vals = self.get_capsule_option_vals(
+                capsule_name, timeout=timeout)
+
+        def set_option_vals(stream_id, stream_option_vals):
+            if global_option_vals is not None \
+                    and None not in stream_option_vals.values():
+                current = self.get_capsule_option_vals(
+                    capsule_name, stream_id, timeout=timeout)
+                if current == {**global_option_vals, **stream_option_vals}:
+                    return False
+
+            self.set_capsule_option_vals(
+                capsule_name=capsule_name, stream_id=stream_id,
+                option_vals=stream_option_vals, timeout=timeout)
+            return True
+
+        calls = ((stream_id, (stream_id, stream_option_vals))
+                 for stream_id, stream_option_vals in option_vals.items())
+        return run_concurrently(set_option_vals, calls, max_workers)
+
+    def patch_capsule_option_vals_many(
+            self, *, capsule_name: str,
+            option_vals: Dict[int, Dict[str, object]],
+            skip_unchanged: bool = True,
+            max_workers: int = DEFAULT_MAX_WORKERS,
+            timeout=DEFAULT_TIMEOUT) -> Dict[int, BulkResult[bool]]:
+        """Patches the stream-level option values of a capsule on many
+        streams at once. Only the provided options are changed. To unset an
+        option, provide that option with a value of None. Requests are sent
+        concurrently.
+
+        :param capsule_name: The name of the capsule whose options to patch
+        :param option_vals: The option values to patch for each stream, keyed
+            by stream ID
+        :param skip_unchanged: If True, the current option values of each
+            stream are checked first, and streams whose values wouldn't
+            change are not written to. A stream that inherits a global value
+            is left inheriting it, instead of being set to the same value.
+            Patches that unset an option are always sent.
+        :param max_workers: The maximum number of requests to have in flight
+            at once
+        :param timeout: The timeout to use for each request
+        :return: The result for each stream, keyed by stream ID. The value is
+            True if the options were written and False if they were already
+            set. Failed streams hold the error that occurred.
+        """
+        def patch_option_vals(stream_id, stream_option_vals):
+            if skip_unchanged and None not in stream_option_vals.values():
+                current = self.get_capsule_option_vals(
+                    capsule_name, stream_id, timeout=timeout)
+                if all(name in current and current[name] == value
+                       for name, value in stream_option_vals.items()):
+                    return False
+
+            self.patch_capsule_option_vals(
+                capsule_name=capsule_name, stream_id=stream_id,
+                option_vals=stream_option_vals, timeout=timeout)
+            return True
+
+        calls = ((stream_id, (stream_id, stream_option_vals))
+                 for stream_id, stream_option_vals in option_vals.items())
+        return run_concurrently(patch_option_vals, calls, max_workers)
+
+    def is_capsule_active_many(self, capsule_name: str,
+                               stream_ids: Iterable[int],
+                               max_workers: int = DEFAULT_MAX_WORKERS,
+                               timeout=DEFAULT_TIMEOUT) \
+            -> Dict[int, BulkResult[bool]]:
+        """Checks if the capsule is active on many streams at once. Requests
+        are sent concurrently.
+
+        :param capsule_name: The name of the capsule to get activity for
+        :param stream_ids: The IDs of the streams to check
+        :param max_workers: The maximum number of requests to have in flight
+            at once
+        :param timeout: The timeout to use for each request
+        :return: True for each stream the capsule is active on, keyed by
+            stream ID. Failed streams hold the error that occurred.
+        """
+        def is_active(stream_id):
+            return self.is_capsule_active(
+                capsule_name, stream_id, timeout=timeout)
+
+        calls = ((stream_id, (stream_id,)) for stream_id in stream_ids)
+        return run_concurrently(is_active, calls, max_workers)
+
+    def set_capsule_active_many(self, *, capsule_name: str,
+                                active: Dict[int, Optional[bool]],
+                                skip_unchanged: bool = True,
+                                max_workers: int = DEFAULT_MAX_WORKERS,
+                                timeout=DEFAULT_TIMEOUT) \
+            -> Dict[int, BulkResult[bool]]:
+        """Sets whether or not the capsule is active on many streams at once.
+        Requests are sent concurrently.
+
+        :param capsule_name: The name of the capsule to set activity for
+        :param active: Whether the capsule should be active on each stream,
+            keyed by stream ID. None unsets the stream's setting, so that the
+            global setting is used.
+        :param skip_unchanged: If True, the current setting of each stream is
+            checked first, and streams that are already set are not written
+            to. Settings of None are always sent.
+        :param max_workers: The maximum number of requests to have in flight
+            at once
+        :param timeout: The timeout to use for each request
+        :return: The result for each stream, keyed by stream ID. The value is
+            True if the setting was written and False if it was already set.
+            Failed streams hold the error that occurred.
+        """
+        def set_active(stream_id, stream_active):
+            if skip_unchanged and stream_active is not None:
+                current = self.is_capsule_active(
+                    capsule_name, stream_id, timeout=timeout)
+                if current == stream_active:
+                    return False
+
+            self.set_capsule_active(
+                capsule_name=capsule_name, stream_id=stream_id,
+                active=stream_active, timeout=timeout)
+            return True
+
+        calls = ((stream_id, (stream_id, stream_active))
+                 for stream_id, stream_active in active.items())
+        return run_concurrently(set_active, calls, max_workers)
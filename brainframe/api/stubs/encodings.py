@@ -1,3 +1,4 @@
+import logging
 from typing import List, Optional
 
 from brainframe.api.bf_codecs import Encoding
@@ -52,6 +53,41 @@ class EncodingStubMixIn(BaseStub):
 
         return class_names
 
+    def get_encoding_ids(self, identity_id: Optional[int] = None,
+                         class_name: Optional[str] = None,
+                         timeout=DEFAULT_TIMEOUT) -> List[int]:
+        """Get the IDs of all encodings that match the given filters. This is
+        much cheaper than getting the encodings themselves.
+
+        Only IDs are requested through the ``fields`` query parameter, the same
+        way get_encoding_class_names requests class names. Servers that ignore
+        this parameter send full encodings instead. The returned IDs are still
+        correct, but the request costs as much as get_encodings, and a warning
+        is logged.
+
+        :param identity_id: If specified, only IDs of encodings attached to
+            this identity will be returned
+        :param class_name: If specified, only IDs of encodings for the given
+            class name will be returned
+        :param timeout: The timeout to use for this request
+        :return: The IDs of all encodings that match this filter
+        """
+        req = f"/api/encodings"
+        params = {"fields": "id"}
+        if identity_id is not None:
+            params["identity_id"] = identity_id
+        if class_name is not None:
+            params["class_name"] = class_name
+
+        encodings, _ = self._get_json(req, timeout, params=params)
+        if len(encodings) > 0 and "vector" in encodings[0]:
+            logging.warning("The server ignored the fields parameter and "
+                            "sent full encodings when only IDs were "
+                            "requested")
+        encoding_ids = [e["id"] for e in encodings]
+
+        return encoding_ids
+
     def get_encoding(self, encoding_id,
                      timeout=DEFAULT_TIMEOUT) -> Encoding:
         """Get the encoding with the given ID.
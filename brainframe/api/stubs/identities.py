@@ -1,10 +1,24 @@
-from typing import List, Optional, Tuple
+from itertools import repeat
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import json
 
 from brainframe.api.bf_codecs import Encoding, Identity, SortOptions
+from brainframe.api.bulk import BulkResult, DEFAULT_MAX_WORKERS, \
+    run_concurrently
 from .base_stub import BaseStub, DEFAULT_TIMEOUT
 
+if TYPE_CHECKING:
+    import numpy as np
+
 
 class IdentityStubMixin(BaseStub):
     """Provides stubs to call APIs that create and update identities, as well
@@ -139,3 +153,58 @@ class IdentityStubMixin(BaseStub):
         }
         encoding = self._post_json(req, timeout, json.dumps(encoded_obj))
         return Encoding.from_dict(encoding)
+
+    def new_identity_vectors(self, identity_ids: Sequence[int],
+                             class_names: Union[str, Sequence[str]],
+                             vectors: "np.ndarray",
+                             max_workers: int = DEFAULT_MAX_WORKERS,
+                             timeout=DEFAULT_TIMEOUT) \
+            -> Dict[int, BulkResult[Encoding]]:
+        """Saves many vectors at once, each under the identity at the same
+        position in identity_ids. Requests are sent concurrently and vectors
+        are serialized as float32, using the shortest representation of each
+        value.
+
+        :param identity_ids: The identity to associate each vector with
+        :param class_names: The type of object each vector describes, or a
+            single class name that applies to all vectors
+        :param vectors: An array of shape (N, D), where N is the number of
+            vectors and D is the length of each vector
+        :param max_workers: The maximum number of requests to have in flight
+            at once
+        :param timeout: The timeout to use for each request
+        :return: The result for each vector, keyed by its row in the array.
+            Failed rows hold the error that occurred.
+        """
+        import numpy as np
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError(f"Vectors must be a 2D array, got an array of "
+                             f"shape {vectors.shape}")
+        if len(identity_ids) != len(vectors):
+            raise ValueError(f"Got {len(identity_ids)} identity IDs for "
+                             f"{len(vectors)} vectors")
+        if not np.isfinite(vectors).all():
+            raise ValueError("Vectors may not contain NaN or infinite values")
+
+        if isinstance(class_names, str):
+            class_names = repeat(class_names)
+        elif len(class_names) != len(vectors):
+            raise ValueError(f"Got {len(class_names)} class names for "
+                             f"{len(vectors)} vectors")
+
+        def new_vector(identity_id, class_name, vector):
+            req = f"/api/identities/{identity_id}/vectors"
+            # Serialize by hand to avoid float64 representations of float32
+            # values, which are much longer
+            vector_json = "[" + ",".join(map(str, vector)) + "]"
+            encoded_json = (f'{{"class_name": {json.dumps(class_name)}, '
+                            f'"vector": {vector_json}}}')
+            encoding = self._post_json(req, timeout, encoded_json)
+            return Encoding.from_dict(encoding)
+
+        calls = ((row, (int(identity_id), class_name, vector))
+                 for row, (identity_id, class_name, vector)
+                 in enumerate(zip(identity_ids, class_names, vectors)))
+        return run_concurrently(new_vector, calls, max_workers)
@@ -1,16 +1,18 @@
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, List
 
-import numpy as np
 import json
 
 from brainframe.api.bf_codecs import Detection, image_utils
 from .base_stub import BaseStub, DEFAULT_TIMEOUT
 
+if TYPE_CHECKING:
+    import numpy as np
+
 
 class ProcessImageStubMixIn(BaseStub):
     """Provides stubs to call APIs that run processing on a single frame."""
 
-    def process_image(self, img_bgr: np.ndarray,
+    def process_image(self, img_bgr: "np.ndarray",
                       capsule_names: List[str],
                       option_vals: Dict[str, Dict[str, object]],
                       timeout=DEFAULT_TIMEOUT) \
@@ -1,17 +1,40 @@
 import json
 from io import BytesIO
-from typing import BinaryIO, Iterable, Tuple, Union
-
-import numpy as np
-from PIL import Image
-
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Iterable,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from brainframe.api import bf_errors
 from brainframe.api.bf_codecs import image_utils
+from brainframe.api.storage_index import StorageIndex, content_digest
 from .base_stub import BaseStub, DEFAULT_TIMEOUT
 
+if TYPE_CHECKING:
+    import numpy as np
+
+STORAGE_CHUNK_SIZE = 1024 * 1024
+"""The number of bytes to read at a time while downloading storage data"""
+
 
 class StorageStubMixin(BaseStub):
     """Provides stubs to call APIs for managing binary blob storage."""
 
+    _storage_index: Optional[StorageIndex] = None
+
+    def set_storage_index(self, storage_index: Optional[StorageIndex]):
+        """Start using the given index to avoid uploading data that is already
+        stored on the server.
+
+        :param storage_index: The index to look up and record uploads in, or
+            None to always upload data
+        """
+        self._storage_index = storage_index
+
     def get_storage_data(self, storage_id,
                          timeout=DEFAULT_TIMEOUT) -> Tuple[bytes, str]:
         """Returns the data with the given storage ID.
@@ -25,8 +48,28 @@ class StorageStubMixin(BaseStub):
 
         return resp.content, resp.headers["Content-Type"]
 
+    def download_storage_data(self, storage_id, file: BinaryIO,
+                              timeout=DEFAULT_TIMEOUT) -> str:
+        """Writes the data with the given storage ID to a file as it's
+        downloaded, so that large objects like video files don't need to fit
+        in memory.
+
+        :param storage_id: The ID of the storage object to get
+        :param file: A file-like object opened for writing in binary mode
+        :param timeout: The timeout to use for this request
+        :return: The MIME type of the data
+        """
+        req = f"/api/storage/{storage_id}"
+        resp = self._get(req, timeout)
+
+        with resp:
+            for chunk in resp.iter_content(STORAGE_CHUNK_SIZE):
+                file.write(chunk)
+
+        return resp.headers["Content-Type"]
+
     def get_storage_data_as_image(self, storage_id,
-                                  timeout=DEFAULT_TIMEOUT) -> np.ndarray:
+                                  timeout=DEFAULT_TIMEOUT) -> "np.ndarray":
         """Gets the data with the given storage ID and attempts to load it as
         an image with OpenCV.
 
@@ -42,6 +85,10 @@ class StorageStubMixin(BaseStub):
                     timeout=DEFAULT_TIMEOUT) -> int:
         """Stores the given data.
 
+        If a storage index is set, data that has already been uploaded to this
+        server is not uploaded again. Instead, the existing storage ID is
+        returned once the server confirms that it still exists.
+
         :param data: The data to store, either as bytes or as a file-like
         :param mime_type: The MIME type of the data
         :param timeout: The timeout to use for this request
@@ -49,8 +96,23 @@ class StorageStubMixin(BaseStub):
         """
         req = r"/api/storage"
 
+        digest = None
+        if self._storage_index is not None:
+            digest = content_digest(data, mime_type)
+
+        if digest is not None:
+            storage_id = self._storage_index.get(self._server_url, digest)
+            if storage_id is not None \
+                    and self._storage_exists(storage_id, timeout):
+                return storage_id
+
         storage_id_json = self._post(req, timeout, data, mime_type).content
-        return json.loads(storage_id_json)
+        storage_id = json.loads(storage_id_json)
+
+        if digest is not None:
+            self._storage_index.put(self._server_url, digest, storage_id)
+
+        return storage_id
 
     def new_storage_as_image(self, data: bytes,
                              timeout=DEFAULT_TIMEOUT) -> int:
@@ -61,6 +123,8 @@ class StorageStubMixin(BaseStub):
         :param timeout: The timeout to use for this request
         :return: The storage ID
         """
+        from PIL import Image
+
         try:
             pil_image = Image.open(BytesIO(data))
 
@@ -88,3 +152,20 @@ class StorageStubMixin(BaseStub):
         req = f"/api/storage/{storage_id}"
 
         self._delete(req, timeout)
+
+        if self._storage_index is not None:
+            self._storage_index.discard(self._server_url, storage_id)
+
+    def _storage_exists(self, storage_id, timeout) -> bool:
+        """Checks if the storage object with the given ID still exists. Only
+        the response headers are read, so the data itself isn't downloaded.
+        """
+        req = f"/api/storage/{storage_id}"
+        try:
+            resp = self._get(req, timeout)
+        except bf_errors.StorageNotFoundError:
+            self._storage_index.discard(self._server_url, storage_id)
+            return False
+
+        resp.close()
+        return True
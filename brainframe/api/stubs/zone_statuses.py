@@ -1,15 +1,23 @@
 import json
 import time
-from typing import Dict, Generator
+from typing import TYPE_CHECKING, Dict, Generator, Iterable, Optional
 
 import requests
 
 from brainframe.api import bf_codecs, bf_errors
 from .base_stub import BaseStub, DEFAULT_TIMEOUT
 
+if TYPE_CHECKING:
+    from ..status_recording import ZoneStatusRecorder
+
 ZONE_STATUS_TYPE = Dict[int, Dict[str, bf_codecs.ZoneStatus]]
 ZONE_STATUS_STREAM_TYPE = Generator[ZONE_STATUS_TYPE, None, None]
 
+STATUS_STREAM_CHUNK_SIZE = 64 * 1024
+"""The most data to read from the zone status stream at once. Chunked
+responses are returned as each chunk arrives, so this doesn't delay packets.
+"""
+
 
 class ZoneStatusStubMixin(BaseStub):
     """Provides stubs for calling APIs to get zone statuses."""
@@ -35,51 +43,109 @@ class ZoneStatusStubMixin(BaseStub):
                for s_id, statuses in data.items()}
         return out
 
-    def get_zone_status_stream(self, timeout=None) -> ZONE_STATUS_STREAM_TYPE:
+    def get_zone_status_stream(
+            self, timeout=None,
+            recorder: Optional["ZoneStatusRecorder"] = None) \
+            -> ZONE_STATUS_STREAM_TYPE:
         """Streams ZoneStatus results from the server as they are produced.
 
         All active streams will have a key in the output dict.
 
         :param timeout: The timeout to use for this request
+        :param recorder: If provided, every packet received from the server is
+            written to this recorder before being parsed
         :return: A generator that outputs dicts whose keys are stream IDs and
             whose value is another dict. This nested dict's keys are zone names
             and their value is the ZoneStatus for that zone.
         """
-        req = "/api/streams/statuses"
-
         def zone_status_iterator():
-            # Don't use a timeout for this request, since it's ongoing
-            resp = self._get(req, timeout=timeout)
-
-            packets = resp.iter_lines(delimiter=b"\r\n")
-            while True:
-                timeout_start = time.time()
-                try:
-                    packet = next(packets)
-                except requests.exceptions.ChunkedEncodingError as exc:
-                    message = "Incomplete packet while attempting to read " \
-                              "from zone status iterator"
-                    raise bf_errors.ServerNotReadyError(message) from exc
-                except requests.exceptions.RequestException as exc:
-                    message = "A network exception occurred while " \
-                              "communicating with the BrainFrame server"
-                    new_exc = bf_errors.ServerNotReadyError(message)
-                    new_exc.__cause__ = exc
-                    raise bf_errors.ServerNotReadyError(message)
-
-                if packet == b'':
-                    if timeout is None or time.time() < timeout_start + timeout:
-                        continue
-                    else:
-                        break
-
-                # Parse the line
-                zone_statuses_dict = json.loads(packet)
-
-                processed = {
-                    int(s_id): {key: bf_codecs.ZoneStatus.from_dict(val)
-                                for key, val in statuses.items()}
-                    for s_id, statuses in zone_statuses_dict.items()}
-                yield processed
+            for packet in self._zone_status_packets(timeout):
+                if recorder is not None:
+                    recorder.write(packet)
+                yield parse_zone_status_packet(packet)
 
         return zone_status_iterator()
+
+    def _zone_status_packets(self, timeout) -> Generator[bytes, None, None]:
+        """Streams raw zone status packets from the server, without parsing
+        them.
+
+        :param timeout: The timeout to use for this request
+        :return: A generator that outputs each packet as JSON-encoded bytes
+        """
+        req = "/api/streams/statuses"
+
+        # Don't use a timeout for this request, since it's ongoing
+        resp = self._get(req, timeout=timeout)
+
+        chunks = resp.iter_content(chunk_size=STATUS_STREAM_CHUNK_SIZE)
+        packets = split_packets(chunks, delimiter=b"\r\n")
+        while True:
+            timeout_start = time.time()
+            try:
+                packet = next(packets)
+            except StopIteration:
+                # The server closed the stream
+                return
+            except requests.exceptions.ChunkedEncodingError as exc:
+                message = "Incomplete packet while attempting to read " \
+                          "from zone status iterator"
+                raise bf_errors.ServerNotReadyError(message) from exc
+            except requests.exceptions.RequestException as exc:
+                message = "A network exception occurred while " \
+                          "communicating with the BrainFrame server"
+                new_exc = bf_errors.ServerNotReadyError(message)
+                new_exc.__cause__ = exc
+                raise bf_errors.ServerNotReadyError(message)
+
+            if packet == b'':
+                if timeout is None or time.time() < timeout_start + timeout:
+                    continue
+                else:
+                    break
+
+            yield packet
+
+
+def split_packets(chunks: Iterable[bytes], delimiter: bytes) \
+        -> Generator[bytes, None, None]:
+    """Splits a stream of data into the packets between each delimiter.
+
+    Unlike Response.iter_lines, this finds delimiters that are split between
+    chunks, which happens often when the stream is compressed.
+
+    :param chunks: The stream of data
+    :param delimiter: The bytes that end each packet
+    :return: A generator that outputs each packet, without its delimiter
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        # Only search the new data, and enough of the old to find a delimiter
+        # that started in the last chunk
+        start = max(len(buffer) - len(delimiter) + 1, 0)
+        buffer += chunk
+
+        end = buffer.find(delimiter, start)
+        while end != -1:
+            yield bytes(buffer[:end])
+            del buffer[:end + len(delimiter)]
+            end = buffer.find(delimiter)
+
+    if buffer:
+        yield bytes(buffer)
+
+
+def parse_zone_status_packet(packet: bytes) -> ZONE_STATUS_TYPE:
+    """Parses a single packet from the zone status stream.
+
+    :param packet: The JSON-encoded packet
+    :return: A dict whose keys are stream IDs and whose value is another dict.
+        This nested dict's keys are zone names and their value is the
+        ZoneStatus for that zone.
+    """
+    zone_statuses_dict = json.loads(packet)
+
+    return {
+        int(s_id): {key: bf_codecs.ZoneStatus.from_dict(val)
+                    for key, val in statuses.items()}
+        for s_id, statuses in zone_statuses_dict.items()}
@@ -0,0 +1,327 @@
+import uuid
+from collections import Counter
+from threading import RLock
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .bf_codecs import Detection
+from .stubs.zone_statuses import ZONE_STATUS_TYPE
+
+_INITIAL_CAPACITY = 256
+"""The number of tracks space is allocated for initially"""
+
+_INITIAL_PATH_LENGTH = 16
+"""The number of path points space is allocated for initially in each track"""
+
+
+@dataclass
+class Track:
+    """An object followed across frames, assembled from detections that share
+    a track ID.
+    """
+
+    track_id: uuid.UUID
+    """The tracking ID shared by all detections in this track"""
+
+    stream_id: int
+    """The ID of the stream the object was seen in"""
+
+    first_seen: float
+    """The Unix timestamp of the first frame the object was seen in"""
+
+    last_seen: float
+    """The Unix timestamp of the most recent frame the object was seen in"""
+
+    class_name: str
+    """The class name the object was most often detected as"""
+
+    attributes: Dict[str, str] = field(default_factory=dict)
+    """The most common value of each attribute the object was detected with"""
+
+    zone_dwell: Dict[str, float] = field(default_factory=dict)
+    """The total time in seconds the object spent in each zone, keyed by zone
+    name
+    """
+
+    path: np.ndarray = field(default_factory=lambda: np.empty((0, 3)))
+    """The position of the object over time, as an array of rows in the form
+    (tstamp, x, y). Long paths are thinned out to stay within the assembler's
+    maximum path length.
+    """
+
+    @property
+    def duration(self) -> float:
+        """The time in seconds between the first and last sighting"""
+        return self.last_seen - self.first_seen
+
+
+class TrackAssembler:
+    """Assembles tracks from the zone status stream by following the track IDs
+    of detections.
+
+    Per-track timestamps and paths are kept in preallocated NumPy arrays, so
+    thousands of concurrent tracks can be followed cheaply. Tracks that are
+    not seen for longer than the expiry time are finished, passed to any
+    expiry listeners, and forgotten.
+
+    .. code-block:: python
+
+       assembler = TrackAssembler(expiry=10)
+       assembler.add_expiry_listener(
+           lambda track: print(track.track_id, track.zone_dwell))
+       assembler.attach(api.get_status_receiver())
+    """
+
+    def __init__(self, expiry: float = 5.0, max_path_length: int = 1024,
+                 max_dwell_gap: float = 1.0, stream_timeout: float = 60.0):
+        """
+        :param expiry: The time in seconds after a track was last seen before
+            it is considered finished
+        :param max_path_length: The maximum number of points to keep in each
+            track's path. Longer paths are thinned out by dropping every other
+            point.
+        :param max_dwell_gap: The maximum time in seconds between two frames
+            that is counted towards dwell time. This prevents gaps in the
+            stream from being counted as time spent in a zone.
+        :param stream_timeout: The time in seconds, measured by the local
+            clock, that a stream may be missing from the zone status stream
+            before all of its tracks are finished. This handles streams that
+            are deleted or stop being analyzed.
+        """
+        self._expiry = expiry
+        self._max_path_length = max_path_length
+        self._max_dwell_gap = max_dwell_gap
+        self._stream_timeout = stream_timeout
+
+        self._slots: Dict[uuid.UUID, int] = {}
+        self._free_slots: List[int] = []
+
+        self._track_ids: List[Optional[uuid.UUID]] = []
+        self._stream_ids = np.empty(0, dtype=np.int64)
+        self._first_seen = np.empty(0, dtype=np.float64)
+        self._last_seen = np.empty(0, dtype=np.float64)
+        self._path_lengths = np.empty(0, dtype=np.int64)
+        self._paths: List[Optional[np.ndarray]] = []
+
+        self._class_votes: List[Optional[Counter]] = []
+        self._attribute_votes: List[Optional[Dict[str, Counter]]] = []
+        self._zone_dwell: List[Optional[Dict[str, float]]] = []
+        self._last_in_zone: List[Optional[Dict[str, float]]] = []
+
+        self._grow(_INITIAL_CAPACITY)
+
+        # Tracks are expired against the latest timestamp of their own
+        # stream, since the clocks of different streams may not agree
+        self._latest_tstamps: Dict[int, float] = {}
+        # The local time each stream last appeared in the zone status stream
+        self._last_received: Dict[int, float] = {}
+
+        self._expiry_listeners: List[Callable[[Track], Any]] = []
+        self._lock = RLock()
+
+    def attach(self, status_receiver) -> None:
+        """Starts assembling tracks from the given StatusReceiver.
+
+        :param status_receiver: The receiver to get zone statuses from
+        """
+        status_receiver.add_listener(self.ingest)
+
+    def add_expiry_listener(self, listener: Callable[[Track], Any]) -> None:
+        """
+        :param listener: Called with the finished track when a track expires
+        """
+        with self._lock:
+            self._expiry_listeners.append(listener)
+
+    def ingest(self, zone_statuses: ZONE_STATUS_TYPE) -> None:
+        """Updates tracks with a set of zone statuses, as produced by the zone
+        status stream.
+
+        :param zone_statuses: The zone statuses to process
+        """
+        now = monotonic()
+
+        with self._lock:
+            for stream_id, statuses in zone_statuses.items():
+                self._last_received[stream_id] = now
+
+                latest = self._latest_tstamps.get(stream_id)
+                for zone_name, status in statuses.items():
+                    latest = status.tstamp if latest is None \
+                        else max(latest, status.tstamp)
+
+                    for detection in status.within:
+                        if detection.track_id is not None:
+                            self._observe(stream_id, zone_name,
+                                          status.tstamp, detection)
+
+                if latest is not None:
+                    self._latest_tstamps[stream_id] = latest
+                    self._expire(stream_id, latest)
+
+            self._sweep_missing_streams(now)
+
+    def active_tracks(self, stream_id: Optional[int] = None) -> List[Track]:
+        """
+        :param stream_id: If provided, only tracks in this stream are returned
+        :return: All tracks that have not expired yet
+        """
+        with self._lock:
+            return [self._to_track(slot) for slot in self._slots.values()
+                    if stream_id is None
+                    or self._stream_ids[slot] == stream_id]
+
+    def get_track(self, track_id: uuid.UUID) -> Optional[Track]:
+        """
+        :param track_id: The tracking ID of the track to get
+        :return: The track, or None if it doesn't exist or has expired
+        """
+        with self._lock:
+            slot = self._slots.get(track_id)
+            return None if slot is None else self._to_track(slot)
+
+    def _observe(self, stream_id: int, zone_name: str, tstamp: float,
+                 detection: Detection) -> None:
+        slot = self._slots.get(detection.track_id)
+        if slot is None:
+            slot = self._allocate(detection.track_id, stream_id, tstamp)
+
+        if tstamp > self._last_seen[slot]:
+            self._last_seen[slot] = tstamp
+
+        # The same detection appears once for every zone it's in, so only
+        # count votes and path points once per frame
+        path_length = self._path_lengths[slot]
+        path = self._paths[slot]
+        if path_length == 0 or path[path_length - 1, 0] != tstamp:
+            self._class_votes[slot][detection.class_name] += 1
+            for attribute, value in detection.attributes.items():
+                self._attribute_votes[slot].setdefault(
+                    attribute, Counter())[value] += 1
+            self._add_path_point(slot, tstamp, *detection.center)
+
+        last_in_zone = self._last_in_zone[slot]
+        previous = last_in_zone.get(zone_name)
+        if previous is not None and 0 < tstamp - previous \
+                <= self._max_dwell_gap:
+            zone_dwell = self._zone_dwell[slot]
+            zone_dwell[zone_name] = zone_dwell.get(zone_name, 0.0) \
+                + tstamp - previous
+        last_in_zone[zone_name] = tstamp
+
+    def _add_path_point(self, slot: int, tstamp: float,
+                        x: float, y: float) -> None:
+        path = self._paths[slot]
+        length = self._path_lengths[slot]
+
+        if length == len(path):
+            if length >= self._max_path_length:
+                # Thin the path out instead of growing it
+                length = (length + 1) // 2
+                path[:length] = path[::2]
+            else:
+                new_path = np.empty(
+                    (min(len(path) * 2, self._max_path_length), 3))
+                new_path[:length] = path
+                path = self._paths[slot] = new_path
+
+        path[length] = (tstamp, x, y)
+        self._path_lengths[slot] = length + 1
+
+    def _sweep_missing_streams(self, now: float) -> None:
+        """Finishes every track in streams that haven't appeared in the zone
+        status stream for longer than the stream timeout.
+        """
+        missing = [stream_id for stream_id, received
+                   in self._last_received.items()
+                   if now - received > self._stream_timeout]
+        for stream_id in missing:
+            self._expire(stream_id, float("inf"))
+            del self._last_received[stream_id]
+            self._latest_tstamps.pop(stream_id, None)
+
+    def _expire(self, stream_id: int, now: float) -> None:
+        expired = np.flatnonzero(
+            (self._stream_ids == stream_id)
+            & (self._last_seen < now - self._expiry))
+
+        for slot in expired:
+            if self._track_ids[slot] is None:
+                continue
+
+            track = self._to_track(slot)
+            self._release(slot)
+            for listener in self._expiry_listeners:
+                listener(track)
+
+    def _allocate(self, track_id: uuid.UUID, stream_id: int,
+                  tstamp: float) -> int:
+        if len(self._free_slots) == 0:
+            self._grow(len(self._track_ids) * 2)
+        slot = self._free_slots.pop()
+
+        self._slots[track_id] = slot
+        self._track_ids[slot] = track_id
+        self._stream_ids[slot] = stream_id
+        self._first_seen[slot] = tstamp
+        self._last_seen[slot] = tstamp
+        self._path_lengths[slot] = 0
+        self._paths[slot] = np.empty((_INITIAL_PATH_LENGTH, 3))
+        self._class_votes[slot] = Counter()
+        self._attribute_votes[slot] = {}
+        self._zone_dwell[slot] = {}
+        self._last_in_zone[slot] = {}
+        return slot
+
+    def _release(self, slot: int) -> None:
+        del self._slots[self._track_ids[slot]]
+        self._track_ids[slot] = None
+        # Free slots are never expired, since they belong to no stream
+        self._stream_ids[slot] = -1
+        self._paths[slot] = None
+        self._class_votes[slot] = None
+        self._attribute_votes[slot] = None
+        self._zone_dwell[slot] = None
+        self._last_in_zone[slot] = None
+        self._free_slots.append(slot)
+
+    def _grow(self, capacity: int) -> None:
+        old_capacity = len(self._track_ids)
+        added = capacity - old_capacity
+
+        self._stream_ids = np.concatenate(
+            [self._stream_ids, np.full(added, -1, dtype=np.int64)])
+        self._first_seen = np.concatenate(
+            [self._first_seen, np.zeros(added)])
+        self._last_seen = np.concatenate(
+            [self._last_seen, np.zeros(added)])
+        self._path_lengths = np.concatenate(
+            [self._path_lengths, np.zeros(added, dtype=np.int64)])
+
+        for attribute in (self._track_ids, self._paths, self._class_votes,
+                          self._attribute_votes, self._zone_dwell,
+                          self._last_in_zone):
+            attribute.extend([None] * added)
+
+        # Hand out lower slots first
+        self._free_slots.extend(reversed(range(old_capacity, capacity)))
+
+    def _to_track(self, slot: int) -> Track:
+        class_name, _ = self._class_votes[slot].most_common(1)[0]
+        attributes = {attribute: votes.most_common(1)[0][0]
+                      for attribute, votes
+                      in self._attribute_votes[slot].items()}
+
+        return Track(
+            track_id=self._track_ids[slot],
+            stream_id=int(self._stream_ids[slot]),
+            first_seen=float(self._first_seen[slot]),
+            last_seen=float(self._last_seen[slot]),
+            class_name=class_name,
+            attributes=attributes,
+            zone_dwell=dict(self._zone_dwell[slot]),
+            path=self._paths[slot][:self._path_lengths[slot]].copy())
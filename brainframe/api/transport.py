@@ -0,0 +1,213 @@
+"""Transports send prepared requests to the server and return Requests
+responses, so the stubs work the same way no matter how requests are sent.
+
+.. code-block:: python
+
+   api.set_transport(create_transport(http2=True))
+
+By default, requests are sent over HTTP/1.1 with a pool of connections that
+are reused between requests. The HTTP/2 transport sends concurrent requests
+over a single connection, and requires the ``httpx`` and ``h2`` packages.
+HTTP/2 is only used with https:// URLs, since it's negotiated during the TLS
+handshake. Other URLs use HTTP/1.1 through the same transport.
+
+The HTTP/2 transport is experimental. It has not been tested against a
+BrainFrame server, and its behavior may change.
+"""
+import abc
+import logging
+from datetime import timedelta
+from typing import Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULT_MAX_CONNECTIONS = 16
+"""The default maximum number of connections to keep open to a server"""
+
+_HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-connection", "transfer-encoding",
+    "upgrade",
+}
+
+
+class Transport(abc.ABC):
+    """Sends requests to the server. Transports are used by many threads at
+    once, so implementations must be thread-safe.
+    """
+
+    @abc.abstractmethod
+    def send(self, request: requests.PreparedRequest,
+             timeout: Optional[float]) -> requests.Response:
+        """Sends a request without reading the response body, so that it can
+        be streamed.
+
+        :param request: The request to send
+        :param timeout: The timeout to use for this request
+        :return: The response
+        """
+
+    def close(self) -> None:
+        """Closes all connections. The transport may no longer be used after
+        this call.
+        """
+
+
+class PooledTransport(Transport):
+    """Sends requests over HTTP/1.1, reusing connections from a pool."""
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        """
+        :param max_connections: The maximum number of idle connections to
+            keep open. More connections are opened when needed, but they're
+            closed after use.
+        """
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max_connections)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def send(self, request: requests.PreparedRequest,
+             timeout: Optional[float]) -> requests.Response:
+        return self._session.send(request, stream=True, timeout=timeout)
+
+    def close(self) -> None:
+        self._session.close()
+
+
+class HTTP2Transport(Transport):
+    """Sends requests over HTTP/2 using httpx, so that concurrent requests
+    share a single connection.
+
+    This transport is experimental, and a warning is logged when it's
+    created.
+    """
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS):
+        """
+        :param max_connections: The maximum number of connections to open.
+            Only one is needed per server when HTTP/2 is used.
+        :raises ImportError: If httpx or h2 is not installed
+        """
+        import httpx
+
+        logging.warning("The HTTP/2 transport is experimental and may not "
+                        "work with every BrainFrame server.")
+        self._client = httpx.Client(
+            http2=True,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections))
+
+    def send(self, request: requests.PreparedRequest,
+             timeout: Optional[float]) -> requests.Response:
+        import httpx
+
+        # Let httpx manage connections and advertise the encodings it can
+        # decode
+        headers = [(key, value) for key, value in request.headers.items()
+                   if key.lower() not in _HOP_BY_HOP_HEADERS
+                   and key.lower() != "accept-encoding"]
+        http_request = self._client.build_request(
+            request.method, request.url,
+            headers=headers,
+            content=request.body,
+            timeout=httpx.Timeout(timeout))
+
+        try:
+            http_response = self._client.send(http_request, stream=True)
+        except httpx.HTTPError as exc:
+            raise _requests_exception(exc) from exc
+
+        return _requests_response(http_response, request)
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def create_transport(http2: bool = False,
+                     max_connections: int = DEFAULT_MAX_CONNECTIONS) \
+        -> Transport:
+    """Creates a transport, falling back to HTTP/1.1 if HTTP/2 isn't
+    available.
+
+    :param http2: If True, use the experimental HTTP/2 transport if httpx
+        and h2 are installed
+    :param max_connections: The maximum number of connections to keep open
+    :return: The new transport
+    """
+    if http2:
+        try:
+            return HTTP2Transport(max_connections)
+        except ImportError:
+            logging.warning("HTTP/2 requires the httpx and h2 packages. "
+                            "Falling back to HTTP/1.1.")
+    return PooledTransport(max_connections)
+
+
+class _HTTPXBody:
+    """Exposes an httpx response body in the form Requests reads responses
+    from.
+    """
+
+    def __init__(self, http_response):
+        self._response = http_response
+
+    def stream(self, chunk_size: Optional[int] = None,
+               decode_content: bool = True) -> Iterator[bytes]:
+        import httpx
+
+        # The chunk size is ignored so that data is returned as soon as it
+        # arrives, which the zone status stream relies on
+        try:
+            yield from self._response.iter_bytes()
+        except httpx.HTTPError as exc:
+            raise _requests_exception(exc, streaming=True) from exc
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        return b"".join(self.stream(amt))
+
+    def close(self) -> None:
+        self._response.close()
+
+
+def _requests_response(http_response, request: requests.PreparedRequest) \
+        -> requests.Response:
+    """Converts an httpx response to a Requests response, without reading
+    its body.
+    """
+    resp = requests.Response()
+    resp.status_code = http_response.status_code
+    resp.reason = http_response.reason_phrase
+    resp.headers = CaseInsensitiveDict(http_response.headers)
+    resp.encoding = get_encoding_from_headers(resp.headers)
+    resp.url = str(http_response.url)
+    resp.raw = _HTTPXBody(http_response)
+    resp.request = request
+    resp.elapsed = timedelta(0)
+
+    resp.cookies = RequestsCookieJar()
+    for cookie in http_response.cookies.jar:
+        resp.cookies.set_cookie(cookie)
+
+    return resp
+
+
+def _requests_exception(exc, streaming: bool = False) \
+        -> requests.exceptions.RequestException:
+    """Converts an httpx error to the equivalent Requests error, which the
+    stubs know how to handle.
+    """
+    import httpx
+
+    if isinstance(exc, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(str(exc))
+    if isinstance(exc, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(str(exc))
+    if streaming and isinstance(exc, httpx.RemoteProtocolError):
+        return requests.exceptions.ChunkedEncodingError(str(exc))
+    if isinstance(exc, httpx.TransportError):
+        return requests.exceptions.ConnectionError(str(exc))
+    return requests.exceptions.RequestException(str(exc))